@@ -1,13 +1,19 @@
 # app.py - Complete Streamlit Object Detection Application
 import streamlit as st
-import cv2
 import numpy as np
-from PIL import Image
+import atexit
 import time
 import os
+import sys
+from importlib.metadata import PackageNotFoundError, version
 
 # Import your detector
 from streamlit_detector import StreamlitSSDDetector
+from result_cache import DetectionCache
+from detection_index import DetectionIndex
+
+# Detections are indexed at this floor so later queries can use any higher threshold
+INDEX_MIN_SCORE = 0.3
 
 # Page configuration
 st.set_page_config(
@@ -54,9 +60,28 @@ def load_detector():
         if success:
             st.success("✅ AI Model loaded successfully!")
         else:
-            st.error("❌ Failed to load AI model. Check your internet connection.")
+            st.error("❌ Failed to load AI model. Check your internet connection "
+                     "or seed the offline model store with `python model_store.py fetch`.")
         return detector, success
 
+@st.cache_resource
+def load_result_cache():
+    """Shared cache of raw model outputs, so slider changes never re-run the model"""
+    return DetectionCache(max_entries=256)
+
+@st.cache_resource
+def load_detection_index():
+    """Persistent store of past detections for the Detection Index tab
+
+    Writes are batched: a segment per analysed image would mean a disk write
+    per upload and constant merging, so the index flushes every 2,000
+    detections or 30 seconds, and once more when the app exits.
+    """
+    index = DetectionIndex(os.environ.get('DETECTION_INDEX_DIR', 'detection_index'),
+                           segment_rows=2000, flush_interval=30.0)
+    atexit.register(index.close)
+    return index
+
 def create_sample_images_folder():
     """Create sample images folder with instructions"""
     sample_folder = os.path.join(os.getcwd(), "sample_images")
@@ -109,6 +134,13 @@ def main():
     )
     detector.confidence_threshold = confidence_threshold
     
+    # Tiled inference for small objects in high-resolution images
+    with st.sidebar.expander("🧩 Tiled Inference"):
+        use_tiling = st.checkbox("Detect in overlapping tiles", value=False,
+                                 help="Finds small objects in large images at several times the latency")
+        tile_size = st.slider("Tile Size (px)", min_value=256, max_value=1024, value=512, step=64)
+        tile_overlap = st.slider("Tile Overlap", min_value=0.0, max_value=0.5, value=0.2, step=0.05)
+    
     # Advanced settings
     with st.sidebar.expander("ℹ️ About This System"):
         st.write("""
@@ -125,11 +157,20 @@ def main():
         - And much more!
         """)
     
+    result_cache = load_result_cache()
+    with st.sidebar.expander("⚡ Result Cache"):
+        cache_stats = result_cache.stats()
+        st.write(f"**Cached images:** {cache_stats['entries']}")
+        st.write(f"**Hits / Misses:** {cache_stats['hits']} / {cache_stats['misses']}")
+        st.write(f"**Memory:** {cache_stats['bytes'] / 1024:.1f} KB")
+    
     # Create sample images folder
     sample_folder = create_sample_images_folder()
     
     # Main interface
-    tab1, tab2, tab3 = st.tabs(["📷 Image Detection", "📊 Model Info", "🧪 Test Results"])
+    detection_index = load_detection_index()
+    tab1, tab2, tab3, tab4 = st.tabs(["📷 Image Detection", "📊 Model Info", "🧪 Test Results",
+                                      "🗂️ Detection Index"])
     
     with tab1:
         col1, col2 = st.columns([1, 1])
@@ -158,6 +199,8 @@ def main():
             
             # Display original image
             if uploaded_file is not None:
+                from PIL import Image
+                
                 st.subheader("🖼️ Original Image")
                 
                 if isinstance(uploaded_file, str):  # Sample image path
@@ -181,12 +224,17 @@ def main():
             if uploaded_file is not None:
                 st.subheader("🎯 Detection Results")
                 
-                # Convert PIL to OpenCV format
-                image_array = np.array(image)
-                if len(image_array.shape) == 3:
-                    image_cv = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
+                # Read the encoded bytes so repeated reruns hit the result cache
+                if isinstance(uploaded_file, str):
+                    with open(uploaded_file, 'rb') as f:
+                        image_bytes = f.read()
                 else:
-                    image_cv = image_array
+                    image_bytes = uploaded_file.getvalue()
+                
+                def to_rgb_array():
+                    """Fresh full-size RGB array of the image for tiling and drawing"""
+                    rgb_image = image if image.mode == 'RGB' else image.convert('RGB')
+                    return np.array(rgb_image)
                 
                 # Detection progress
                 progress_bar = st.progress(0)
@@ -196,17 +244,37 @@ def main():
                 status_text.text("🔍 Analyzing image...")
                 progress_bar.progress(25)
                 
-                start_time = time.time()
-                detections = detector.detect_objects(image_cv)
-                detection_time = time.time() - start_time
+                start_time = time.perf_counter()
+                try:
+                    if use_tiling:
+                        detections = detector.detect_tiled(
+                            to_rgb_array(), tile_size, tile_overlap, channel_order='rgb')
+                        cache_hit = False
+                    else:
+                        # Encoded bytes are decoded at reduced scale straight into the model input
+                        # Decode once at the looser of the display and index thresholds
+                        decoded, cache_hit = result_cache.detect(
+                            detector, image_bytes, lambda: image_bytes,
+                            min(confidence_threshold, INDEX_MIN_SCORE))
+                        detections = decoded.filter(confidence_threshold)
+                        # Index each distinct image once
+                        name = uploaded_file if isinstance(uploaded_file, str) else uploaded_file.name
+                        index_key = f"{name}#{DetectionCache.make_key(image_bytes, detector.model_id)[:12]}"
+                        if index_key not in detection_index:
+                            detection_index.add(index_key, decoded.filter(INDEX_MIN_SCORE))
+                    detections = detections.to_dicts()
+                except Exception as e:
+                    print(f"❌ Detection error: {e}")
+                    detections, cache_hit = [], False
+                detection_time = time.perf_counter() - start_time
                 
                 progress_bar.progress(75)
                 status_text.text("🎨 Drawing results...")
                 
                 if detections:
                     # Draw detections
-                    result_image = detector.draw_detections(image_cv, detections)
-                    result_image_rgb = cv2.cvtColor(result_image, cv2.COLOR_BGR2RGB)
+                    result_image_rgb = detector.draw_detections(
+                        to_rgb_array(), detections, inplace=True, channel_order='rgb')
                     
                     progress_bar.progress(100)
                     status_text.text("✅ Detection complete!")
@@ -223,7 +291,8 @@ def main():
                     with col_a:
                         st.metric("Objects Found", len(detections))
                     with col_b:
-                        st.metric("Detection Time", f"{detection_time:.2f}s")
+                        st.metric("Detection Time", f"{detection_time:.2f}s",
+                                  delta="cached" if cache_hit else None, delta_color="off")
                     with col_c:
                         avg_confidence = sum(d['confidence'] for d in detections) / len(detections)
                         st.metric("Avg Confidence", f"{avg_confidence:.2f}")
@@ -308,6 +377,49 @@ def main():
             
             **And many more...**
             """)
+        
+        st.subheader("📈 Detector Metrics")
+        metrics = detector.metrics
+        snapshot = metrics.snapshot()
+        
+        st.write(f"**Images processed:** {snapshot['images']}")
+        if snapshot['errors']:
+            st.write("**Errors:** " + ", ".join(f"{stage}: {count}"
+                                              for stage, count in snapshot['errors'].items()))
+        
+        latency_rows = [
+            {'Stage': name, 'Count': stats['count'], 'Mean (ms)': round(stats['mean_ms'], 2),
+             'p50 (ms)': round(stats['p50_ms'], 2), 'p95 (ms)': round(stats['p95_ms'], 2),
+             'p99 (ms)': round(stats['p99_ms'], 2), 'Max (ms)': round(stats['max_ms'], 2)}
+            for name, stats in list(snapshot['stages'].items()) + list(snapshot['calls'].items())
+            if stats['count']
+        ]
+        if latency_rows:
+            st.table(latency_rows)
+        else:
+            st.info("Run a detection to collect stage timings")
+        
+        if snapshot['detections']:
+            top_classes = sorted(snapshot['detections'].items(), key=lambda item: -item[1])[:10]
+            st.write("**Most detected:** " + ", ".join(f"{name} ({count})"
+                                                      for name, count in top_classes))
+        
+        with st.expander("🔬 Profile Detections"):
+            profile_calls = st.number_input("Detections to profile", min_value=1, max_value=100,
+                                            value=5)
+            if st.button("Profile next detections"):
+                st.session_state['profile_capture'] = metrics.profile_next(int(profile_calls))
+            capture = st.session_state.get('profile_capture')
+            if capture is not None:
+                if capture.done:
+                    st.code(capture.report)
+                else:
+                    st.write(f"Profiling... {capture.calls}/{capture.num_calls} detections captured")
+        
+        with st.expander("📤 Prometheus Export"):
+            st.code(metrics.to_prometheus())
+        if st.button("Reset Metrics"):
+            metrics.reset()
     
     with tab3:
         st.subheader("🧪 System Test Results")
@@ -323,24 +435,36 @@ def main():
                 
                 # Test 2: Dependencies
                 st.write("**Test 2: Dependencies Check**")
-                try:
-                    import tensorflow as tf_test
-                    import cv2 as cv2_test
-                    import numpy as np_test
-                    import streamlit as st_version
-                    
+                # Read versions from package metadata so this tab never imports TensorFlow
+                versions = {}
+                for package in ('tensorflow', 'cv2', 'numpy', 'streamlit'):
+                    if package == 'cv2':
+                        # OpenCV ships as opencv-python, -headless, -contrib...; ask the module
+                        try:
+                            import cv2
+                            versions['opencv (cv2)'] = cv2.__version__
+                        except ImportError:
+                            versions['opencv (cv2)'] = None
+                        continue
+                    try:
+                        versions[package] = version(package)
+                    except PackageNotFoundError:
+                        versions[package] = None
+                
+                if all(versions.values()):
                     st.success("✅ All dependencies available")
-                    st.write(f"- TensorFlow: {tf_test.__version__}")
-                    st.write(f"- OpenCV: {cv2_test.__version__}")
-                    st.write(f"- NumPy: {np_test.__version__}")
-                    st.write(f"- Streamlit: {st_version.__version__}")
-                    
-                except Exception as e:
-                    st.error(f"❌ Dependency issue: {e}")
+                else:
+                    st.warning("⚠️ Some packages are not installed (fine if the backend does not need them)")
+                for package, package_version in versions.items():
+                    st.write(f"- {package}: {package_version or 'not installed'}")
+                st.write(f"- Inference backend: {detector.backend.name}")
                 
                 # Test 3: GPU availability
                 st.write("**Test 3: Hardware Acceleration**")
-                if tf_test.config.list_physical_devices('GPU'):
+                tf_module = sys.modules.get('tensorflow')
+                if tf_module is None:
+                    st.info(f"ℹ️ TensorFlow not loaded by the {detector.backend.name} backend (CPU runtime)")
+                elif tf_module.config.list_physical_devices('GPU'):
                     st.success("✅ GPU available for acceleration")
                 else:
                     st.info("ℹ️ Running on CPU (normal for most setups)")
@@ -352,6 +476,67 @@ def main():
                 else:
                     st.warning("⚠️ Check internet connection for model downloads")
     
+    with tab4:
+        st.subheader("🗂️ Detection Index")
+        index_stats = detection_index.stats()
+        col_a, col_b, col_c = st.columns(3)
+        with col_a:
+            st.metric("Indexed Images", index_stats['images'])
+        with col_b:
+            st.metric("Detections", index_stats['detections'])
+        with col_c:
+            st.metric("On Disk", f"{index_stats['disk_bytes'] / 1024:.1f} KB")
+        st.caption(f"Images are indexed as they are analysed (detections ≥ {INDEX_MIN_SCORE}); "
+                   "add folders with `python batch_detect.py <folder> --format index "
+                   "--output detection_index`.")
+        
+        if index_stats['images']:
+            class_counts = detection_index.class_counts(INDEX_MIN_SCORE)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                query_class = st.selectbox("Object Class", list(class_counts)
+                                           or [name for name in detector.class_names if name])
+            with col2:
+                min_count = st.number_input("At Least", min_value=1, max_value=100, value=1)
+            with col3:
+                min_score = st.slider("Min Confidence", min_value=INDEX_MIN_SCORE, max_value=1.0,
+                                      value=max(confidence_threshold, INDEX_MIN_SCORE), step=0.05)
+            region = None
+            if st.checkbox("Only boxes overlapping a region"):
+                region_cols = st.columns(4)
+                region = [column.number_input(label, min_value=0, value=value, step=10)
+                          for column, label, value in zip(region_cols, ("x1", "y1", "x2", "y2"),
+                                                          (0, 0, 300, 300))]
+            
+            start_time = time.perf_counter()
+            if region:
+                boxes = detection_index.find_boxes(query_class, region, min_score)
+                counts = {}
+                for key in boxes['image_keys']:
+                    counts[key] = counts.get(key, 0) + 1
+                matches = [(key, count) for key, count in counts.items() if count >= min_count]
+            else:
+                matches = detection_index.images_with(query_class, min_count, min_score)
+            query_time = time.perf_counter() - start_time
+            st.write(f"**{len(matches)} images** with ≥{min_count} {query_class} "
+                     f"(query took {query_time * 1000:.1f} ms)")
+            
+            for key, count in matches[:12]:
+                path = key.split('#')[0]
+                with st.expander(f"{path} — {count} × {query_class}"):
+                    stored = detection_index.image_detections(key, min_score).to_dicts()
+                    if os.path.exists(path):
+                        from PIL import Image
+                        rgb = np.array(Image.open(path).convert('RGB'))
+                        st.image(detector.draw_detections(rgb, stored, inplace=True,
+                                                          channel_order='rgb'),
+                                 use_column_width=True)
+                    for detection in stored:
+                        st.write(f"• {detection['class_name']} {detection['confidence']:.2f} "
+                                 f"{detection['bbox']}")
+        else:
+            st.info("ℹ️ Nothing indexed yet - analyse an image in the first tab.")
+    
     # Footer
     st.markdown("---")
     st.markdown("""
@@ -0,0 +1,223 @@
+# async_detector.py - asyncio front end for StreamlitSSDDetector
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+async def _iterate(images):
+    """Iterate a sync or async iterable of images"""
+    if hasattr(images, '__aiter__'):
+        async for image in images:
+            yield image
+    else:
+        for image in images:
+            yield image
+
+
+class AsyncSSDDetector:
+    """Non-blocking detection for asyncio services
+
+    Requests are queued on the event loop and coalesced into batches:
+    awaiters that arrive within max_wait_ms of each other share one model
+    call. Preprocessing and inference run on a dedicated thread pool with
+    at most max_concurrency batches in flight, so the event loop never
+    blocks on the model. A request that times out or is cancelled before
+    its batch starts never reaches the model.
+
+    Usage:
+        async with AsyncSSDDetector(StreamlitSSDDetector()) as detector:
+            detections = await detector.detect(image, timeout=2.0)
+            async for detections in detector.stream(frames):
+                ...
+
+    Args:
+        detector (StreamlitSSDDetector): loaded on start() if it is not yet
+        max_batch_size (int): largest batch sent to the model
+        max_wait_ms (float): how long the first request waits for company
+        max_concurrency (int): batches running on the executor at once
+        max_pending (int): queued requests before detect() waits for room
+        request_timeout (float): default per-request timeout in seconds, None for no limit
+    """
+
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=5, max_concurrency=1,
+                 max_pending=64, request_timeout=None):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.request_timeout = request_timeout
+        self.batches = 0
+        self.images = 0
+        self.cancelled = 0
+        self._executor = None
+        self._batcher = None
+        self._pending = deque()
+
+    async def start(self):
+        """Start the executor and batcher, loading the model off the event loop"""
+        loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(self.max_concurrency,
+                                            thread_name_prefix='ssd-inference')
+        if not self.detector.model_loaded:
+            loaded = await loop.run_in_executor(self._executor, self.detector.load_model)
+            if not loaded:
+                self._executor.shutdown(wait=False)
+                raise RuntimeError("Model failed to load")
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._running = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = set()
+        self._batcher = loop.create_task(self._batch_loop())
+        return self
+
+    async def close(self):
+        """Stop batching, cancel queued requests and release the executor"""
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+        while self._pending:
+            self._pending.popleft()[3].cancel()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def detect(self, image, confidence_threshold=None, timeout=None, channel_order='bgr'):
+        """Detect objects in one image without blocking the event loop
+
+        Args:
+            image: image in any format preprocess_into accepts
+            confidence_threshold (float): defaults to the detector's threshold
+            timeout (float): seconds before asyncio.TimeoutError, defaults to request_timeout
+            channel_order (str): 'bgr' or 'rgb' for NumPy input
+
+        Returns:
+            Detections: the image's detections
+        """
+        if self._batcher is None:
+            raise RuntimeError("Call start() or use 'async with' first")
+        if confidence_threshold is None:
+            confidence_threshold = self.detector.confidence_threshold
+        if timeout is None:
+            timeout = self.request_timeout
+
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda _: self._slots.release())
+        self._pending.append((image, confidence_threshold, channel_order, future))
+        self._wakeup.set()
+        # Cancelling or timing out the wait cancels the future, which drops the request
+        return await asyncio.wait_for(future, timeout)
+
+    async def stream(self, images, confidence_threshold=None, max_in_flight=None):
+        """Yield detections for a sync or async iterable of images, in order
+
+        Up to max_in_flight requests (default two batches) are outstanding
+        at once so consecutive images share batches. Closing the generator
+        early cancels whatever is still queued.
+        """
+        max_in_flight = max_in_flight or self.max_batch_size * 2
+        in_flight = deque()
+        try:
+            async for image in _iterate(images):
+                in_flight.append(asyncio.ensure_future(self.detect(image, confidence_threshold)))
+                if len(in_flight) >= max_in_flight:
+                    yield await in_flight.popleft()
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            # Give concurrent awaiters max_wait to join the batch
+            deadline = loop.time() + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            await self._running.acquire()
+            batch = []
+            while self._pending and len(batch) < self.max_batch_size:
+                request = self._pending.popleft()
+                if request[3].done():
+                    self.cancelled += 1
+                else:
+                    batch.append(request)
+            if not batch:
+                self._running.release()
+                continue
+            task = loop.create_task(self._run_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._executor, self._infer, batch)
+            for (_, threshold, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result.filter(threshold))
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.batches += 1
+            self.images += len(batch)
+            self._running.release()
+
+    def _infer(self, batch):
+        """Executor side: preprocess and run one batch; per-request errors are returned"""
+        width, height = self.detector.input_size
+        inputs = np.empty((len(batch), height, width, 3), dtype=np.uint8)
+        results = [None] * len(batch)
+        rows, sizes = [], []
+        for i, (image, _, channel_order, _) in enumerate(batch):
+            try:
+                sizes.append(self.detector.preprocess_into(image, inputs[len(rows)], channel_order))
+                rows.append(i)
+            except Exception as e:
+                results[i] = e
+        if rows:
+            # Decode at the loosest requested threshold, then filter per request
+            lowest = min(batch[i][1] for i in rows)
+            try:
+                detections = self.detector.infer_batch(inputs[:len(rows)], sizes, lowest,
+                                                       raise_errors=True)
+            except Exception as e:
+                # A model error fails every awaiter in the batch rather than returning nothing
+                detections = [e] * len(rows)
+            for i, result in zip(rows, detections):
+                results[i] = result
+        return results
@@ -0,0 +1,317 @@
+# batch_detect.py - Bulk folder / dataset detection with streaming, resumable output
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from streamlit_detector import StreamlitSSDDetector
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def iter_image_paths(inputs):
+    """Yield image paths from directories (walked recursively), files and file lists
+
+    A .txt input is read as a list of image paths, one per line.
+    """
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif item.lower().endswith('.txt'):
+            with open(item) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield line
+        else:
+            yield item
+
+
+def decode_image(path):
+    """Read an image from disk; returns (path, BGR array or None)"""
+    import cv2
+    return path, cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+def open_for_append(path):
+    """Open a line-oriented file for appending, dropping a partial last line
+
+    A run killed mid-write leaves half a line behind; appending after it
+    would glue the next record onto the fragment.
+    """
+    if os.path.exists(path):
+        with open(path, 'rb+') as f:
+            # Scan back from the end in blocks for the last newline
+            end = position = f.seek(0, os.SEEK_END)
+            while position > 0:
+                start = max(0, position - 65536)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b'\n')
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                f.truncate(position)
+    return open(path, 'a')
+
+
+class Checkpoint:
+    """Append-only record of completed files so an interrupted run can resume"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = {line[:-1] for line in f if line.endswith('\n')}
+        self._file = open_for_append(path)
+
+    def __contains__(self, image_path):
+        return image_path in self.done
+
+    def mark(self, image_paths):
+        self._file.write(''.join(f"{path}\n" for path in image_paths))
+        self._file.flush()
+        self.done.update(image_paths)
+
+    def close(self):
+        self._file.close()
+
+
+class JsonLinesWriter:
+    """One JSON object per image"""
+
+    def __init__(self, path):
+        self.file = open_for_append(path)
+
+    def write(self, image_path, image_shape, detections):
+        record = {
+            'image': image_path,
+            'height': image_shape[0],
+            'width': image_shape[1],
+            # class_id keeps the model's category id next to its display name
+            'detections': [dict(detection, class_id=class_id) for detection, class_id
+                           in zip(detections.to_dicts(), detections.class_ids.tolist())],
+        }
+        self.file.write(json.dumps(record) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CocoResultsWriter:
+    """COCO results-format detections, streamed as JSON lines during the run
+
+    Records are appended to '<path>.parts' while images are processed (so an
+    interrupted run loses nothing), then finalize() rewrites them line by
+    line into the JSON array pycocotools expects, without loading them all.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parts_path = path + '.parts'
+        self.file = open_for_append(self.parts_path)
+
+    @staticmethod
+    def image_id(image_path):
+        """COCO file names are numeric ids (000000397133.jpg); fall back to the stem"""
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        return int(stem) if stem.isdigit() else stem
+
+    def write(self, image_path, image_shape, detections):
+        image_id = self.image_id(image_path)
+        for (x1, y1, x2, y2), score, class_id in zip(detections.boxes.tolist(),
+                                                     detections.scores.tolist(),
+                                                     detections.class_ids.tolist()):
+            self.file.write(json.dumps({
+                'image_id': image_id,
+                'category_id': class_id,
+                'bbox': [x1, y1, x2 - x1, y2 - y1],
+                'score': round(score, 5),
+            }) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        self.finalize()
+
+    def finalize(self):
+        with open(self.parts_path) as parts, open(self.path, 'w') as out:
+            out.write('[')
+            first = True
+            for line in parts:
+                line = line.strip()
+                if line:
+                    out.write(('' if first else ',\n') + line)
+                    first = False
+            out.write(']\n')
+
+
+class IndexWriter:
+    """Detections appended to a DetectionIndex directory for later queries"""
+
+    def __init__(self, path):
+        from detection_index import DetectionIndex
+        self.index = DetectionIndex(path)
+
+    def write(self, image_path, image_shape, detections):
+        self.index.add(image_path, detections)
+
+    def flush(self):
+        self.index.flush()
+
+    def close(self):
+        self.index.close()
+
+
+def _make_pool(kind, workers):
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def run_batch(detector, image_paths, writer, checkpoint=None, batch_size=8, workers=4,
+              pool='thread', progress_every=100):
+    """Detect objects in every image, streaming results to writer
+
+    Decoding runs in a thread (cv2 releases the GIL) or process pool with
+    only a bounded window of images in flight; decoded images are fed to
+    detect_batch-style batched inference and written as soon as each batch
+    finishes.
+
+    Returns:
+        dict: processed / skipped / failed counts, elapsed time and images/sec
+    """
+    width, height = detector.input_size
+    batch = np.empty((batch_size, height, width, 3), dtype=np.uint8)
+    stats = {'processed': 0, 'skipped': 0, 'failed': 0}
+    start = time.perf_counter()
+    last_report = 0
+
+    def pending_paths():
+        for path in image_paths:
+            if checkpoint is not None and path in checkpoint:
+                stats['skipped'] += 1
+                continue
+            yield path
+
+    def flush(paths, shapes):
+        results = detector.infer_batch(batch[:len(paths)], shapes)
+        for path, shape, detections in zip(paths, shapes, results):
+            writer.write(path, shape, detections)
+        writer.flush()
+        if checkpoint is not None:
+            checkpoint.mark(paths)
+        stats['processed'] += len(paths)
+
+    with _make_pool(pool, workers) as executor:
+        # Keep a bounded window of decodes in flight so memory stays flat
+        window = max(batch_size * 2, workers * 2)
+        paths = iter(pending_paths())
+        in_flight = deque()
+        for path in paths:
+            in_flight.append(executor.submit(decode_image, path))
+            if len(in_flight) >= window:
+                break
+
+        batch_paths, batch_shapes = [], []
+        while in_flight:
+            path, image = in_flight.popleft().result()
+            next_path = next(paths, None)
+            if next_path is not None:
+                in_flight.append(executor.submit(decode_image, next_path))
+
+            if image is None:
+                print(f"⚠️ Could not read {path}")
+                stats['failed'] += 1
+                continue
+
+            batch_shapes.append(detector.preprocess_into(image, batch[len(batch_paths)]))
+            batch_paths.append(path)
+            if len(batch_paths) == batch_size:
+                flush(batch_paths, batch_shapes)
+                batch_paths, batch_shapes = [], []
+
+            if stats['processed'] - last_report >= progress_every:
+                last_report = stats['processed']
+                elapsed = time.perf_counter() - start
+                print(f"🔄 {stats['processed']} images, {stats['processed'] / elapsed:.1f} images/sec",
+                      file=sys.stderr)
+
+        if batch_paths:
+            flush(batch_paths, batch_shapes)
+
+    stats['elapsed_seconds'] = time.perf_counter() - start
+    stats['images_per_sec'] = (stats['processed'] / stats['elapsed_seconds']
+                               if stats['elapsed_seconds'] > 0 else 0.0)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SSD detection over folders of images")
+    parser.add_argument('inputs', nargs='+', help="Directories, image files or .txt file lists")
+    parser.add_argument('--output', required=True, help="Output file (directory for --format index)")
+    parser.add_argument('--format', choices=('jsonl', 'coco', 'index'), default='jsonl')
+    parser.add_argument('--checkpoint', default=None,
+                        help="Completed-files log for resuming (default: <output>.done)")
+    parser.add_argument('--no-resume', action='store_true', help="Start over, ignoring the checkpoint")
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--pool', choices=('thread', 'process'), default='thread')
+    parser.add_argument('--backend', default=None)
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or args.output + '.done'
+    if args.no_resume:
+        for path in (checkpoint_path, args.output, args.output + '.parts'):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    detector = StreamlitSSDDetector(confidence_threshold=args.threshold, backend=args.backend)
+    if not detector.load_model():
+        print("❌ Cannot run detection without a loaded model")
+        raise SystemExit(1)
+
+    if args.format == 'coco':
+        writer = CocoResultsWriter(args.output)
+    elif args.format == 'index':
+        writer = IndexWriter(args.output)
+    else:
+        writer = JsonLinesWriter(args.output)
+    checkpoint = Checkpoint(checkpoint_path)
+    if checkpoint.done:
+        print(f"⏩ Resuming: {len(checkpoint.done)} images already done")
+
+    try:
+        stats = run_batch(detector, iter_image_paths(args.inputs), writer, checkpoint,
+                          batch_size=args.batch_size, workers=args.workers, pool=args.pool)
+    finally:
+        writer.close()
+        checkpoint.close()
+
+    print(f"✅ {stats['processed']} images in {stats['elapsed_seconds']:.1f}s "
+          f"({stats['images_per_sec']:.1f} images/sec), {stats['skipped']} skipped, "
+          f"{stats['failed']} unreadable")
+
+
+if __name__ == "__main__":
+    main()
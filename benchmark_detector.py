@@ -0,0 +1,419 @@
+# benchmark_detector.py - Benchmarks for the SSD detector hot path
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from box_utils import box_areas, match_detections
+from detector_backends import StubBackend
+from streamlit_detector import StreamlitSSDDetector
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+IMAGE_SIZES = {
+    'vga': (640, 480),
+    'hd': (1280, 720),
+    'fhd': (1920, 1080),
+    '4k': (3840, 2160),
+}
+DETECTION_COUNTS = (0, 10, 50, 100)
+SMALL_OBJECT_AREA = 32 * 32
+
+
+def load_benchmark_images(folder=None, num_images=32, size=(640, 480)):
+    """Load images from a folder, or synthesize random frames if none are found"""
+    images = []
+    if folder and os.path.isdir(folder):
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                image = cv2.imread(os.path.join(folder, name))
+                if image is not None:
+                    images.append(image)
+
+    if not images:
+        rng = np.random.default_rng(0)
+        width, height = size
+        return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+                for _ in range(num_images)]
+
+    # Cycle through the folder so every run uses the same number of images
+    return [images[i % len(images)] for i in range(num_images)]
+
+
+def compare_batch_throughput(detector, images, batch_size=8, repeats=3):
+    """Compare the per-image detect_objects loop against detect_batch
+
+    Returns:
+        dict: best-of-N images/sec for both paths and the batch speedup
+    """
+    # Warm up both paths so graph tracing is not counted
+    detector.detect_objects(images[0])
+    detector.detect_batch(images[:batch_size], batch_size=batch_size)
+
+    loop_times = []
+    batch_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for image in images:
+            detector.detect_objects(image)
+        loop_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        detector.detect_batch(images, batch_size=batch_size)
+        batch_times.append(time.perf_counter() - start)
+
+    loop_ips = len(images) / min(loop_times)
+    batch_ips = len(images) / min(batch_times)
+    return {
+        'num_images': len(images),
+        'batch_size': batch_size,
+        'model_batching': detector.supports_batching,
+        'loop_images_per_sec': loop_ips,
+        'batch_images_per_sec': batch_ips,
+        'speedup': batch_ips / loop_ips,
+    }
+
+
+def summarize_latencies(latencies):
+    """p50/p95/p99/mean in milliseconds plus images/sec for per-call timings"""
+    values = np.asarray(latencies) * 1000
+    mean = float(values.mean())
+    return {
+        'iterations': len(values),
+        'mean_ms': mean,
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'images_per_sec': 1000 / mean if mean > 0 else float('inf'),
+    }
+
+
+def time_call(fn, iterations, warmup=2):
+    """Time fn() per call after a few untimed warm-up calls"""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize_latencies(latencies)
+
+
+def run_stage_benchmarks(detector, sizes=tuple(IMAGE_SIZES), detection_counts=DETECTION_COUNTS,
+                         iterations=50):
+    """Benchmark each stage of the detection path separately
+
+    Stages:
+        pil_to_opencv  np.array(PIL) + RGB->BGR (app.py now skips this by detecting in RGB)
+        preprocess     detector.preprocess_into (resize + channel swap)
+        forward        one model call on a preprocessed image
+        postprocess    decode + to_dicts for a given detection count
+        draw           draw_detections for a given detection count
+
+    Post-processing and drawing use StubBackend outputs so the detection
+    count is controlled regardless of the backend under test.
+
+    Returns:
+        dict: 'stage/size[/detections]' -> latency summary
+    """
+    rng = np.random.default_rng(0)
+    width, height = detector.input_size
+    model_input = np.empty((1, height, width, 3), dtype=np.uint8)
+    results = {}
+
+    model_input[0] = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    results['forward'] = time_call(lambda: detector._run_model(model_input), iterations)
+
+    for size_name in sizes:
+        image_width, image_height = IMAGE_SIZES[size_name]
+        image_rgb = rng.integers(0, 256, (image_height, image_width, 3), dtype=np.uint8)
+        pil_image = Image.fromarray(image_rgb)
+        image_bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+
+        results[f'pil_to_opencv/{size_name}'] = time_call(
+            lambda: cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR), iterations)
+        results[f'preprocess/{size_name}'] = time_call(
+            lambda: detector.preprocess_into(image_bgr, model_input[0]), iterations)
+
+        for count in detection_counts:
+            raw = StubBackend(num_detections=count).predict(model_input)
+            detections = detector._decode_batch(raw, [(image_height, image_width)])[0].to_dicts()
+            results[f'postprocess/{size_name}/{count}'] = time_call(
+                lambda: detector._decode_batch(raw, [(image_height, image_width)])[0].to_dicts(),
+                iterations)
+            results[f'draw/{size_name}/{count}'] = time_call(
+                lambda: detector.draw_detections(image_bgr, detections), iterations)
+
+    return results
+
+
+def load_coco_ground_truth(annotations_path):
+    """Ground-truth boxes per file name from a COCO instances JSON
+
+    Returns:
+        dict: file name -> ((N, 4) [x1, y1, x2, y2] boxes, (N,) category ids)
+    """
+    with open(annotations_path) as f:
+        coco = json.load(f)
+    file_names = {image['id']: image['file_name'] for image in coco['images']}
+    boxes = {name: [] for name in file_names.values()}
+    classes = {name: [] for name in file_names.values()}
+    for annotation in coco['annotations']:
+        if annotation.get('iscrowd'):
+            continue
+        name = file_names[annotation['image_id']]
+        x, y, w, h = annotation['bbox']
+        boxes[name].append([x, y, x + w, y + h])
+        classes[name].append(annotation['category_id'])
+    return {name: (np.array(boxes[name], dtype=np.float64).reshape(-1, 4),
+                   np.array(classes[name], dtype=np.int32))
+            for name in file_names.values()}
+
+
+def _recall(detections, gt_boxes, gt_classes, iou_threshold=0.5):
+    """Matched ground-truth counts: (all, small objects)"""
+    pairs = match_detections(gt_boxes, gt_classes, detections.boxes, detections.class_ids,
+                             iou_threshold)
+    matched = np.zeros(len(gt_boxes), dtype=bool)
+    matched[[i for i, _ in pairs]] = True
+    small = box_areas(gt_boxes) < SMALL_OBJECT_AREA
+    return int(matched.sum()), int(matched[small].sum())
+
+
+def compare_tiled_inference(detector, images, ground_truth=None, tile_size=512, overlap=0.2,
+                            include_full_frame=True, repeats=3):
+    """Latency cost of detect_tiled against the detections or recall it gains
+
+    Args:
+        detector (StreamlitSSDDetector): detector with a loaded model
+        images (list): images, BGR arrays
+        ground_truth (list): optional (boxes, class ids) per image for recall
+        tile_size (int), overlap (float), include_full_frame (bool): tiling options
+        repeats (int): timed runs per image; the fastest counts
+
+    Returns:
+        dict: per-mode latency summaries and detection counts, plus recall
+            (overall and for objects under 32x32 px) when ground truth is given
+    """
+    modes = {
+        'full_frame': lambda image: detector.detect(image),
+        'tiled': lambda image: detector.detect_tiled(image, tile_size, overlap,
+                                                     include_full_frame),
+    }
+    report = {'tile_size': tile_size, 'overlap': overlap, 'num_images': len(images)}
+    for mode, fn in modes.items():
+        fn(images[0])
+        latencies = []
+        counts = {'detections': 0, 'ground_truth': 0, 'small_ground_truth': 0,
+                  'matched': 0, 'small_matched': 0}
+        for index, image in enumerate(images):
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                detections = fn(image)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            latencies.append(best)
+            counts['detections'] += len(detections)
+            if ground_truth is not None:
+                gt_boxes, gt_classes = ground_truth[index]
+                matched, small_matched = _recall(detections, gt_boxes, gt_classes)
+                counts['ground_truth'] += len(gt_boxes)
+                counts['small_ground_truth'] += int((box_areas(gt_boxes) < SMALL_OBJECT_AREA).sum())
+                counts['matched'] += matched
+                counts['small_matched'] += small_matched
+
+        result = summarize_latencies(latencies)
+        result['detections'] = counts['detections']
+        if ground_truth is not None:
+            result['recall'] = counts['matched'] / max(counts['ground_truth'], 1)
+            result['small_recall'] = counts['small_matched'] / max(counts['small_ground_truth'], 1)
+        report[mode] = result
+
+    report['latency_ratio'] = report['tiled']['mean_ms'] / report['full_frame']['mean_ms']
+    return report
+
+
+def compare_results(current, baseline, tolerance=0.10, metric='p50_ms'):
+    """Find benchmarks that got slower than the baseline by more than tolerance
+
+    Returns:
+        list: (name, baseline value, current value, ratio) for each regression
+    """
+    regressions = []
+    for name, stats in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name][metric]
+        after = stats[metric]
+        if before > 0 and after > before * (1 + tolerance):
+            regressions.append((name, before, after, after / before))
+    return regressions
+
+
+def _run_batch_command(args):
+    detector = StreamlitSSDDetector(confidence_threshold=0.5, backend=args.backend)
+    if not detector.load_model():
+        print("❌ Cannot benchmark without a loaded model")
+        raise SystemExit(1)
+
+    images = load_benchmark_images(args.images, args.num_images)
+    stats = compare_batch_throughput(detector, images, args.batch_size, args.repeats)
+
+    print(f"📊 {stats['num_images']} images, batch size {stats['batch_size']}")
+    print(f"   Per-image loop: {stats['loop_images_per_sec']:.1f} images/sec")
+    print(f"   detect_batch:   {stats['batch_images_per_sec']:.1f} images/sec")
+    print(f"   Speedup:        {stats['speedup']:.2f}x")
+    if not stats['model_batching']:
+        print("ℹ️ Model does not accept batched input; detect_batch ran one model call per image")
+
+
+def _run_tiles_command(args):
+    detector = StreamlitSSDDetector(confidence_threshold=args.threshold, backend=args.backend,
+                                    nms_threshold=args.nms_threshold)
+    if not detector.load_model():
+        print("❌ Cannot benchmark without a loaded model")
+        raise SystemExit(1)
+
+    ground_truth = None
+    if args.annotations:
+        annotations = load_coco_ground_truth(args.annotations)
+        images, ground_truth = [], []
+        for name in sorted(annotations)[:args.num_images]:
+            image = cv2.imread(os.path.join(args.images, name))
+            if image is not None:
+                images.append(image)
+                ground_truth.append(annotations[name])
+        if not images:
+            print(f"❌ No annotated images found in {args.images}")
+            raise SystemExit(1)
+    else:
+        images = load_benchmark_images(args.images, args.num_images, IMAGE_SIZES['4k'])
+
+    report = compare_tiled_inference(detector, images, ground_truth, args.tile_size,
+                                     args.overlap, not args.no_full_frame, args.repeats)
+
+    print(f"📊 {report['num_images']} images, {args.tile_size}px tiles, {args.overlap:.0%} overlap")
+    for mode in ('full_frame', 'tiled'):
+        stats = report[mode]
+        line = (f"   {mode:<11} p50 {stats['p50_ms']:8.1f} ms   p95 {stats['p95_ms']:8.1f} ms   "
+                f"{stats['detections']:6d} detections")
+        if ground_truth is not None:
+            line += f"   recall {stats['recall']:.3f}   small-object recall {stats['small_recall']:.3f}"
+        print(line)
+    print(f"   Tiling costs {report['latency_ratio']:.2f}x the full-frame latency")
+    if ground_truth is None:
+        print("ℹ️ Pass --annotations (COCO instances JSON) to measure recall instead of counts")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+
+def _run_stages_command(args):
+    backend = args.backend
+    backend_options = {'num_detections': 10} if backend == 'stub' else None
+    detector = StreamlitSSDDetector(confidence_threshold=0.5, backend=backend,
+                                    backend_options=backend_options, warmup=False)
+    if not detector.load_model():
+        print("❌ Cannot benchmark without a loaded model")
+        raise SystemExit(1)
+
+    results = run_stage_benchmarks(detector, args.sizes, args.detections, args.iterations)
+
+    print(f"📊 Stage latencies ({detector.backend.name} backend, {args.iterations} iterations)")
+    print(f"{'benchmark':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'img/s':>10}")
+    for name, stats in results.items():
+        print(f"{name:<26} {stats['p50_ms']:9.3f} {stats['p95_ms']:9.3f} "
+              f"{stats['p99_ms']:9.3f} {stats['images_per_sec']:10.1f}")
+
+    report = {
+        'meta': {
+            'backend': detector.backend.name,
+            'model_id': detector.model_id,
+            'iterations': args.iterations,
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare_results(results, baseline, args.tolerance, args.metric)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) over {args.tolerance:.0%} ({args.metric}):")
+            for name, before, after, ratio in regressions:
+                print(f"   {name:<26} {before:9.3f} -> {after:9.3f} ms ({ratio:.2f}x)")
+            raise SystemExit(1)
+        print(f"\n✅ No regressions over {args.tolerance:.0%} against {args.compare}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SSD detector")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    stages_parser = subparsers.add_parser('stages', help="Per-stage latency suite")
+    stages_parser.add_argument('--backend', default='stub',
+                               help="Inference backend; 'stub' runs offline without a model")
+    stages_parser.add_argument('--sizes', nargs='+', choices=list(IMAGE_SIZES),
+                               default=list(IMAGE_SIZES))
+    stages_parser.add_argument('--detections', nargs='+', type=int, default=list(DETECTION_COUNTS))
+    stages_parser.add_argument('--iterations', type=int, default=50)
+    stages_parser.add_argument('--output', default=None, help="Write results as JSON")
+    stages_parser.add_argument('--compare', default=None, help="Baseline JSON to compare against")
+    stages_parser.add_argument('--tolerance', type=float, default=0.10,
+                               help="Allowed slowdown before flagging a regression")
+    stages_parser.add_argument('--metric', default='p50_ms', choices=('p50_ms', 'p95_ms', 'p99_ms'))
+
+    batch_parser = subparsers.add_parser('batch', help="detect_batch vs per-image loop")
+    batch_parser.add_argument('--backend', default=None)
+    batch_parser.add_argument('--images', default='sample_images',
+                              help="Folder of images (random frames are used if empty)")
+    batch_parser.add_argument('--num-images', type=int, default=32)
+    batch_parser.add_argument('--batch-size', type=int, default=8)
+    batch_parser.add_argument('--repeats', type=int, default=3)
+
+    tiles_parser = subparsers.add_parser('tiles', help="Tiled inference latency vs recall")
+    tiles_parser.add_argument('--backend', default=None)
+    tiles_parser.add_argument('--images', default='sample_images',
+                              help="Folder of images (random 4K frames are used if empty)")
+    tiles_parser.add_argument('--annotations', default=None,
+                              help="COCO instances JSON for the images, to measure recall")
+    tiles_parser.add_argument('--num-images', type=int, default=16)
+    tiles_parser.add_argument('--tile-size', type=int, default=512)
+    tiles_parser.add_argument('--overlap', type=float, default=0.2)
+    tiles_parser.add_argument('--no-full-frame', action='store_true',
+                              help="Skip the extra whole-image pass for large objects")
+    tiles_parser.add_argument('--threshold', type=float, default=0.5)
+    tiles_parser.add_argument('--nms-threshold', type=float, default=0.5)
+    tiles_parser.add_argument('--repeats', type=int, default=3)
+    tiles_parser.add_argument('--output', default=None, help="Write results as JSON")
+
+    args = parser.parse_args()
+    if args.command == 'stages':
+        _run_stages_command(args)
+    elif args.command == 'tiles':
+        _run_tiles_command(args)
+    else:
+        _run_batch_command(args)
+
+
+if __name__ == "__main__":
+    main()
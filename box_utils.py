@@ -0,0 +1,104 @@
+# box_utils.py - Vectorized bounding-box helpers shared by the detector tools
+import numpy as np
+
+
+def box_areas(boxes):
+    """Areas of (N, 4) [x1, y1, x2, y2] boxes"""
+    boxes = np.asarray(boxes, dtype=np.float64)
+    return (np.maximum(boxes[:, 2] - boxes[:, 0], 0)
+            * np.maximum(boxes[:, 3] - boxes[:, 1], 0))
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """(N, M) IoU between two sets of [x1, y1, x2, y2] boxes"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    overlap = np.clip(bottom_right - top_left, 0, None)
+    intersection = overlap[..., 0] * overlap[..., 1]
+
+    union = box_areas(boxes_a)[:, None] + box_areas(boxes_b)[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def match_detections(boxes_a, classes_a, boxes_b, classes_b, iou_threshold=0.5):
+    """Greedily pair same-class boxes, highest IoU first
+
+    Returns:
+        list: (index_a, index_b) pairs with IoU >= iou_threshold
+    """
+    ious = iou_matrix(boxes_a, boxes_b)
+    ious[np.asarray(classes_a)[:, None] != np.asarray(classes_b)[None, :]] = 0.0
+
+    pairs = []
+    candidates = np.argwhere(ious >= iou_threshold)
+    order = np.argsort(-ious[candidates[:, 0], candidates[:, 1]], kind='stable')
+    used_a = set()
+    used_b = set()
+    for i, j in candidates[order].tolist():
+        if i not in used_a and j not in used_b:
+            used_a.add(i)
+            used_b.add(j)
+            pairs.append((i, j))
+    return pairs
+
+
+# Largest per-class box count suppressed with a dense IoU matrix (~15 MB of temporaries)
+DENSE_NMS_LIMIT = 512
+
+
+def _suppress_group(boxes, areas, order, iou_threshold):
+    """Greedy NMS of one class; order lists its box indices by descending score"""
+    if len(order) <= DENSE_NMS_LIMIT:
+        ious = iou_matrix(boxes[order], boxes[order])
+        suppressed = np.zeros(len(order), dtype=bool)
+        keep = []
+        for i in range(len(order)):
+            if suppressed[i]:
+                continue
+            keep.append(i)
+            suppressed[i + 1:] |= ious[i, i + 1:] > iou_threshold
+        return order[keep]
+
+    # Too many boxes for a matrix: compare the best remaining box with the rest
+    keep = []
+    remaining = order
+    while len(remaining):
+        best, remaining = remaining[0], remaining[1:]
+        keep.append(best)
+        top_left = np.maximum(boxes[best, :2], boxes[remaining, :2])
+        bottom_right = np.minimum(boxes[best, 2:], boxes[remaining, 2:])
+        overlap = np.clip(bottom_right - top_left, 0, None)
+        intersection = overlap[:, 0] * overlap[:, 1]
+        union = areas[best] + areas[remaining] - intersection
+        ious = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+        remaining = remaining[ious <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def non_max_suppression(boxes, scores, class_ids=None, iou_threshold=0.5):
+    """Greedy NMS over [x1, y1, x2, y2] boxes, per class when class_ids is given
+
+    Each class is suppressed on its own, so memory is bounded by the largest
+    class rather than one IoU matrix over every tile's detections.
+
+    Returns:
+        np.ndarray: indices of the kept boxes, highest score first
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(-scores, kind='stable')
+    if class_ids is None:
+        groups = [order]
+    else:
+        class_ids = np.asarray(class_ids)[order]
+        groups = [order[class_ids == class_id] for class_id in np.unique(class_ids)]
+
+    areas = box_areas(boxes)
+    keep = np.concatenate([_suppress_group(boxes, areas, group, iou_threshold)
+                           for group in groups])
+    return keep[np.argsort(-scores[keep], kind='stable')]
@@ -0,0 +1,27 @@
+# coco_labels.py - COCO category ids and names as emitted by the SSD models
+
+# Names indexed by COCO category id; 0 (background) and the ids COCO leaves
+# unused (12, 26, 29, 30, 45, 66, 68, 69, 71, 83) are None
+COCO_LABELS = [
+    None, 'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus',
+    'train', 'truck', 'boat', 'traffic light', 'fire hydrant', None,
+    'stop sign', 'parking meter', 'bench', 'bird', 'cat', 'dog',
+    'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe', None,
+    'backpack', 'umbrella', None, None, 'handbag', 'tie', 'suitcase', 'frisbee',
+    'skis', 'snowboard', 'sports ball', 'kite', 'baseball bat',
+    'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
+    'bottle', None, 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl',
+    'banana', 'apple', 'sandwich', 'orange', 'broccoli', 'carrot',
+    'hot dog', 'pizza', 'donut', 'cake', 'chair', 'couch',
+    'potted plant', 'bed', None, 'dining table', None, None, 'toilet', None, 'tv', 'laptop',
+    'mouse', 'remote', 'keyboard', 'cell phone', 'microwave',
+    'oven', 'toaster', 'sink', 'refrigerator', None, 'book', 'clock',
+    'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush'
+]
+
+# The 80 category names in id order
+COCO_CLASS_NAMES = [name for name in COCO_LABELS if name is not None]
+
+# Category id of every name
+COCO_CATEGORY_IDS = {name: category for category, name in enumerate(COCO_LABELS)
+                     if name is not None}
@@ -0,0 +1,23 @@
+# conftest.py - Shared pytest fixtures: loaded detectors on offline backends
+import pytest
+
+from detector_backends import StubBackend
+from streamlit_detector import StreamlitSSDDetector
+
+
+@pytest.fixture
+def make_detector():
+    """Factory for loaded detectors that never download a model
+
+    make_detector(num_detections=3, latency_ms=20) runs a StubBackend built
+    from the keyword arguments; make_detector(SomeBackend()) runs the given
+    backend instead.
+    """
+    def make(backend=None, confidence_threshold=0.5, **backend_options):
+        if backend is None:
+            backend = StubBackend(**backend_options)
+        detector = StreamlitSSDDetector(confidence_threshold=confidence_threshold,
+                                        backend=backend, warmup=False)
+        assert detector.load_model()
+        return detector
+    return make
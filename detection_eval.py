@@ -0,0 +1,416 @@
+# detection_eval.py - Vectorized COCO-style AP/AR evaluation of detector outputs
+import argparse
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from coco_labels import COCO_CATEGORY_IDS, COCO_LABELS
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_THRESHOLDS = np.linspace(0.0, 1.0, 101)
+MAX_DETECTIONS = (1, 10, 100)
+AREA_RANGES = {
+    'all': (0, 1e10),
+    'small': (0, 32 ** 2),
+    'medium': (32 ** 2, 96 ** 2),
+    'large': (96 ** 2, 1e10),
+}
+
+COCO_CATEGORY_NAMES = {category: name for category, name in enumerate(COCO_LABELS) if name}
+
+# Pascal VOC class names that differ from their COCO equivalents
+VOC_TO_COCO_NAMES = {
+    'aeroplane': 'airplane', 'diningtable': 'dining table', 'motorbike': 'motorcycle',
+    'pottedplant': 'potted plant', 'sofa': 'couch', 'tvmonitor': 'tv',
+}
+
+
+class GroundTruth:
+    """Ground-truth boxes per image
+
+    Attributes:
+        images (dict): image id -> dict of 'boxes' ((G, 4) [x1, y1, x2, y2]),
+            'class_ids', 'areas' and 'ignore' (crowd or difficult) arrays
+        file_ids (dict): file name and file stem -> image id
+        category_ids (list): categories that have at least one annotation
+    """
+
+    def __init__(self, images, file_ids=None):
+        self.images = images
+        self.file_ids = file_ids or {}
+        self.category_ids = sorted({int(c) for gt in images.values() for c in gt['class_ids']})
+
+    @staticmethod
+    def _pack(boxes, class_ids, areas, ignore):
+        return {
+            'boxes': np.array(boxes, dtype=np.float64).reshape(-1, 4),
+            'class_ids': np.array(class_ids, dtype=np.int64),
+            'areas': np.array(areas, dtype=np.float64),
+            'ignore': np.array(ignore, dtype=bool),
+        }
+
+    @classmethod
+    def from_coco(cls, annotations_path):
+        """Load a COCO instances JSON; crowd regions are ignored as in pycocotools"""
+        with open(annotations_path) as f:
+            coco = json.load(f)
+        rows = {image['id']: ([], [], [], []) for image in coco['images']}
+        for annotation in coco['annotations']:
+            x, y, w, h = annotation['bbox']
+            boxes, class_ids, areas, ignore = rows[annotation['image_id']]
+            boxes.append([x, y, x + w, y + h])
+            class_ids.append(annotation['category_id'])
+            areas.append(annotation.get('area', w * h))
+            ignore.append(bool(annotation.get('iscrowd', 0)))
+        file_ids = {}
+        for image in coco['images']:
+            file_ids[image['file_name']] = image['id']
+            file_ids[os.path.splitext(image['file_name'])[0]] = image['id']
+        return cls({image_id: cls._pack(*row) for image_id, row in rows.items()}, file_ids)
+
+    @classmethod
+    def from_voc(cls, annotation_dir, category_ids=COCO_CATEGORY_IDS):
+        """Load Pascal VOC XML files; 'difficult' objects are ignored
+
+        Class names are mapped onto the COCO category ids the detector emits.
+        """
+        class_ids = category_ids
+        images = {}
+        for name in sorted(os.listdir(annotation_dir)):
+            if not name.endswith('.xml'):
+                continue
+            root = ET.parse(os.path.join(annotation_dir, name)).getroot()
+            boxes, ids, areas, ignore = [], [], [], []
+            for obj in root.iter('object'):
+                label = obj.findtext('name').strip()
+                label = VOC_TO_COCO_NAMES.get(label, label)
+                if label not in class_ids:
+                    continue
+                box = obj.find('bndbox')
+                x1, y1, x2, y2 = (float(box.findtext(key))
+                                  for key in ('xmin', 'ymin', 'xmax', 'ymax'))
+                boxes.append([x1, y1, x2, y2])
+                ids.append(class_ids[label])
+                areas.append((x2 - x1) * (y2 - y1))
+                ignore.append(obj.findtext('difficult', '0').strip() == '1')
+            image_id = os.path.splitext(root.findtext('filename') or name)[0]
+            images[image_id] = cls._pack(boxes, ids, areas, ignore)
+        return cls(images, {image_id: image_id for image_id in images})
+
+    def resolve(self, image):
+        """Image id for an id, file name or path"""
+        if image in self.images:
+            return image
+        base = os.path.basename(str(image))
+        for key in (base, os.path.splitext(base)[0]):
+            if key in self.file_ids:
+                return self.file_ids[key]
+        raise KeyError(f"No ground truth for image {image!r}")
+
+
+def _overlaps(det_boxes, gt_boxes, gt_crowd):
+    """(D, G) IoU; crowd ground truth uses intersection over detection area"""
+    top_left = np.maximum(det_boxes[:, None, :2], gt_boxes[None, :, :2])
+    bottom_right = np.minimum(det_boxes[:, None, 2:], gt_boxes[None, :, 2:])
+    wh = np.clip(bottom_right - top_left, 0, None)
+    intersection = wh[..., 0] * wh[..., 1]
+    det_areas = np.prod(det_boxes[:, 2:] - det_boxes[:, :2], axis=1)
+    gt_areas = np.prod(gt_boxes[:, 2:] - gt_boxes[:, :2], axis=1)
+    union = np.where(gt_crowd[None, :], det_areas[:, None],
+                     det_areas[:, None] + gt_areas[None, :] - intersection)
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def match_image_category(det_boxes, det_scores, gt_boxes, gt_areas, gt_crowd,
+                         iou_thresholds, area_ranges, max_detections):
+    """COCO greedy matching for one image and category, for every area range and IoU at once
+
+    Returns:
+        tuple: (scores (D,), ranks (D,), matched (A, T, D), ignored (A, T, D),
+            non-ignored ground-truth count (A,))
+    """
+    order = np.argsort(-det_scores, kind='mergesort')[:max_detections]
+    det_boxes = det_boxes[order]
+    det_scores = det_scores[order]
+    num_dets = len(det_scores)
+    num_areas = len(area_ranges)
+    num_ious = len(iou_thresholds)
+
+    lows = np.array([low for low, _ in area_ranges])[:, None]
+    highs = np.array([high for _, high in area_ranges])[:, None]
+    gt_ignore = gt_crowd[None, :] | (gt_areas[None, :] < lows) | (gt_areas[None, :] > highs)
+    gt_counts = (~gt_ignore).sum(axis=1)
+
+    matched = np.zeros((num_areas, num_ious, num_dets), dtype=bool)
+    matched_ignore = np.zeros((num_areas, num_ious, num_dets), dtype=bool)
+    if num_dets and len(gt_boxes):
+        ious = _overlaps(det_boxes, gt_boxes, gt_crowd)
+        thresholds = np.minimum(iou_thresholds, 1 - 1e-10)[None, :, None]
+        gt_taken = np.zeros((num_areas, num_ious, len(gt_boxes)), dtype=bool)
+        # Detections below the loosest threshold match nothing; skip them
+        for d in np.nonzero(ious.max(axis=1) >= thresholds.min())[0]:
+            candidates = (ious[d][None, None, :] >= thresholds) & (~gt_taken | gt_crowd)
+            regular = np.where(candidates & ~gt_ignore[:, None, :], ious[d], -1.0)
+            ignored = np.where(candidates & gt_ignore[:, None, :], ious[d], -1.0)
+            # Non-ignored ground truth wins whenever one qualifies, as in pycocotools
+            use_regular = regular.max(axis=2) >= 0
+            best = np.where(use_regular, regular.argmax(axis=2), ignored.argmax(axis=2))
+            found = use_regular | (ignored.max(axis=2) >= 0)
+            a_idx, t_idx = np.nonzero(found)
+            g_idx = best[a_idx, t_idx]
+            gt_taken[a_idx, t_idx, g_idx] = True
+            matched[a_idx, t_idx, d] = True
+            matched_ignore[a_idx, t_idx, d] = gt_ignore[a_idx, g_idx]
+
+    det_areas = np.prod(det_boxes[:, 2:] - det_boxes[:, :2], axis=1)
+    outside = (det_areas[None, :] < lows) | (det_areas[None, :] > highs)
+    ignored = matched_ignore | (~matched & outside[:, None, :])
+    return det_scores, np.arange(num_dets), matched, ignored, gt_counts
+
+
+def accumulate_category(parts, recall_thresholds, max_detections):
+    """Precision/recall curves for one category from its per-image match results
+
+    Returns:
+        tuple: precision (T, R, A, M) and recall (T, A, M), -1 where no ground truth
+    """
+    gt_counts = sum(part[4] for part in parts)
+    num_ious, num_areas = parts[0][2].shape[1], parts[0][2].shape[0]
+    precision = -np.ones((num_ious, len(recall_thresholds), num_areas, len(max_detections)))
+    recall = -np.ones((num_ious, num_areas, len(max_detections)))
+
+    scores = np.concatenate([part[0] for part in parts])
+    ranks = np.concatenate([part[1] for part in parts])
+    matched = np.concatenate([part[2] for part in parts], axis=2)
+    ignored = np.concatenate([part[3] for part in parts], axis=2)
+
+    for m, max_det in enumerate(max_detections):
+        keep = ranks < max_det
+        order = np.argsort(-scores[keep], kind='mergesort')
+        tp_all = (matched[:, :, keep] & ~ignored[:, :, keep])[:, :, order]
+        fp_all = (~matched[:, :, keep] & ~ignored[:, :, keep])[:, :, order]
+        for a in range(num_areas):
+            if gt_counts[a] == 0:
+                continue
+            tps = np.cumsum(tp_all[a], axis=1, dtype=np.float64)
+            fps = np.cumsum(fp_all[a], axis=1, dtype=np.float64)
+            if tps.shape[1] == 0:
+                recall[:, a, m] = 0
+                precision[:, :, a, m] = 0
+                continue
+            rc = tps / gt_counts[a]
+            pr = tps / (tps + fps + np.spacing(1))
+            recall[:, a, m] = rc[:, -1]
+            # Monotone precision envelope, then sample at the recall thresholds
+            pr = np.maximum.accumulate(pr[:, ::-1], axis=1)[:, ::-1]
+            for t in range(num_ious):
+                indices = np.searchsorted(rc[t], recall_thresholds, side='left')
+                valid = indices < len(rc[t])
+                sampled = np.zeros(len(recall_thresholds))
+                sampled[valid] = pr[t, indices[valid]]
+                precision[t, :, a, m] = sampled
+    return precision, recall
+
+
+def _accumulate_one(args):
+    return accumulate_category(*args)
+
+
+class DetectionEvaluator:
+    """COCO-style AP/AR computed incrementally as detections arrive
+
+    Each add() matches one image's detections against its ground truth
+    right away (every IoU threshold and area range in one vectorized pass
+    per detection), so only compact per-detection flags are kept.
+    summarize() can be called at any point and sorts per category, serially
+    or in parallel.
+
+    Args:
+        ground_truth (GroundTruth): annotations to score against
+        iou_thresholds (array): IoU thresholds, COCO's 0.50:0.05:0.95 by default
+        max_detections (tuple): per-image, per-category detection limits
+    """
+
+    def __init__(self, ground_truth, iou_thresholds=IOU_THRESHOLDS,
+                 max_detections=MAX_DETECTIONS):
+        self.ground_truth = ground_truth
+        self.iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+        self.max_detections = tuple(max_detections)
+        self.area_names = list(AREA_RANGES)
+        self.area_ranges = [AREA_RANGES[name] for name in self.area_names]
+        self.parts = {category: [] for category in ground_truth.category_ids}
+        self.seen = set()
+
+    def add(self, image, detections=None, boxes=None, scores=None, class_ids=None):
+        """Match one image's detections: a Detections object or boxes/scores/class_ids arrays
+
+        Boxes are [x1, y1, x2, y2] pixels. Each image should be added once.
+        """
+        image_id = self.ground_truth.resolve(image)
+        if detections is not None:
+            boxes, scores, class_ids = detections.boxes, detections.scores, detections.class_ids
+        boxes = np.asarray(boxes if boxes is not None else [], dtype=np.float64).reshape(-1, 4)
+        scores = np.asarray(scores if scores is not None else [], dtype=np.float64)
+        class_ids = np.asarray(class_ids if class_ids is not None else [], dtype=np.int64)
+
+        gt = self.ground_truth.images[image_id]
+        self.seen.add(image_id)
+        for category, parts in self.parts.items():
+            det = class_ids == category
+            gt_rows = gt['class_ids'] == category
+            if not det.any() and not gt_rows.any():
+                continue
+            parts.append(match_image_category(
+                boxes[det], scores[det], gt['boxes'][gt_rows], gt['areas'][gt_rows],
+                gt['ignore'][gt_rows], self.iou_thresholds, self.area_ranges,
+                max(self.max_detections)))
+
+    def add_coco_results(self, results):
+        """Add a COCO results list (image_id, category_id, [x, y, w, h] bbox, score)"""
+        grouped = {}
+        for result in results:
+            grouped.setdefault(result['image_id'], []).append(result)
+        for image_id, rows in grouped.items():
+            boxes = np.array([r['bbox'] for r in rows], dtype=np.float64).reshape(-1, 4)
+            boxes[:, 2:] += boxes[:, :2]
+            self.add(image_id, boxes=boxes, scores=[r['score'] for r in rows],
+                     class_ids=[r['category_id'] for r in rows])
+
+    def add_missing(self):
+        """Count every not-yet-added ground-truth image as having no detections"""
+        for image_id in self.ground_truth.images:
+            if image_id not in self.seen:
+                self.add(image_id)
+
+    def accumulate(self, workers=1, pool='thread'):
+        """Precision (T, R, K, A, M) and recall (T, K, A, M) arrays over categories K"""
+        empty = (np.zeros(0), np.zeros(0, dtype=np.int64),
+                 np.zeros((len(self.area_ranges), len(self.iou_thresholds), 0), dtype=bool),
+                 np.zeros((len(self.area_ranges), len(self.iou_thresholds), 0), dtype=bool),
+                 np.zeros(len(self.area_ranges), dtype=np.int64))
+        jobs = [(parts or [empty], RECALL_THRESHOLDS, self.max_detections)
+                for parts in self.parts.values()]
+        if workers > 1:
+            executor_class = ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+            with executor_class(max_workers=workers) as executor:
+                results = list(executor.map(_accumulate_one, jobs))
+        else:
+            results = [_accumulate_one(job) for job in jobs]
+        if not results:
+            shape = (len(self.iou_thresholds), len(RECALL_THRESHOLDS), 0,
+                     len(self.area_ranges), len(self.max_detections))
+            return -np.ones(shape), -np.ones(shape[:1] + shape[2:])
+        precision = np.stack([p for p, _ in results], axis=2)
+        recall = np.stack([r for _, r in results], axis=1)
+        return precision, recall
+
+    def summarize(self, workers=1, pool='thread'):
+        """The 12 standard COCO metrics plus AP per category
+
+        Returns:
+            dict: 'AP', 'AP50', 'AP75', 'APs', 'APm', 'APl', 'AR1', 'AR10',
+                'AR100', 'ARs', 'ARm', 'ARl', 'per_class_AP' and 'images'
+        """
+        precision, recall = self.accumulate(workers, pool)
+        areas = {name: i for i, name in enumerate(self.area_names)}
+        last = len(self.max_detections) - 1
+
+        def mean(values):
+            values = values[values > -1]
+            return float(values.mean()) if values.size else -1.0
+
+        def ap(iou=None, area='all'):
+            p = precision[:, :, :, areas[area], last]
+            if iou is not None:
+                p = p[np.isclose(self.iou_thresholds, iou)]
+            return mean(p)
+
+        def ar(max_index, area='all'):
+            return mean(recall[:, :, areas[area], max_index])
+
+        stats = {
+            'AP': ap(), 'AP50': ap(0.5), 'AP75': ap(0.75),
+            'APs': ap(area='small'), 'APm': ap(area='medium'), 'APl': ap(area='large'),
+        }
+        for index, max_det in enumerate(self.max_detections):
+            stats[f'AR{max_det}'] = ar(index)
+        stats.update(ARs=ar(last, 'small'), ARm=ar(last, 'medium'), ARl=ar(last, 'large'))
+        stats['per_class_AP'] = {
+            category: mean(precision[:, :, k, areas['all'], last])
+            for k, category in enumerate(self.ground_truth.category_ids)
+        }
+        stats['images'] = len(self.seen)
+        return stats
+
+
+def load_results(path, ground_truth, evaluator):
+    """Feed a COCO results JSON or a batch_detect.py JSONL file into the evaluator
+
+    JSONL detections are scored by their 'class_id'; a record without one
+    raises ValueError rather than guessing the category from its name.
+    """
+    if path.endswith('.jsonl'):
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                record = json.loads(line)
+                detections = record['detections']
+                if any('class_id' not in d for d in detections):
+                    raise ValueError(f"{path}:{line_number}: detection without 'class_id'; "
+                                     "write results with batch_detect.py --format jsonl")
+                evaluator.add(record['image'],
+                              boxes=[d['bbox'] for d in detections],
+                              scores=[d['confidence'] for d in detections],
+                              class_ids=[d['class_id'] for d in detections])
+    else:
+        with open(path) as f:
+            evaluator.add_coco_results(json.load(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="COCO-style AP/AR for detector results")
+    annotations = parser.add_mutually_exclusive_group(required=True)
+    annotations.add_argument('--coco', help="COCO instances JSON")
+    annotations.add_argument('--voc', help="Directory of Pascal VOC XML annotations")
+    parser.add_argument('--results', required=True,
+                        help="COCO results JSON or batch_detect.py JSONL output")
+    parser.add_argument('--workers', type=int, default=1, help="Parallel per-class accumulation")
+    parser.add_argument('--pool', choices=('thread', 'process'), default='thread')
+    parser.add_argument('--per-class', action='store_true', help="Print AP for every class")
+    parser.add_argument('--output', default=None, help="Write metrics as JSON")
+    args = parser.parse_args()
+
+    ground_truth = (GroundTruth.from_coco(args.coco) if args.coco
+                    else GroundTruth.from_voc(args.voc))
+    evaluator = DetectionEvaluator(ground_truth)
+
+    start = time.perf_counter()
+    load_results(args.results, ground_truth, evaluator)
+    evaluator.add_missing()
+    match_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    stats = evaluator.summarize(args.workers, args.pool)
+    accumulate_seconds = time.perf_counter() - start
+
+    print(f"📊 {stats['images']} images, {len(ground_truth.category_ids)} categories "
+          f"(matching {match_seconds:.2f}s, accumulation {accumulate_seconds:.2f}s)")
+    for name in ('AP', 'AP50', 'AP75', 'APs', 'APm', 'APl'):
+        print(f"   {name:<6} {stats[name]:.3f}")
+    for name in [f'AR{m}' for m in MAX_DETECTIONS] + ['ARs', 'ARm', 'ARl']:
+        print(f"   {name:<6} {stats[name]:.3f}")
+    if args.per_class:
+        for category, value in sorted(stats['per_class_AP'].items(), key=lambda item: -item[1]):
+            name = COCO_CATEGORY_NAMES.get(category, category)
+            print(f"   {str(name):<16} {value:.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(stats, f, indent=2, default=str)
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
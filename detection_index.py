@@ -0,0 +1,505 @@
+# detection_index.py - Persistent columnar store of past detections for fast queries
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from coco_labels import COCO_LABELS
+from streamlit_detector import Detections
+
+MANIFEST = 'manifest.json'
+IMAGE_KEYS = 'images.jsonl'
+COLUMNS = ('image_idx', 'class_ids', 'scores', 'boxes')
+# Per-image lookup table: rows ordered by image_idx, and image_idx in that order
+IMAGE_TABLE = ('image_order', 'image_sorted')
+
+
+class IndexSegment:
+    """One immutable block of detections sorted by class, then by descending score
+
+    offsets[c]:offsets[c + 1] is the row range of class id c, so each class
+    is a contiguous slice (the per-class inverted index) and a minimum score
+    is a binary search inside that slice. image_order / image_sorted play the
+    same role per image, so one image's rows are found by binary search too.
+
+    Attributes:
+        image_idx (np.ndarray): (N,) int32 row in the index's image key list
+        class_ids (np.ndarray): (N,) int16 1-based class ids
+        scores (np.ndarray): (N,) float32 confidences
+        boxes (np.ndarray): (N, 4) int32 pixel boxes as [x1, y1, x2, y2]
+        offsets (np.ndarray): (num_classes + 2,) int64 class start rows
+        image_order (np.ndarray): (N,) int64 rows sorted by image_idx
+        image_sorted (np.ndarray): (N,) int32 image_idx[image_order]
+    """
+
+    def __init__(self, image_idx, class_ids, scores, boxes, offsets, path=None,
+                 image_order=None, image_sorted=None):
+        self.image_idx = image_idx
+        self.class_ids = class_ids
+        self.scores = scores
+        self.boxes = boxes
+        self.offsets = offsets
+        self.path = path
+        self.image_order = image_order
+        self.image_sorted = image_sorted
+
+    @classmethod
+    def build(cls, image_idx, class_ids, scores, boxes, num_classes):
+        """Sort raw columns into a segment"""
+        order = np.lexsort((-np.asarray(scores), class_ids))
+        class_ids = np.asarray(class_ids, dtype=np.int16)[order]
+        offsets = np.searchsorted(class_ids, np.arange(num_classes + 2)).astype(np.int64)
+        return cls(np.asarray(image_idx, dtype=np.int32)[order], class_ids,
+                   np.asarray(scores, dtype=np.float32)[order],
+                   np.asarray(boxes, dtype=np.int32).reshape(-1, 4)[order], offsets)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a segment directory written by save()"""
+        columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                   for name in COLUMNS + IMAGE_TABLE}
+        offsets = np.load(os.path.join(path, 'offsets.npy'))
+        return cls(offsets=offsets, path=path, **columns)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        self._build_image_table()
+        for name in COLUMNS + ('offsets',) + IMAGE_TABLE:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        self.path = path
+
+    def _build_image_table(self):
+        if self.image_order is None:
+            self.image_order = np.argsort(self.image_idx, kind='stable').astype(np.int64)
+            self.image_sorted = np.asarray(self.image_idx)[self.image_order]
+
+    def __len__(self):
+        return len(self.scores)
+
+    def class_rows(self, class_id, min_score=0.0):
+        """Row slice of class_id scoring at least min_score"""
+        if class_id >= len(self.offsets) - 1:
+            return slice(0, 0)
+        start, end = int(self.offsets[class_id]), int(self.offsets[class_id + 1])
+        # Scores descend within the class, so negate them for searchsorted
+        count = int(np.searchsorted(-self.scores[start:end], -min_score, side='right'))
+        return slice(start, start + count)
+
+    def image_rows(self, image_idx):
+        """Rows holding one image's detections"""
+        self._build_image_table()
+        start, end = np.searchsorted(self.image_sorted, (image_idx, image_idx + 1))
+        return self.image_order[start:end]
+
+
+class DetectionIndex:
+    """Append-only, memory-mapped detection store with per-class indexes
+
+    Detections are buffered in memory and written as immutable NumPy segments
+    (one .npy file per column) on flush(); once there are more than
+    max_segments the smaller ones are merged. Queries only touch the rows of
+    the requested class, so they stay in the millisecond range over millions
+    of detections. Each image key is stored once: adding a key that is
+    already indexed is a no-op. With flush_interval set, add() also flushes
+    once that many seconds have passed, so interactive callers can batch
+    writes without leaving them buffered indefinitely.
+
+    Usage:
+        index = DetectionIndex('detections_index')
+        index.add('street.jpg', detector.detect(image))
+        index.flush()
+        index.images_with('person', min_count=3, min_score=0.6)
+
+    Args:
+        directory (str): index directory, created if needed
+        class_names (list): names indexed by class_id, None for unused ids
+        segment_rows (int): buffered detections that trigger a flush
+        max_segments (int): segment count that triggers merging the smaller half
+        flush_interval (float): seconds after the last flush at which add()
+            flushes; None flushes only by size
+    """
+
+    def __init__(self, directory, class_names=COCO_LABELS, segment_rows=100_000,
+                 max_segments=16, flush_interval=None):
+        self.directory = directory
+        self.class_names = class_names
+        self.segment_rows = segment_rows
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._class_ids = {name: i for i, name in enumerate(class_names) if name is not None}
+        self._lock = threading.RLock()
+        self._buffer = []
+        self._buffer_rows = 0
+        self._pending = None
+        self._next_segment = 0
+
+        os.makedirs(directory, exist_ok=True)
+        manifest = {'segments': [], 'next_segment': 0, 'num_images': 0}
+        manifest_path = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        self.segments = [IndexSegment.load(os.path.join(directory, name))
+                         for name in manifest['segments']]
+        self._next_segment = manifest['next_segment']
+
+        # The manifest is written last, so anything it does not list belongs to a
+        # lost flush (or a crash before the first manifest): drop it
+        lines = []
+        keys_path = os.path.join(directory, IMAGE_KEYS)
+        if os.path.exists(keys_path):
+            with open(keys_path) as f:
+                lines = f.readlines()
+            if len(lines) > manifest['num_images']:
+                lines = lines[:manifest['num_images']]
+                with open(keys_path, 'w') as f:
+                    f.writelines(lines)
+        self.image_keys = [json.loads(line) for line in lines]
+        listed = set(manifest['segments'])
+        for name in os.listdir(directory):
+            if name.startswith('segment-') and name not in listed:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        self._flushed_images = len(self.image_keys)
+        self._image_ids = {key: i for i, key in enumerate(self.image_keys)}
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments) + self._buffer_rows
+
+    def __contains__(self, image_key):
+        return image_key in self._image_ids
+
+    @property
+    def num_images(self):
+        return len(self.image_keys)
+
+    def class_id(self, class_name):
+        """1-based id for a class name (ids are passed through)"""
+        if isinstance(class_name, (int, np.integer)):
+            return int(class_name)
+        return self._class_ids[class_name]
+
+    def add(self, image_key, detections):
+        """Index one image's Detections; returns False if the key was already indexed"""
+        with self._lock:
+            if image_key in self._image_ids:
+                return False
+            image_idx = len(self.image_keys)
+            self.image_keys.append(image_key)
+            self._image_ids[image_key] = image_idx
+            if len(detections):
+                self._buffer.append((np.full(len(detections), image_idx, dtype=np.int32),
+                                     detections.class_ids, detections.scores, detections.boxes))
+                self._buffer_rows += len(detections)
+                self._pending = None
+            if (self._buffer_rows >= self.segment_rows
+                    or (self.flush_interval is not None
+                        and time.monotonic() - self._last_flush >= self.flush_interval)):
+                self.flush()
+            return True
+
+    def _pending_segment(self):
+        """Buffered rows as an in-memory segment, so queries see unflushed detections"""
+        if self._pending is None and self._buffer:
+            columns = [np.concatenate(column) for column in zip(*self._buffer)]
+            self._pending = IndexSegment.build(*columns, num_classes=len(self.class_names) - 1)
+        return self._pending
+
+    def _all_segments(self):
+        with self._lock:
+            pending = self._pending_segment()
+            return self.segments + ([pending] if pending is not None else [])
+
+    def _write_manifest(self):
+        manifest = {
+            'segments': [os.path.basename(segment.path) for segment in self.segments],
+            'next_segment': self._next_segment,
+            'num_images': len(self.image_keys),
+            'class_names': list(self.class_names),
+        }
+        temp_path = os.path.join(self.directory, MANIFEST + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, os.path.join(self.directory, MANIFEST))
+
+    def _new_segment_path(self):
+        path = os.path.join(self.directory, f'segment-{self._next_segment:06d}')
+        self._next_segment += 1
+        return path
+
+    def flush(self):
+        """Write buffered detections and new image keys to disk"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if len(self.image_keys) == self._flushed_images:
+                return
+            segment = self._pending_segment()
+            self._buffer, self._buffer_rows, self._pending = [], 0, None
+            if segment is not None:
+                segment.save(self._new_segment_path())
+                self.segments.append(IndexSegment.load(segment.path))
+            with open(os.path.join(self.directory, IMAGE_KEYS), 'a') as f:
+                f.writelines(json.dumps(key) + '\n'
+                             for key in self.image_keys[self._flushed_images:])
+            self._flushed_images = len(self.image_keys)
+            if len(self.segments) > self.max_segments:
+                # Merge the smaller half, so each row is rewritten O(log N) times
+                self._merge(sorted(self.segments, key=len)[:len(self.segments) // 2 + 1])
+            else:
+                self._write_manifest()
+
+    def compact(self):
+        """Merge all flushed segments into one"""
+        with self._lock:
+            if len(self.segments) > 1:
+                self._merge(self.segments)
+
+    def _merge(self, segments):
+        columns = [np.concatenate([getattr(segment, name) for segment in segments])
+                   for name in COLUMNS]
+        merged = IndexSegment.build(*columns, num_classes=len(self.class_names) - 1)
+        merged.save(self._new_segment_path())
+        self.segments = ([segment for segment in self.segments if segment not in segments]
+                         + [IndexSegment.load(merged.path)])
+        self._write_manifest()
+        for segment in segments:
+            # Memory maps still open elsewhere may keep files alive on Windows
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _class_columns(self, class_name, min_score, names):
+        """Concatenate the requested columns for one class across segments"""
+        class_id = self.class_id(class_name)
+        parts = {name: [] for name in names}
+        for segment in self._all_segments():
+            rows = segment.class_rows(class_id, min_score)
+            for name in names:
+                parts[name].append(getattr(segment, name)[rows])
+        return {name: (np.concatenate(values) if values else np.zeros(0))
+                for name, values in parts.items()}
+
+    def images_with(self, class_name, min_count=1, min_score=0.0):
+        """Images with at least min_count detections of a class scoring >= min_score
+
+        Returns:
+            list: (image_key, count) pairs, most detections first
+        """
+        image_idx = self._class_columns(class_name, min_score, ('image_idx',))['image_idx']
+        counts = np.bincount(image_idx.astype(np.int64), minlength=self.num_images)
+        hits = np.nonzero(counts >= max(min_count, 1))[0]
+        hits = hits[np.argsort(-counts[hits], kind='stable')]
+        return [(self.image_keys[i], int(counts[i])) for i in hits.tolist()]
+
+    def find_boxes(self, class_name, region=None, min_score=0.0, min_overlap=0.0):
+        """Detections of a class, optionally only those overlapping a pixel region
+
+        Args:
+            class_name: class name or 1-based id
+            region (tuple): [x1, y1, x2, y2]; None matches every box
+            min_score (float): minimum confidence
+            min_overlap (float): fraction of the box area that must fall inside
+                region; 0 accepts any overlap
+
+        Returns:
+            dict: 'image_keys' (list), 'boxes' (M, 4) and 'scores' (M,), best first
+        """
+        columns = self._class_columns(class_name, min_score, ('image_idx', 'scores', 'boxes'))
+        boxes = columns['boxes'].reshape(-1, 4)
+        keep = np.ones(len(boxes), dtype=bool)
+        if region is not None:
+            x1, y1, x2, y2 = region
+            widths = np.minimum(boxes[:, 2], x2) - np.maximum(boxes[:, 0], x1)
+            heights = np.minimum(boxes[:, 3], y2) - np.maximum(boxes[:, 1], y1)
+            inter = np.clip(widths, 0, None) * np.clip(heights, 0, None)
+            keep = inter > 0
+            if min_overlap > 0:
+                areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+                keep &= inter >= min_overlap * np.maximum(areas, 1)
+        order = np.argsort(-columns['scores'][keep], kind='stable')
+        image_idx = columns['image_idx'][keep][order].astype(np.int64)
+        return {
+            'image_keys': [self.image_keys[i] for i in image_idx.tolist()],
+            'boxes': boxes[keep][order],
+            'scores': columns['scores'][keep][order],
+        }
+
+    def class_counts(self, min_score=0.0):
+        """Detections per class name scoring >= min_score, most frequent first"""
+        counts = {}
+        for segment in self._all_segments():
+            for class_id, name in enumerate(self.class_names):
+                rows = segment.class_rows(class_id, min_score)
+                if name is not None and rows.stop > rows.start:
+                    counts[name] = counts.get(name, 0) + rows.stop - rows.start
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def image_detections(self, image_key, min_score=0.0):
+        """Stored Detections of one image"""
+        image_idx = self._image_ids[image_key]
+        boxes, scores, class_ids = [np.zeros((0, 4), dtype=np.int32)], [], []
+        for segment in self._all_segments():
+            rows = segment.image_rows(image_idx)
+            rows = rows[segment.scores[rows] >= min_score]
+            boxes.append(segment.boxes[rows])
+            scores.append(segment.scores[rows])
+            class_ids.append(segment.class_ids[rows])
+        scores = np.concatenate(scores + [np.zeros(0, dtype=np.float32)])
+        order = np.argsort(-scores, kind='stable')
+        return Detections(np.concatenate(boxes)[order],
+                          scores[order],
+                          np.concatenate(class_ids + [np.zeros(0, dtype=np.int32)])
+                          .astype(np.int32)[order],
+                          self.class_names)
+
+    def stats(self):
+        """Row, image and segment counts and on-disk size"""
+        disk_bytes = 0
+        for segment in self.segments:
+            for name in os.listdir(segment.path):
+                disk_bytes += os.path.getsize(os.path.join(segment.path, name))
+        return {
+            'detections': len(self),
+            'images': self.num_images,
+            'segments': len(self.segments),
+            'buffered': self._buffer_rows,
+            'disk_bytes': disk_bytes,
+        }
+
+
+def import_jsonl(index, path):
+    """Add a batch_detect.py JSONL results file to the index; returns images added
+
+    Detections are indexed by their 'class_id'; a record without one raises
+    ValueError rather than guessing the category from its name.
+    """
+    added = 0
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            record = json.loads(line)
+            rows = record['detections']
+            if any('class_id' not in d for d in rows):
+                raise ValueError(f"{path}:{line_number}: detection without 'class_id'; "
+                                 "write results with batch_detect.py --format jsonl")
+            detections = Detections(
+                np.array([d['bbox'] for d in rows], dtype=np.int32).reshape(-1, 4),
+                np.array([d['confidence'] for d in rows], dtype=np.float32),
+                np.array([d['class_id'] for d in rows], dtype=np.int32),
+                index.class_names)
+            added += index.add(record['image'], detections)
+    index.flush()
+    return added
+
+
+def synthetic_detections(num_images, per_image=8, seed=0, class_names=COCO_LABELS):
+    """Yield (image_key, Detections) with a skewed class mix, for benchmarks"""
+    rng = np.random.default_rng(seed)
+    class_ids = [i for i, name in enumerate(class_names) if name is not None]
+    weights = 1.0 / np.arange(1, len(class_ids) + 1)
+    weights /= weights.sum()
+    for i in range(num_images):
+        count = rng.poisson(per_image)
+        corners = rng.integers(0, 600, (count, 2))
+        sizes = rng.integers(10, 300, (count, 2))
+        yield f'image_{i:07d}.jpg', Detections(
+            np.hstack([corners, corners + sizes]).astype(np.int32),
+            rng.uniform(0.3, 1.0, count).astype(np.float32),
+            rng.choice(class_ids, count, p=weights).astype(np.int32),
+            class_names)
+
+
+def benchmark_queries(index, repeats=5):
+    """Best-of-repeats latency in ms for typical analyst queries"""
+    queries = {
+        'images with >=3 person @0.6': lambda: index.images_with('person', 3, 0.6),
+        'cars overlapping region': lambda: index.find_boxes('car', (100, 100, 300, 300), 0.5),
+        'class counts @0.5': lambda: index.class_counts(0.5),
+    }
+    results = {}
+    for name, query in queries.items():
+        best = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = query()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        size = len(result.get('image_keys', result)) if isinstance(result, dict) else len(result)
+        results[name] = {'ms': best * 1000, 'results': size}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query a detection index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    importer = subparsers.add_parser('import', help="Add batch_detect.py JSONL results")
+    importer.add_argument('index')
+    importer.add_argument('results', nargs='+')
+
+    query = subparsers.add_parser('query', help="Images containing a class")
+    query.add_argument('index')
+    query.add_argument('--class', dest='class_name', required=True)
+    query.add_argument('--min-count', type=int, default=1)
+    query.add_argument('--min-score', type=float, default=0.5)
+    query.add_argument('--region', type=int, nargs=4, default=None,
+                       metavar=('X1', 'Y1', 'X2', 'Y2'), help="Only boxes overlapping this region")
+    query.add_argument('--limit', type=int, default=20)
+
+    bench = subparsers.add_parser('bench', help="Time queries over synthetic detections")
+    bench.add_argument('index')
+    bench.add_argument('--images', type=int, default=250_000)
+    bench.add_argument('--per-image', type=int, default=8)
+
+    args = parser.parse_args()
+    index = DetectionIndex(args.index)
+
+    if args.command == 'import':
+        for path in args.results:
+            added = import_jsonl(index, path)
+            print(f"✅ {path}: {added} new images")
+        stats = index.stats()
+        print(f"📊 {stats['detections']} detections from {stats['images']} images "
+              f"in {stats['segments']} segments ({stats['disk_bytes'] / 2**20:.1f} MB)")
+
+    elif args.command == 'query':
+        start = time.perf_counter()
+        if args.region:
+            found = index.find_boxes(args.class_name, args.region, args.min_score)
+            elapsed = time.perf_counter() - start
+            print(f"🔍 {len(found['scores'])} boxes in {elapsed * 1000:.1f} ms")
+            for key, box, score in list(zip(found['image_keys'], found['boxes'].tolist(),
+                                            found['scores'].tolist()))[:args.limit]:
+                print(f"   {key}  {box}  {score:.2f}")
+        else:
+            found = index.images_with(args.class_name, args.min_count, args.min_score)
+            elapsed = time.perf_counter() - start
+            print(f"🔍 {len(found)} images in {elapsed * 1000:.1f} ms")
+            for key, count in found[:args.limit]:
+                print(f"   {key}  {count}")
+
+    else:
+        if len(index) == 0:
+            start = time.perf_counter()
+            for key, detections in synthetic_detections(args.images, args.per_image):
+                index.add(key, detections)
+            index.flush()
+            index.compact()
+            print(f"🔄 Indexed {len(index)} detections in {time.perf_counter() - start:.1f}s")
+        print(f"📊 {len(index)} detections, {index.num_images} images")
+        for name, result in benchmark_queries(index).items():
+            print(f"   {name:<30} {result['ms']:8.2f} ms   {result['results']} results")
+
+
+if __name__ == "__main__":
+    main()
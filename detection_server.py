@@ -0,0 +1,299 @@
+# detection_server.py - Headless HTTP inference server with request micro-batching
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from streamlit_detector import StreamlitSSDDetector
+
+
+class MicroBatcher:
+    """Coalesces concurrent detection requests into batched model calls
+
+    Requests wait in a bounded queue. The worker thread takes the first
+    waiting request, then keeps collecting until the batch is full or
+    max_wait_ms has passed, and runs the whole batch through the model once.
+
+    Args:
+        detector (StreamlitSSDDetector): detector with a loaded model
+        max_batch_size (int): largest batch sent to the model
+        max_wait_ms (float): how long the first request waits for company
+        max_queue (int): pending requests before submit() raises queue.Full
+    """
+
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=10, max_queue=64):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue(max_queue)
+        self.batches = 0
+        self.images = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, image, confidence_threshold=None):
+        """Queue an image; raises queue.Full when the server is overloaded
+
+        Returns:
+            Future: resolves to the image's Detections
+        """
+        future = Future()
+        if confidence_threshold is None:
+            confidence_threshold = self.detector.confidence_threshold
+        self.requests.put_nowait((image, confidence_threshold, future))
+        return future
+
+    @property
+    def queue_depth(self):
+        return self.requests.qsize()
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        width, height = self.detector.input_size
+        inputs = np.empty((self.max_batch_size, height, width, 3), dtype=np.uint8)
+        while True:
+            batch = self._collect()
+            # Cancelled requests (client gone) are not worth a model slot
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                sizes = [self.detector.preprocess_into(image, inputs[i])
+                         for i, (image, _, _) in enumerate(batch)]
+                # Decode at the loosest requested threshold, then filter per request
+                lowest = min(threshold for _, threshold, _ in batch)
+                results = self.detector.infer_batch(inputs[:len(batch)], sizes, lowest,
+                                                    raise_errors=True)
+                for (_, threshold, future), detections in zip(batch, results):
+                    future.set_result(detections.filter(threshold))
+            except Exception as e:
+                # Every request in a failed batch answers with the error, not empty results
+                for _, _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.images += len(batch)
+
+
+class DetectionServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that shares one detector through a MicroBatcher
+
+    Endpoints:
+        POST /detect[?threshold=0.5]  JPEG/PNG body, returns JSON detections;
+                                      400 for a missing or bad Content-Length,
+                                      413 above max_body_bytes, 500 on model errors
+        GET  /healthz                 liveness
+        GET  /readyz                  200 once the model is loaded and warmed up
+        GET  /metrics                 Prometheus stage latencies and counters
+        GET  /metrics.json            the same metrics as a JSON snapshot
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, detector, request_timeout=30.0, max_body_bytes=20 * 1024 * 1024,
+                 **batcher_options):
+        super().__init__(address, DetectionRequestHandler)
+        self.detector = detector
+        self.batcher_options = batcher_options
+        self.request_timeout = request_timeout
+        self.max_body_bytes = max_body_bytes
+        self.batcher = None
+        self.load_error = None
+
+    def load_model(self):
+        """Load the model and start batching; run in the background so /healthz answers meanwhile"""
+        if self.detector.load_model():
+            self.batcher = MicroBatcher(self.detector, **self.batcher_options)
+        else:
+            self.load_error = "model failed to load"
+
+    @property
+    def ready(self):
+        return self.batcher is not None
+
+
+class DetectionRequestHandler(BaseHTTPRequestHandler):
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status, text, content_type='text/plain; version=0.0.4'):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        path = urlparse(self.path).path
+        if path == '/healthz':
+            self._send_json(200, {'status': 'ok'})
+        elif path == '/readyz':
+            batcher = server.batcher
+            status = {
+                'ready': server.ready,
+                'model_loaded': server.detector.model_loaded,
+                'warm': server.detector.load_stats.get('warmup_seconds') is not None,
+                'load_stats': server.detector.load_stats,
+                'error': server.load_error,
+            }
+            if batcher is not None:
+                status.update({
+                    'queue_depth': batcher.queue_depth,
+                    'batches': batcher.batches,
+                    'mean_batch_size': batcher.images / batcher.batches if batcher.batches else 0.0,
+                })
+            self._send_json(200 if server.ready else 503, status)
+        elif path == '/metrics':
+            text = server.detector.metrics.to_prometheus()
+            batcher = server.batcher
+            if batcher is not None:
+                text += ('# TYPE ssd_queue_depth gauge\n'
+                         f'ssd_queue_depth {batcher.queue_depth}\n'
+                         '# TYPE ssd_batches_total counter\n'
+                         f'ssd_batches_total {batcher.batches}\n')
+            self._send_text(200, text)
+        elif path == '/metrics.json':
+            snapshot = server.detector.metrics.snapshot()
+            if server.detector.cascade is not None:
+                snapshot['cascade'] = server.detector.cascade.stats.snapshot()
+            self._send_json(200, snapshot)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path != '/detect':
+            self._send_json(404, {'error': 'not found'})
+            return
+        if not server.ready:
+            self._send_json(503, {'error': 'model not ready'}, {'Retry-After': '5'})
+            return
+
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            length = -1
+        if length < 0:
+            self._send_json(400, {'error': 'Content-Length header required'})
+            return
+        if length > server.max_body_bytes:
+            # The body is left unread, so this connection cannot be reused
+            self.close_connection = True
+            self._send_json(413, {'error': f'body larger than {server.max_body_bytes} bytes'})
+            return
+        data = np.frombuffer(self.rfile.read(length), dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR) if length else None
+        if image is None:
+            self._send_json(400, {'error': 'body must be a JPEG or PNG image'})
+            return
+
+        threshold = parse_qs(url.query).get('threshold', [None])[0]
+        try:
+            threshold = float(threshold) if threshold is not None else None
+        except ValueError:
+            self._send_json(400, {'error': 'threshold must be a number'})
+            return
+
+        start = time.perf_counter()
+        try:
+            future = server.batcher.submit(image, threshold)
+        except queue.Full:
+            self._send_json(503, {'error': 'server overloaded'}, {'Retry-After': '1'})
+            return
+
+        try:
+            detections = future.result(timeout=server.request_timeout)
+        except FutureTimeout:
+            future.cancel()
+            self._send_json(504, {'error': 'detection timed out'})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+
+        height, width = image.shape[:2]
+        self._send_json(200, {
+            'width': width,
+            'height': height,
+            'latency_ms': (time.perf_counter() - start) * 1000,
+            'detections': detections.to_dicts(),
+        })
+
+    def log_message(self, format, *args):
+        # Request logging on every call costs more than it tells us under load
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve SSD detections over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--max-queue', type=int, default=64)
+    parser.add_argument('--request-timeout', type=float, default=30.0)
+    parser.add_argument('--max-body-mb', type=float, default=20.0,
+                        help="Largest accepted request body")
+    parser.add_argument('--cascade-model', default=None,
+                        help="Quantized .tflite stage-one model; uncertain images escalate")
+    parser.add_argument('--cascade-band', type=float, nargs=2, default=(0.25, 0.6),
+                        metavar=('LOW', 'HIGH'))
+    parser.add_argument('--cascade-max-detections', type=int, default=10)
+    parser.add_argument('--cascade-audit-every', type=int, default=50)
+    args = parser.parse_args()
+
+    detector = StreamlitSSDDetector(confidence_threshold=args.threshold)
+    if args.cascade_model and not detector.enable_cascade(
+            'tflite', {'model_path': args.cascade_model}, uncertain_band=args.cascade_band,
+            max_detections=args.cascade_max_detections, audit_every=args.cascade_audit_every):
+        raise SystemExit(1)
+    server = DetectionServer((args.host, args.port), detector,
+                             request_timeout=args.request_timeout,
+                             max_body_bytes=int(args.max_body_mb * 1024 * 1024),
+                             max_batch_size=args.max_batch_size,
+                             max_wait_ms=args.max_wait_ms,
+                             max_queue=args.max_queue)
+    threading.Thread(target=server.load_model, daemon=True).start()
+
+    print(f"🌐 Serving on http://{args.host}:{args.port} "
+          "(POST /detect, GET /healthz, GET /readyz, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("👋 Shutting down")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+# detector_backends.py - Pluggable inference runtimes behind StreamlitSSDDetector
+import os
+import time
+
+import numpy as np
+
+from box_utils import match_detections
+from coco_labels import COCO_LABELS
+from model_store import DEFAULT_MODEL_URL, ModelStore
+
+# Output arrays every backend returns, in the TF Hub SSD signature layout:
+#   detection_boxes   (N, K, 4) normalized [y1, x1, y2, x2]
+#   detection_classes (N, K)    1-based COCO class ids
+#   detection_scores  (N, K)    confidences
+OUTPUT_KEYS = ('detection_boxes', 'detection_classes', 'detection_scores')
+
+
+class InferenceBackend:
+    """Runs an SSD model on a (N, H, W, 3) uint8 RGB batch
+
+    Subclasses implement load() and predict(); the heavy runtime is only
+    imported inside load() so unused backends cost nothing at import time.
+    """
+
+    name = None
+    supports_batching = False
+
+    def load(self):
+        raise NotImplementedError
+
+    def predict(self, batch):
+        """Return a dict of OUTPUT_KEYS NumPy arrays for a batch the runtime accepts"""
+        raise NotImplementedError
+
+    @property
+    def model_id(self):
+        raise NotImplementedError
+
+    def __call__(self, batch):
+        if len(batch) == 1 or self.supports_batching:
+            return self.predict(batch)
+
+        per_image = [self.predict(batch[i:i + 1]) for i in range(len(batch))]
+        return {key: np.concatenate([outputs[key] for outputs in per_image])
+                for key in OUTPUT_KEYS}
+
+
+class TFHubBackend(InferenceBackend):
+    """TensorFlow SavedModel from TF Hub, loaded through the local model store
+
+    Args:
+        model_url (str): TF Hub handle or local SavedModel directory
+        model_store (ModelStore): local store the model is fetched into
+        intra_op_threads (int): threads inside one op, None lets TensorFlow decide
+        inter_op_threads (int): ops run concurrently, None lets TensorFlow decide
+    """
+
+    name = 'tfhub'
+
+    def __init__(self, model_url=DEFAULT_MODEL_URL, model_store=None, intra_op_threads=None,
+                 inter_op_threads=None):
+        self.model_url = model_url
+        self.model_store = model_store or ModelStore()
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.model = None
+        # Flipped off the first time the model rejects a batched input
+        self.supports_batching = True
+
+    @property
+    def model_id(self):
+        return self.model_url
+
+    def load(self):
+        import tensorflow as tf
+        import tensorflow_hub as hub
+        try:
+            if self.intra_op_threads:
+                tf.config.threading.set_intra_op_parallelism_threads(self.intra_op_threads)
+            if self.inter_op_threads:
+                tf.config.threading.set_inter_op_parallelism_threads(self.inter_op_threads)
+        except RuntimeError as e:
+            # Thread pools are fixed once TensorFlow has run anything in this process
+            print(f"⚠️ Could not set TensorFlow thread counts: {e}")
+        self.model_path = self.model_store.fetch(self.model_url)
+        self.model = hub.load(self.model_path)
+
+    def __call__(self, batch):
+        import tensorflow as tf
+        if len(batch) > 1 and self.supports_batching:
+            try:
+                return self.predict(batch)
+            except (ValueError, tf.errors.InvalidArgumentError) as e:
+                # The TF Hub SSD signature is declared with a batch dimension of 1
+                print(f"⚠️ Model rejected batched input, falling back to per-image calls: {e}")
+                self.supports_batching = False
+        return super().__call__(batch)
+
+    def predict(self, batch):
+        import tensorflow as tf
+        outputs = self.model(tf.convert_to_tensor(batch, dtype=tf.uint8))
+        return {key: outputs[key].numpy() for key in OUTPUT_KEYS}
+
+
+class TFLiteBackend(InferenceBackend):
+    """TFLite interpreter (XNNPACK-accelerated on CPU)
+
+    Uses tflite_runtime when installed, falling back to tf.lite. Models that
+    keep TensorFlow (Flex) ops, such as quantize_model.py exports with the SSD
+    post-processing, need tf.lite, which bundles the Flex delegate.
+
+    Args:
+        model_path (str): .tflite file
+        num_threads (int): interpreter / XNNPACK threads, defaults to all cores
+        class_id_offset (int): added to output classes; use 1 for graphs exported
+            with TFLite_Detection_PostProcess, which emits 0-based ids
+    """
+
+    name = 'tflite'
+    supports_batching = True
+
+    def __init__(self, model_path, num_threads=None, class_id_offset=0):
+        self.model_path = model_path
+        self.num_threads = num_threads or os.cpu_count()
+        self.class_id_offset = class_id_offset
+        self.interpreter = None
+        self._batch_size = None
+
+    @property
+    def model_id(self):
+        return os.path.abspath(self.model_path)
+
+    def load(self):
+        self.interpreter = None
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            pass
+        else:
+            try:
+                self.interpreter = self._open(Interpreter)
+            except RuntimeError as e:
+                if 'Flex' not in str(e) and 'TensorFlow ops' not in str(e):
+                    raise
+                print(f"⚠️ {self.model_path} uses TensorFlow (Flex) ops that tflite_runtime "
+                      "cannot run, falling back to tf.lite")
+                try:
+                    import tensorflow  # noqa: F401
+                except ImportError:
+                    raise RuntimeError(f"{self.model_path} needs TensorFlow (Flex) ops; install "
+                                       "tensorflow, whose tf.lite includes the Flex delegate")
+        if self.interpreter is None:
+            import tensorflow as tf
+            self.interpreter = self._open(tf.lite.Interpreter)
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self._batch_size = int(self.input_detail['shape'][0])
+        self.output_index = self._map_outputs(self.interpreter.get_output_details())
+
+    def _open(self, Interpreter):
+        interpreter = Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+        interpreter.allocate_tensors()
+        return interpreter
+
+    @staticmethod
+    def _map_outputs(details):
+        """Find the boxes/classes/scores tensors by name, else by position"""
+        by_name = {}
+        for detail in details:
+            name = detail['name'].lower()
+            for key, token in zip(OUTPUT_KEYS, ('box', 'class', 'score')):
+                if token in name and key not in by_name:
+                    by_name[key] = detail['index']
+        if len(by_name) == len(OUTPUT_KEYS):
+            return by_name
+        # TFLite_Detection_PostProcess order: boxes, classes, scores, count
+        return {key: details[i]['index'] for i, key in enumerate(OUTPUT_KEYS)}
+
+    def _prepare_input(self, batch):
+        dtype = self.input_detail['dtype']
+        if dtype == np.uint8:
+            return batch
+        if dtype == np.float32:
+            return batch.astype(np.float32) / 127.5 - 1.0
+        # Fully-quantized int8 input: map [-1, 1] floats onto the input scale
+        scale, zero_point = self.input_detail['quantization']
+        normalized = batch.astype(np.float32) / 127.5 - 1.0
+        return np.clip(np.round(normalized / scale + zero_point), -128, 127).astype(dtype)
+
+    def predict(self, batch):
+        if len(batch) != self._batch_size:
+            self.interpreter.resize_tensor_input(self.input_detail['index'],
+                                                 [len(batch)] + list(batch.shape[1:]))
+            self.interpreter.allocate_tensors()
+            self._batch_size = len(batch)
+
+        self.interpreter.set_tensor(self.input_detail['index'], self._prepare_input(batch))
+        self.interpreter.invoke()
+        outputs = {key: self.interpreter.get_tensor(index)
+                   for key, index in self.output_index.items()}
+        outputs['detection_classes'] = outputs['detection_classes'] + self.class_id_offset
+        return outputs
+
+
+class ONNXRuntimeBackend(InferenceBackend):
+    """ONNX Runtime CPU session, e.g. a tf2onnx export of the TF Hub model
+
+    Args:
+        model_path (str): .onnx file
+        intra_op_threads (int): threads per operator, 0 lets ONNX Runtime decide
+    """
+
+    name = 'onnx'
+    supports_batching = True
+
+    def __init__(self, model_path, intra_op_threads=0):
+        self.model_path = model_path
+        self.intra_op_threads = intra_op_threads
+        self.session = None
+
+    @property
+    def model_id(self):
+        return os.path.abspath(self.model_path)
+
+    def load(self):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        self.session = ort.InferenceSession(self.model_path, options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        input_shape = self.session.get_inputs()[0].shape
+        # Exports with a fixed batch dimension of 1 have to be fed one image at a time
+        self.supports_batching = not isinstance(input_shape[0], int) or input_shape[0] != 1
+
+    def predict(self, batch):
+        outputs = self.session.run(list(OUTPUT_KEYS), {self.input_name: batch})
+        return dict(zip(OUTPUT_KEYS, outputs))
+
+
+class OpenCVDNNBackend(InferenceBackend):
+    """cv2.dnn with a frozen TensorFlow SSD MobileNet graph
+
+    Args:
+        model_path (str): frozen_inference_graph.pb
+        config_path (str): matching .pbtxt text graph
+        max_detections (int): rows per image in the padded output arrays
+    """
+
+    name = 'opencv'
+    supports_batching = True
+
+    def __init__(self, model_path, config_path, max_detections=100):
+        self.model_path = model_path
+        self.config_path = config_path
+        self.max_detections = max_detections
+        self.net = None
+
+    @property
+    def model_id(self):
+        return os.path.abspath(self.model_path)
+
+    def load(self):
+        import cv2
+        self.net = cv2.dnn.readNetFromTensorflow(self.model_path, self.config_path)
+
+    def predict(self, batch):
+        import cv2
+        height, width = batch.shape[1:3]
+        blob = cv2.dnn.blobFromImages(list(batch), size=(width, height), swapRB=False, crop=False)
+        self.net.setInput(blob)
+        # (1, 1, M, 7) rows of [image_id, class_id, score, x1, y1, x2, y2]
+        rows = self.net.forward().reshape(-1, 7)
+
+        boxes = np.zeros((len(batch), self.max_detections, 4), dtype=np.float32)
+        classes = np.zeros((len(batch), self.max_detections), dtype=np.float32)
+        scores = np.zeros((len(batch), self.max_detections), dtype=np.float32)
+        for i in range(len(batch)):
+            image_rows = rows[rows[:, 0] == i]
+            image_rows = image_rows[np.argsort(-image_rows[:, 2])][:self.max_detections]
+            count = len(image_rows)
+            boxes[i, :count] = image_rows[:, [4, 3, 6, 5]]
+            classes[i, :count] = image_rows[:, 1]
+            scores[i, :count] = image_rows[:, 2]
+        return dict(zip(OUTPUT_KEYS, (boxes, classes, scores)))
+
+
+class StubBackend(InferenceBackend):
+    """Offline stand-in that mimics the SSD output dict without a model
+
+    Returns max_detections rows per image: the first num_detections score
+    0.9 with class ids cycling through the COCO category ids (1-90,
+    skipping the unused ones), the rest score 0.05.
+    Useful for benchmarks and tests that must not depend on a download.
+
+    Args:
+        num_detections (int): confident detections per image
+        max_detections (int): rows per image, as in the real model (100)
+        latency_ms (float): simulated forward-pass time per call
+        seed (int): seed for the generated boxes
+    """
+
+    name = 'stub'
+    supports_batching = True
+
+    def __init__(self, num_detections=10, max_detections=100, latency_ms=0.0, seed=0):
+        self.num_detections = min(num_detections, max_detections)
+        self.max_detections = max_detections
+        self.latency_ms = latency_ms
+        rng = np.random.default_rng(seed)
+        corners = rng.uniform(0.0, 0.8, (max_detections, 2))
+        extents = rng.uniform(0.05, 0.2, (max_detections, 2))
+        self._boxes = np.concatenate([corners, corners + extents], axis=1).astype(np.float32)
+        class_ids = np.array([i for i, name in enumerate(COCO_LABELS) if name is not None])
+        self._classes = class_ids[np.arange(max_detections) % len(class_ids)].astype(np.float32)
+        self._scores = np.full(max_detections, 0.05, dtype=np.float32)
+        self._scores[:self.num_detections] = 0.9
+
+    @property
+    def model_id(self):
+        return f"stub:{self.num_detections}/{self.max_detections}"
+
+    def load(self):
+        pass
+
+    def predict(self, batch):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        count = len(batch)
+        return {
+            'detection_boxes': np.broadcast_to(self._boxes, (count,) + self._boxes.shape).copy(),
+            'detection_classes': np.broadcast_to(self._classes, (count, self.max_detections)).copy(),
+            'detection_scores': np.broadcast_to(self._scores, (count, self.max_detections)).copy(),
+        }
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (TFHubBackend, TFLiteBackend, ONNXRuntimeBackend, OpenCVDNNBackend,
+                    StubBackend)
+}
+
+
+def create_backend(name=None, **options):
+    """Build a backend by name, defaulting to $SSD_BACKEND or 'tfhub'"""
+    name = name or os.environ.get('SSD_BACKEND', 'tfhub')
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, choose from {sorted(BACKENDS)}")
+    return BACKENDS[name](**options)
+
+
+def compare_backends(reference, candidate, images, atol=0.02):
+    """Check that two loaded detectors agree on the same images
+
+    Detections are paired by class and IoU, and box coordinates are compared
+    in normalized units.
+
+    Returns:
+        dict: matched/unmatched counts, worst coordinate deviation and 'agree'
+    """
+    matched = unmatched = 0
+    max_deviation = 0.0
+    for image in images:
+        height, width = image.shape[:2]
+        scale = np.array([width, height, width, height], dtype=np.float64)
+        det_a = reference.detect(image)
+        det_b = candidate.detect(image)
+        pairs = match_detections(det_a.boxes, det_a.class_ids, det_b.boxes, det_b.class_ids)
+        matched += len(pairs)
+        unmatched += len(det_a) + len(det_b) - 2 * len(pairs)
+        for i, j in pairs:
+            deviation = np.abs(det_a.boxes[i] - det_b.boxes[j]) / scale
+            max_deviation = max(max_deviation, float(deviation.max()))
+
+    return {
+        'matched': matched,
+        'unmatched': unmatched,
+        'max_box_deviation': max_deviation,
+        'agree': unmatched == 0 and max_deviation <= atol,
+    }
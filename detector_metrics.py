@@ -0,0 +1,245 @@
+# detector_metrics.py - Stage timings, counters and profiling for StreamlitSSDDetector
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+STAGES = ('preprocess', 'inference', 'postprocess', 'draw')
+
+# Prometheus histogram bucket bounds in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Cumulative bucketed histogram plus a rolling window for percentiles
+
+    The buckets and sum cover every observation since the last reset, as
+    Prometheus expects; percentiles come from the most recent window
+    observations so they follow the current load.
+    """
+
+    def __init__(self, window=2048, buckets=LATENCY_BUCKETS):
+        self.bounds = np.asarray(buckets, dtype=np.float64)
+        self.bucket_counts = np.zeros(len(buckets) + 1, dtype=np.int64)
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.bucket_counts[np.searchsorted(self.bounds, seconds)] += 1
+        self.recent.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        """Count, mean and rolling p50/p95/p99/max in milliseconds"""
+        summary = {'count': self.count,
+                   'mean_ms': self.total / self.count * 1000 if self.count else 0.0}
+        if self.recent:
+            values = np.asarray(self.recent) * 1000
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            summary.update(p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99),
+                           max_ms=float(values.max()))
+        else:
+            summary.update(p50_ms=0.0, p95_ms=0.0, p99_ms=0.0, max_ms=0.0)
+        return summary
+
+    def prometheus_lines(self, name, labels):
+        cumulative = np.cumsum(self.bucket_counts).tolist()
+        lines = [f'{name}_bucket{{{labels},le="{bound:g}"}} {count}'
+                 for bound, count in zip(self.bounds.tolist(), cumulative)]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative[-1]}')
+        lines.append(f'{name}_sum{{{labels}}} {self.total:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class ProfileCapture:
+    """cProfile (and optionally the TensorFlow profiler) over the next N detector calls
+
+    Calls are profiled one at a time; calls made on other threads while one
+    is being profiled are skipped.
+
+    Args:
+        num_calls (int): top-level detector calls to capture
+        tf_logdir (str): also write a TensorBoard trace here
+        sort_by (str): pstats sort key for the text report
+    """
+
+    def __init__(self, num_calls=10, tf_logdir=None, sort_by='cumulative'):
+        self.num_calls = num_calls
+        self.tf_logdir = tf_logdir
+        self.sort_by = sort_by
+        self.calls = 0
+        self.profile = cProfile.Profile()
+        self.report = None
+        self.active = False
+        self._lock = threading.Lock()
+        self._tf_started = False
+
+    @property
+    def done(self):
+        return self.report is not None
+
+    def claim(self):
+        """Take the profiler for one call unless another thread holds it"""
+        with self._lock:
+            if self.active or self.done:
+                return False
+            self.active = True
+            return True
+
+    def start(self):
+        if self.tf_logdir and not self._tf_started:
+            import tensorflow as tf
+            tf.profiler.experimental.start(self.tf_logdir)
+            self._tf_started = True
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.calls += 1
+        if self.calls >= self.num_calls:
+            self.finish()
+        self.active = False
+
+    def finish(self, top=30):
+        """Stop profiling and keep the text report of the slowest functions"""
+        if self._tf_started:
+            import tensorflow as tf
+            tf.profiler.experimental.stop()
+            self._tf_started = False
+        out = io.StringIO()
+        try:
+            pstats.Stats(self.profile, stream=out).sort_stats(self.sort_by).print_stats(top)
+        except TypeError:
+            out.write("No calls were profiled\n")
+        self.report = out.getvalue()
+        return self.report
+
+
+class DetectorMetrics:
+    """Per-stage latency histograms and counters for one detector
+
+    Stages are timed with time.perf_counter by the detector itself:
+    preprocess (per image), inference (per model call), postprocess (per
+    decode) and draw. Top-level calls (detect, detect_batch, ...) get their
+    own latency histograms, and images, errors and detections per class are
+    counted. Everything is safe to record from several threads.
+
+    Args:
+        class_names (list): names indexed by class id, for the per-class counters
+        window (int): observations kept for rolling percentiles
+    """
+
+    def __init__(self, class_names, window=2048):
+        self.class_names = class_names
+        self.window = window
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.capture = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {stage: LatencyHistogram(self.window) for stage in STAGES}
+            self.calls = {}
+            self.images = 0
+            self.errors = {}
+            self.class_counts = np.zeros(len(self.class_names), dtype=np.int64)
+
+    def record(self, stage, seconds):
+        """Add one timing for a stage"""
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = LatencyHistogram(self.window)
+            histogram.observe(seconds)
+
+    def record_error(self, stage):
+        with self._lock:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def record_detections(self, detections):
+        """Count one processed image and its detections per class"""
+        counts = np.bincount(detections.class_ids, minlength=len(self.class_counts))
+        with self._lock:
+            self.images += 1
+            self.class_counts += counts[:len(self.class_counts)]
+
+    @contextmanager
+    def call(self, method):
+        """Time a top-level detector call; nested calls are not counted twice"""
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        local.depth = depth + 1
+        capture = self.capture if depth == 0 else None
+        if capture is not None and not capture.claim():
+            capture = None
+        if capture is not None:
+            capture.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            local.depth = depth
+            if capture is not None:
+                capture.stop()
+                if capture.done:
+                    self.capture = None
+            if depth == 0:
+                with self._lock:
+                    histogram = self.calls.get(method)
+                    if histogram is None:
+                        histogram = self.calls[method] = LatencyHistogram(self.window)
+                    histogram.observe(elapsed)
+
+    def profile_next(self, num_calls=10, tf_logdir=None):
+        """Profile the next num_calls top-level calls; returns the ProfileCapture"""
+        self.capture = ProfileCapture(num_calls, tf_logdir)
+        return self.capture
+
+    def snapshot(self):
+        """JSON-serializable view of every histogram and counter"""
+        with self._lock:
+            return {
+                'stages': {stage: h.summary() for stage, h in self.stages.items()},
+                'calls': {method: h.summary() for method, h in self.calls.items()},
+                'images': self.images,
+                'errors': dict(self.errors),
+                'detections': {self.class_names[i]: int(count)
+                               for i, count in enumerate(self.class_counts.tolist()) if count},
+            }
+
+    def to_prometheus(self, prefix='ssd'):
+        """Prometheus text exposition format"""
+        with self._lock:
+            lines = [f'# HELP {prefix}_stage_latency_seconds Detector stage latency',
+                     f'# TYPE {prefix}_stage_latency_seconds histogram']
+            for stage, histogram in self.stages.items():
+                lines += histogram.prometheus_lines(f'{prefix}_stage_latency_seconds',
+                                                    f'stage="{stage}"')
+            lines += [f'# HELP {prefix}_call_latency_seconds Top-level detector call latency',
+                      f'# TYPE {prefix}_call_latency_seconds histogram']
+            for method, histogram in self.calls.items():
+                lines += histogram.prometheus_lines(f'{prefix}_call_latency_seconds',
+                                                    f'method="{method}"')
+            lines += [f'# HELP {prefix}_images_total Images with detections decoded',
+                      f'# TYPE {prefix}_images_total counter',
+                      f'{prefix}_images_total {self.images}',
+                      f'# HELP {prefix}_errors_total Errors caught by the detector',
+                      f'# TYPE {prefix}_errors_total counter']
+            lines += [f'{prefix}_errors_total{{stage="{stage}"}} {count}'
+                      for stage, count in self.errors.items()]
+            lines += [f'# HELP {prefix}_detections_total Detections returned per class',
+                      f'# TYPE {prefix}_detections_total counter']
+            lines += [f'{prefix}_detections_total{{class="{self.class_names[i]}"}} {count}'
+                      for i, count in enumerate(self.class_counts.tolist()) if count]
+            return '\n'.join(lines) + '\n'
@@ -0,0 +1,257 @@
+# image_ingest.py - Decode images straight to model-input size with as few copies as possible
+import argparse
+import io
+import time
+import tracemalloc
+
+import numpy as np
+
+REDUCTION_FACTORS = (8, 4, 2)
+
+
+def is_encoded(source):
+    """True for encoded image bytes (bytes, bytearray or a 1-D memoryview)"""
+    if isinstance(source, (bytes, bytearray)):
+        return True
+    return isinstance(source, memoryview) and source.ndim == 1
+
+
+def encoded_size(data):
+    """(height, width) read from the image header without decoding pixels"""
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+    return height, width
+
+
+def reduction_factor(height, width, target_size):
+    """Largest JPEG scale-down (8, 4 or 2) that still covers target_size (width, height)"""
+    target_width, target_height = target_size
+    for factor in REDUCTION_FACTORS:
+        if height // factor >= target_height and width // factor >= target_width:
+            return factor
+    return 1
+
+
+def decode_reduced(data, target_size):
+    """Decode encoded bytes at the smallest scale that still covers target_size
+
+    JPEGs are decoded by libjpeg at 1/2, 1/4 or 1/8 scale, so a 12 MP phone
+    photo never exists at full resolution in memory; other formats are
+    decoded in full and downsampled by OpenCV. EXIF orientation is ignored,
+    matching how PIL images are displayed in the app.
+
+    Returns:
+        tuple: (BGR array, (height, width) of the full-resolution image)
+    """
+    import cv2
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+             4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+    height, width = encoded_size(data)
+    factor = reduction_factor(height, width, target_size)
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8),
+                         flags[factor] | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        raise ValueError("Could not decode image data")
+    return image, (height, width)
+
+
+def pil_jpeg_bytes(image):
+    """Encoded bytes behind a PIL JPEG that has not been decoded yet, else None
+
+    The file position is restored, so the caller's image still loads normally.
+    """
+    fp = getattr(image, 'fp', None)
+    if image.format != 'JPEG' or fp is None:
+        return None
+    position = fp.tell()
+    try:
+        fp.seek(0)
+        return fp.read()
+    finally:
+        fp.seek(position)
+
+
+def _record(copies, step, array):
+    if copies is not None:
+        copies.append((step, array.nbytes))
+
+
+def ingest_into(source, out, channel_order='bgr', copies=None):
+    """Resize an image into a preallocated (H, W, 3) uint8 RGB model-input slot
+
+    Args:
+        source: encoded bytes (decoded at reduced scale), a NumPy array or
+            pixel memoryview in channel_order, or a PIL image (JPEGs not yet
+            loaded are decoded at reduced scale from their file; the image
+            itself is never modified)
+        out (np.ndarray): destination slot, written in place
+        channel_order (str): 'bgr' or 'rgb' for arrays and memoryviews
+        copies (list): if given, collects (step, nbytes) for every
+            intermediate buffer allocated
+
+    Returns:
+        tuple: (height, width) of the original image
+    """
+    import cv2
+
+    target_size = (out.shape[1], out.shape[0])
+    size = None
+    if is_encoded(source):
+        image, size = decode_reduced(source, target_size)
+        _record(copies, 'decode', image)
+        is_bgr = True
+    elif isinstance(source, (np.ndarray, memoryview)):
+        image = np.asarray(source)
+        is_bgr = image.ndim == 3 and channel_order == 'bgr'
+    else:
+        width, height = source.size
+        size = (height, width)
+        data = pil_jpeg_bytes(source)
+        if data is not None:
+            # draft() would shrink the caller's own image, so decode a private copy
+            image, _ = decode_reduced(data, target_size)
+            _record(copies, 'decode', image)
+            is_bgr = True
+        else:
+            if source.mode not in ('RGB', 'L', 'RGBA'):
+                source = source.convert('RGB')
+            image = np.asarray(source)
+            _record(copies, 'pil_to_numpy', image)
+            is_bgr = False
+
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        _record(copies, 'gray_to_rgb', image)
+    elif image.shape[2] == 4:
+        # Drops the alpha channel; the channel order is unchanged
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        _record(copies, 'drop_alpha', image)
+
+    # Resize first so the channel swap only touches the small buffer
+    cv2.resize(image, target_size, dst=out)
+    if is_bgr:
+        cv2.cvtColor(out, cv2.COLOR_BGR2RGB, dst=out)
+
+    return size or image.shape[:2]
+
+
+class ImageIngestor:
+    """Turns uploads into one reusable model-input tensor
+
+    Every call writes into the same preallocated (1, H, W, 3) RGB tensor,
+    so steady-state ingestion allocates only what decoding itself needs.
+    Not thread-safe; use one ingestor per thread.
+
+    Args:
+        input_size (tuple): model input (width, height)
+    """
+
+    def __init__(self, input_size=(300, 300)):
+        width, height = input_size
+        self.tensor = np.empty((1, height, width, 3), dtype=np.uint8)
+        self.last_copies = []
+
+    def ingest(self, source, channel_order='bgr'):
+        """Fill the tensor from source
+
+        Returns:
+            tuple: (tensor, original (height, width))
+        """
+        self.last_copies = []
+        size = ingest_into(source, self.tensor[0], channel_order, self.last_copies)
+        return self.tensor, size
+
+
+def legacy_ingest(data, input_size=(300, 300)):
+    """The former app.py upload path: PIL decode -> np.array -> RGB2BGR -> resize -> BGR2RGB
+
+    Returns:
+        tuple: (model input, original size, copies list)
+    """
+    import cv2
+    from PIL import Image
+
+    copies = []
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    copies.append(('pil_decode', image.width * image.height * len(image.getbands())))
+    array = np.array(image)
+    _record(copies, 'pil_to_numpy', array)
+    bgr = cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+    _record(copies, 'rgb_to_bgr', bgr)
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    _record(copies, 'bgr_to_rgb', rgb)
+    resized = cv2.resize(rgb, input_size)
+    _record(copies, 'resize', resized)
+    return resized, bgr.shape[:2], copies
+
+
+def measure_ingest(fn, repeats=5):
+    """Time fn() and trace its peak Python-visible allocation
+
+    tracemalloc sees NumPy and OpenCV output arrays but not decoder-internal
+    buffers, so PIL's own decode buffer is reported through the copies list.
+
+    Returns:
+        dict: best time in ms, peak traced bytes, copy count and copied bytes
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    copies = result[-1]
+    return {
+        'ms': best * 1000,
+        'traced_peak_bytes': peak,
+        'copies': len(copies),
+        'copied_bytes': sum(nbytes for _, nbytes in copies),
+        'steps': copies,
+    }
+
+
+def compare_ingest(data, input_size=(300, 300), repeats=5):
+    """Legacy upload path against ingest_into for one encoded image"""
+    ingestor = ImageIngestor(input_size)
+
+    def ingest():
+        tensor, size = ingestor.ingest(data)
+        return tensor, size, ingestor.last_copies
+
+    return {
+        'legacy': measure_ingest(lambda: legacy_ingest(data, input_size), repeats),
+        'ingest': measure_ingest(ingest, repeats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare image ingestion paths on encoded files")
+    parser.add_argument('images', nargs='+', help="JPEG/PNG files")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    for path in args.images:
+        with open(path, 'rb') as f:
+            data = f.read()
+        height, width = encoded_size(data)
+        report = compare_ingest(data, repeats=args.repeats)
+        print(f"📷 {path} ({width}x{height}, {len(data) / 1024:.0f} KB)")
+        for name, stats in report.items():
+            print(f"   {name:<7} {stats['ms']:8.2f} ms   {stats['copies']} copies "
+                  f"({stats['copied_bytes'] / 2**20:6.1f} MB)   "
+                  f"traced peak {stats['traced_peak_bytes'] / 2**20:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+# model_cascade.py - Two-stage inference: a cheap model first, the full model only when unsure
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from box_utils import match_detections
+from detector_backends import OUTPUT_KEYS, create_backend
+
+
+def escalation_mask(scores, uncertain_band=(0.25, 0.6), max_detections=10,
+                    confidence_threshold=None):
+    """Which images of a stage-one batch need the full model
+
+    An image escalates when any score falls inside the uncertain band
+    [low, high) or more than max_detections score at or above high.
+    Everything else is either clearly empty or a few confident objects.
+    A confidence_threshold below low widens the band down to it, so no
+    stage-one score that would be kept is accepted without the full model.
+
+    Args:
+        scores (np.ndarray): (N, K) stage-one detection scores
+        confidence_threshold (float): threshold the outputs will be decoded at
+
+    Returns:
+        np.ndarray: (N,) bool
+    """
+    low, high = uncertain_band
+    if confidence_threshold is not None:
+        low = min(low, confidence_threshold)
+    scores = np.asarray(scores)
+    uncertain = ((scores >= low) & (scores < high)).any(axis=1)
+    crowded = (scores >= high).sum(axis=1) > max_detections
+    return uncertain | crowded
+
+
+def merge_rows(outputs, replacement, rows):
+    """Copy of outputs with rows replaced by replacement, padding K if the models differ"""
+    merged = {}
+    for key in OUTPUT_KEYS:
+        base, new = np.asarray(outputs[key]), np.asarray(replacement[key])
+        width = max(base.shape[1], new.shape[1])
+        out = np.zeros((len(base), width) + base.shape[2:], dtype=np.float32)
+        out[:, :base.shape[1]] = base
+        out[rows] = 0
+        out[rows, :new.shape[1]] = new
+        merged[key] = out
+    return merged
+
+
+def normalized_detections(outputs, row, confidence_threshold):
+    """(boxes, class_ids) above the threshold for one image, in normalized coordinates"""
+    keep = np.asarray(outputs['detection_scores'][row]) > confidence_threshold
+    return (np.asarray(outputs['detection_boxes'][row])[keep],
+            np.asarray(outputs['detection_classes'][row]).astype(np.int32)[keep])
+
+
+class CascadeStats:
+    """Escalation, latency and agreement counters for a ModelCascade
+
+    Latency saved is estimated against running every image through the full
+    model, using the measured per-image cost of full-model calls. Agreement
+    is the F1-style overlap between stage-one and full-model detections on
+    audited images, which are accepted at stage one but also run in full.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.images = 0
+            self.escalated = 0
+            self.stage_one_seconds = 0.0
+            self.full_seconds = 0.0
+            self.full_images = 0
+            self.audit_seconds = 0.0
+            self.audited = 0
+            self.audit_matched = 0
+            self.audit_total = 0
+
+    def record(self, images, escalated, stage_one_seconds, full_seconds, full_images,
+               audit_seconds=0.0, audited=0, matched=0, total=0):
+        with self._lock:
+            self.images += images
+            self.escalated += escalated
+            self.stage_one_seconds += stage_one_seconds
+            self.full_seconds += full_seconds
+            self.full_images += full_images
+            self.audit_seconds += audit_seconds
+            self.audited += audited
+            self.audit_matched += matched
+            self.audit_total += total
+
+    def snapshot(self):
+        """JSON-serializable rates, latencies and agreement"""
+        with self._lock:
+            full_images = self.full_images
+            # Audit runs measure the full model's cost without counting as cascade time
+            full_cost = self.full_seconds + self.audit_seconds
+            per_image_full = full_cost / full_images if full_images else None
+            spent = self.stage_one_seconds + self.full_seconds
+            saved = (self.images * per_image_full - spent) if per_image_full is not None else None
+            return {
+                'images': self.images,
+                'escalated': self.escalated,
+                'escalation_rate': self.escalated / self.images if self.images else 0.0,
+                'mean_latency_ms': spent / self.images * 1000 if self.images else None,
+                'full_model_latency_ms': (per_image_full * 1000
+                                          if per_image_full is not None else None),
+                'latency_saved_ms': (saved / self.images * 1000
+                                     if saved is not None and self.images else None),
+                'audited': self.audited,
+                'agreement': (2 * self.audit_matched / self.audit_total
+                              if self.audit_total else (1.0 if self.audited else None)),
+            }
+
+
+class ModelCascade:
+    """Runs a cheap stage-one backend and escalates uncertain images to the full model
+
+    Used by StreamlitSSDDetector.enable_cascade(); every model call the
+    detector makes goes through run(), so results, caching and batching
+    work unchanged.
+
+    Args:
+        backend: stage-one backend name or InferenceBackend instance
+        backend_options (dict): keyword arguments for a named backend
+        input_size (tuple): stage-one input (width, height), None to reuse
+            the detector's input
+        uncertain_band (tuple): [low, high) stage-one scores that escalate
+        max_detections (int): confident stage-one detections before escalating
+        audit_every (int): also run every Nth accepted image through the full
+            model to measure agreement; 0 disables auditing
+        iou_threshold (float): IoU for pairing detections when auditing
+    """
+
+    def __init__(self, backend, backend_options=None, input_size=None,
+                 uncertain_band=(0.25, 0.6), max_detections=10, audit_every=0,
+                 iou_threshold=0.5):
+        if isinstance(backend, str) or backend is None:
+            backend = create_backend(backend, **(backend_options or {}))
+        self.backend = backend
+        self.input_size = tuple(input_size) if input_size else None
+        self.uncertain_band = tuple(uncertain_band)
+        self.max_detections = max_detections
+        self.audit_every = audit_every
+        self.iou_threshold = iou_threshold
+        self.stats = CascadeStats()
+        self._accepted = 0
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self):
+        low, high = self.uncertain_band
+        return f"{self.backend.model_id}@{low:g}-{high:g}/{self.max_detections}"
+
+    def load(self):
+        self.backend.load()
+
+    def _stage_one_input(self, batch):
+        if self.input_size is None or self.input_size == (batch.shape[2], batch.shape[1]):
+            return batch
+        import cv2
+        width, height = self.input_size
+        resized = np.empty((len(batch), height, width, 3), dtype=np.uint8)
+        for image, out in zip(batch, resized):
+            cv2.resize(image, self.input_size, dst=out, interpolation=cv2.INTER_AREA)
+        return resized
+
+    def _audit_rows(self, accepted):
+        """Indices among accepted images picked for auditing"""
+        if not self.audit_every or not len(accepted):
+            return np.zeros(0, dtype=np.int64)
+        with self._lock:
+            positions = self._accepted + np.arange(len(accepted))
+            self._accepted += len(accepted)
+        return accepted[(positions + 1) % self.audit_every == 0]
+
+    def run(self, full_backend, batch, confidence_threshold=0.5):
+        """Model outputs for a batch: stage one where confident, the full model elsewhere
+
+        Args:
+            full_backend (InferenceBackend): the detector's own backend
+            batch (np.ndarray): (N, H, W, 3) uint8 RGB model inputs
+            confidence_threshold (float): threshold the outputs will be decoded
+                at; scores from it up to the band also escalate, and audited
+                results are compared at it
+
+        Returns:
+            dict: OUTPUT_KEYS arrays for the whole batch
+        """
+        start = time.perf_counter()
+        outputs = self.backend(self._stage_one_input(batch))
+        stage_one_seconds = time.perf_counter() - start
+
+        escalate = escalation_mask(outputs['detection_scores'], self.uncertain_band,
+                                   self.max_detections, confidence_threshold)
+        escalated = np.nonzero(escalate)[0]
+        audited = self._audit_rows(np.nonzero(~escalate)[0])
+        full_rows = np.concatenate([escalated, audited])
+
+        full_seconds = audit_seconds = 0.0
+        matched = total = 0
+        if len(full_rows):
+            start = time.perf_counter()
+            full = full_backend(batch[full_rows])
+            elapsed = time.perf_counter() - start
+            full_seconds = elapsed * len(escalated) / len(full_rows)
+            audit_seconds = elapsed - full_seconds
+            for i, row in enumerate(audited.tolist(), start=len(escalated)):
+                boxes_a, classes_a = normalized_detections(outputs, row, confidence_threshold)
+                boxes_b, classes_b = normalized_detections(full, i, confidence_threshold)
+                matched += len(match_detections(boxes_a, classes_a, boxes_b, classes_b,
+                                                self.iou_threshold))
+                total += len(boxes_a) + len(boxes_b)
+            if len(escalated):
+                outputs = merge_rows(outputs, {key: np.asarray(full[key])[:len(escalated)]
+                                               for key in OUTPUT_KEYS}, escalated)
+
+        self.stats.record(len(batch), len(escalated), stage_one_seconds, full_seconds,
+                          len(full_rows), audit_seconds, len(audited), matched, total)
+        return outputs
+
+
+def evaluate_cascade(detector, images, iou_threshold=0.5):
+    """Compare a cascade-enabled detector against always running the full model
+
+    Each image is run both ways; agreement is the F1-style overlap of the
+    two detection sets at the detector's confidence threshold.
+
+    Returns:
+        dict: escalation rate, mean full and cascade latency, latency saved
+            and agreement
+    """
+    cascade = detector.cascade
+    width, height = detector.input_size
+    batch = np.empty((1, height, width, 3), dtype=np.uint8)
+    threshold = detector.confidence_threshold
+    escalated_before = cascade.stats.escalated
+    full_times, cascade_times = [], []
+    matched = total = 0
+    for image in images:
+        detector.preprocess_into(image, batch[0])
+        start = time.perf_counter()
+        full = detector.backend(batch)
+        full_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        outputs = cascade.run(detector.backend, batch, threshold)
+        cascade_times.append(time.perf_counter() - start)
+
+        boxes_a, classes_a = normalized_detections(full, 0, threshold)
+        boxes_b, classes_b = normalized_detections(outputs, 0, threshold)
+        matched += len(match_detections(boxes_a, classes_a, boxes_b, classes_b, iou_threshold))
+        total += len(boxes_a) + len(boxes_b)
+
+    count = len(full_times)
+    full_ms = np.mean(full_times) * 1000 if count else 0.0
+    cascade_ms = np.mean(cascade_times) * 1000 if count else 0.0
+    return {
+        'images': count,
+        'escalation_rate': (cascade.stats.escalated - escalated_before) / count if count else 0.0,
+        'full_ms': float(full_ms),
+        'cascade_ms': float(cascade_ms),
+        'latency_saved_pct': float(100 * (1 - cascade_ms / full_ms)) if full_ms else 0.0,
+        'agreement': 2 * matched / total if total else 1.0,
+    }
+
+
+def main():
+    from batch_detect import decode_image, iter_image_paths
+    from streamlit_detector import StreamlitSSDDetector
+
+    parser = argparse.ArgumentParser(description="Measure a two-stage model cascade")
+    parser.add_argument('inputs', nargs='+', help="Directories, image files or .txt file lists")
+    parser.add_argument('--backend', default=None, help="Full model backend")
+    parser.add_argument('--stage-one-backend', default='tflite')
+    parser.add_argument('--stage-one-model', default=None,
+                        help="Stage-one model file, e.g. a quantize_model.py .tflite")
+    parser.add_argument('--stage-one-size', type=int, nargs=2, default=None,
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--band', type=float, nargs=2, default=(0.25, 0.6), metavar=('LOW', 'HIGH'))
+    parser.add_argument('--max-detections', type=int, default=10)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--limit', type=int, default=200)
+    args = parser.parse_args()
+
+    detector = StreamlitSSDDetector(confidence_threshold=args.threshold, backend=args.backend)
+    if not detector.load_model():
+        print("❌ Cannot evaluate without a loaded model")
+        raise SystemExit(1)
+    options = {'model_path': args.stage_one_model} if args.stage_one_model else {}
+    if not detector.enable_cascade(args.stage_one_backend, options,
+                                   input_size=args.stage_one_size, uncertain_band=args.band,
+                                   max_detections=args.max_detections):
+        raise SystemExit(1)
+
+    images = []
+    for path in iter_image_paths(args.inputs):
+        image = decode_image(path)[1]
+        if image is not None:
+            images.append(image)
+        if len(images) >= args.limit:
+            break
+
+    report = evaluate_cascade(detector, images)
+    print(f"📊 {report['images']} images: {report['escalation_rate']:.1%} escalated")
+    print(f"   full model {report['full_ms']:.1f} ms   cascade {report['cascade_ms']:.1f} ms   "
+          f"({report['latency_saved_pct']:.0f}% saved)")
+    print(f"   agreement with full model: {report['agreement']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# model_store.py - Local SavedModel store so the detector can load without network access
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+DEFAULT_MODEL_URL = "https://tfhub.dev/tensorflow/ssd_mobilenet_v2/2"
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ssd_model_store")
+MANIFEST_NAME = "model_manifest.json"
+
+
+def _file_sha256(path, chunk_size=1 << 20):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _directory_checksums(directory):
+    """Map every file under directory (relative path) to its SHA-256"""
+    checksums = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name == MANIFEST_NAME:
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory).replace(os.sep, '/')
+            checksums[relative] = _file_sha256(path)
+    return checksums
+
+
+def model_sha256(checksums):
+    """One SHA-256 for a whole SavedModel: the hash of its sorted file checksums
+
+    Args:
+        checksums (dict): relative path -> file SHA-256, as stored in the manifest
+    """
+    digest = hashlib.sha256()
+    for relative in sorted(checksums):
+        digest.update(f"{relative} {checksums[relative]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ModelStore:
+    """Local, checksum-verified copies of TF Hub SavedModels
+
+    Models are keyed by their TF Hub URL. Once a model has been fetched (or
+    imported from a directory copied onto the machine) it is loaded from disk
+    without touching the network. With expected_sha256 set, a download or
+    import whose model_sha256() differs is rejected before it enters the
+    store, and a stored copy that differs is treated as corrupt.
+
+    Args:
+        store_dir (str): store location, defaults to $SSD_MODEL_STORE or ~/.cache/ssd_model_store
+        tfhub_cache_dir (str): optional TFHUB_CACHE_DIR used when downloading
+        offline (bool): never download, defaults to $SSD_MODEL_OFFLINE
+        verify (bool): check file checksums against the manifest before loading
+        expected_sha256 (str): pinned model digest, defaults to $SSD_MODEL_SHA256
+    """
+
+    def __init__(self, store_dir=None, tfhub_cache_dir=None, offline=None, verify=True,
+                 expected_sha256=None):
+        self.store_dir = store_dir or os.environ.get('SSD_MODEL_STORE', DEFAULT_STORE_DIR)
+        self.tfhub_cache_dir = tfhub_cache_dir
+        if offline is None:
+            offline = os.environ.get('SSD_MODEL_OFFLINE', '').lower() in ('1', 'true', 'yes')
+        self.offline = offline
+        self.verify_checksums = verify
+        expected_sha256 = expected_sha256 or os.environ.get('SSD_MODEL_SHA256')
+        self.expected_sha256 = expected_sha256.strip().lower() if expected_sha256 else None
+
+    def model_dir(self, model_url):
+        """Directory holding the stored copy of a model"""
+        name = model_url.split('://', 1)[-1].strip('/').replace('/', '_')
+        return os.path.join(self.store_dir, name)
+
+    def read_manifest(self, model_url):
+        """Return the stored manifest, or None if the model is not in the store"""
+        manifest_path = os.path.join(self.model_dir(model_url), MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    def verify(self, model_url):
+        """Check the stored files against the manifest checksums and the expected digest"""
+        manifest = self.read_manifest(model_url)
+        if manifest is None or not self._expected(manifest):
+            return False
+        return _directory_checksums(self.model_dir(model_url)) == manifest['files']
+
+    def _expected(self, manifest):
+        """Whether a manifest describes the pinned model (always True when nothing is pinned)"""
+        return self.expected_sha256 is None or model_sha256(manifest['files']) == self.expected_sha256
+
+    def fetch(self, model_url=DEFAULT_MODEL_URL):
+        """Return a local SavedModel path, downloading into the store if needed
+
+        Local directories are returned unchanged.
+        """
+        if os.path.isdir(model_url):
+            return model_url
+
+        target = self.model_dir(model_url)
+        manifest = self.read_manifest(model_url)
+        if manifest is not None:
+            # Even without the full file check, a pinned digest must match the manifest
+            verified = self.verify(model_url) if self.verify_checksums else self._expected(manifest)
+            if verified:
+                return target
+            print(f"⚠️ Checksum mismatch for stored model {target}")
+            if self.offline:
+                raise IOError(f"Stored model at {target} is corrupt and offline mode is enabled")
+
+        if self.offline:
+            raise FileNotFoundError(
+                f"Model {model_url} is not in the store at {self.store_dir} and offline "
+                f"mode is enabled. Seed it with: python model_store.py import <saved_model_dir>")
+
+        print(f"🔄 Downloading {model_url} into the model store...")
+        return self.import_model(self._download(model_url), model_url)
+
+    def _download(self, model_url):
+        """Download a model and return the local SavedModel directory"""
+        import tensorflow_hub as hub
+        if not self.tfhub_cache_dir:
+            return hub.resolve(model_url)
+        # Point TF Hub at the store's cache for this download only
+        previous = os.environ.get('TFHUB_CACHE_DIR')
+        os.environ['TFHUB_CACHE_DIR'] = self.tfhub_cache_dir
+        try:
+            return hub.resolve(model_url)
+        finally:
+            if previous is None:
+                os.environ.pop('TFHUB_CACHE_DIR', None)
+            else:
+                os.environ['TFHUB_CACHE_DIR'] = previous
+
+    def import_model(self, source_dir, model_url=DEFAULT_MODEL_URL):
+        """Copy a SavedModel directory into the store and write its manifest
+
+        Raises IOError, leaving the store untouched, if the copy does not
+        match expected_sha256.
+        """
+        if not os.path.exists(os.path.join(source_dir, 'saved_model.pb')):
+            raise FileNotFoundError(f"No saved_model.pb in {source_dir}")
+
+        target = self.model_dir(model_url)
+        staging = target + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        shutil.copytree(source_dir, staging)
+
+        checksums = _directory_checksums(staging)
+        digest = model_sha256(checksums)
+        if self.expected_sha256 is not None and digest != self.expected_sha256:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise IOError(f"Model from {source_dir} has SHA-256 {digest}, "
+                          f"expected {self.expected_sha256}")
+
+        manifest = {
+            'model_url': model_url,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'sha256': digest,
+            'files': checksums,
+        }
+        with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        # Swap the finished copy in so readers never see a half-written model
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+        print(f"✅ Stored {model_url} at {target}")
+        return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local SSD model store")
+    parser.add_argument('--store-dir', default=None, help="Model store directory")
+    parser.add_argument('--sha256', default=None,
+                        help="Expected model digest (see verify), defaults to $SSD_MODEL_SHA256")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fetch_parser = subparsers.add_parser('fetch', help="Download a model into the store")
+    fetch_parser.add_argument('model_url', nargs='?', default=DEFAULT_MODEL_URL)
+
+    import_parser = subparsers.add_parser('import', help="Copy a SavedModel directory into the store")
+    import_parser.add_argument('source_dir')
+    import_parser.add_argument('--model-url', default=DEFAULT_MODEL_URL)
+
+    verify_parser = subparsers.add_parser('verify', help="Check stored checksums")
+    verify_parser.add_argument('model_url', nargs='?', default=DEFAULT_MODEL_URL)
+
+    args = parser.parse_args()
+    store = ModelStore(args.store_dir, expected_sha256=args.sha256)
+
+    if args.command == 'fetch':
+        store.fetch(args.model_url)
+    elif args.command == 'import':
+        store.import_model(args.source_dir, args.model_url)
+    elif args.command == 'verify':
+        if store.verify(args.model_url):
+            digest = model_sha256(store.read_manifest(args.model_url)['files'])
+            print(f"✅ {store.model_dir(args.model_url)} matches its manifest (sha256 {digest})")
+        else:
+            print(f"❌ {store.model_dir(args.model_url)} is missing or corrupt")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+# object_tracker.py - SORT-style tracking so video frames can skip inference
+import argparse
+import json
+import time
+
+import numpy as np
+
+from box_utils import iou_matrix, match_detections
+from streamlit_detector import Detections
+
+# Constant-velocity Kalman model over [cx, cy, area, aspect, vx, vy, varea], as in SORT
+_F = np.eye(7)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+_R = np.diag([1.0, 1.0, 10.0, 10.0])
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+
+
+def boxes_to_measurements(boxes):
+    """(N, 4) [x1, y1, x2, y2] -> (N, 4) [cx, cy, area, aspect]"""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    widths = np.maximum(boxes[:, 2] - boxes[:, 0], 1.0)
+    heights = np.maximum(boxes[:, 3] - boxes[:, 1], 1.0)
+    return np.stack([boxes[:, 0] + widths / 2, boxes[:, 1] + heights / 2,
+                     widths * heights, widths / heights], axis=1)
+
+
+def states_to_boxes(states):
+    """(N, 7) Kalman states -> (N, 4) [x1, y1, x2, y2]"""
+    areas = np.maximum(states[:, 2], 1.0)
+    aspects = np.maximum(states[:, 3], 1e-3)
+    widths = np.sqrt(areas * aspects)
+    heights = areas / widths
+    return np.stack([states[:, 0] - widths / 2, states[:, 1] - heights / 2,
+                     states[:, 0] + widths / 2, states[:, 1] + heights / 2], axis=1)
+
+
+class TrackedDetections(Detections):
+    """Detections with a stable track id per box"""
+
+    def __init__(self, boxes, scores, class_ids, class_names, track_ids):
+        super().__init__(boxes, scores, class_ids, class_names)
+        self.track_ids = track_ids
+
+    def to_dicts(self):
+        results = super().to_dicts()
+        for result, track_id in zip(results, self.track_ids.tolist()):
+            result['track_id'] = track_id
+        return results
+
+    def to_columns(self):
+        columns = super().to_columns()
+        columns['track_ids'] = self.track_ids.tolist()
+        return columns
+
+
+class SortTracker:
+    """IoU + Kalman-filter multi-object tracker (SORT) with vectorized state
+
+    All track states live in one (N, 7) array and their covariances in one
+    (N, 7, 7) array, so predicting or updating every track is a handful of
+    batched NumPy operations. Association is class-aware greedy IoU matching.
+
+    Args:
+        class_names (list): names for the returned detections
+        iou_threshold (float): minimum IoU to continue a track
+        max_age (int): detection updates a track may miss before it is dropped
+        min_hits (int): matched detections before a track is reported
+    """
+
+    def __init__(self, class_names, iou_threshold=0.3, max_age=3, min_hits=1):
+        self.class_names = class_names
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.reset()
+
+    def reset(self):
+        self.states = np.zeros((0, 7))
+        self.covariances = np.zeros((0, 7, 7))
+        self.track_ids = np.zeros(0, dtype=np.int64)
+        self.class_ids = np.zeros(0, dtype=np.int32)
+        self.scores = np.zeros(0, dtype=np.float32)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self.next_id = 1
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def predict(self):
+        """Advance every track by one frame"""
+        if not len(self):
+            return
+        # Keep the predicted area positive, as in SORT
+        shrinking = self.states[:, 2] + self.states[:, 6] <= 0
+        self.states[shrinking, 6] = 0.0
+        self.states = self.states @ _F.T
+        self.covariances = _F @ self.covariances @ _F.T + _Q
+
+    def update(self, detections):
+        """Correct tracks with a fresh set of detections (call after predict())"""
+        boxes = np.asarray(detections.boxes, dtype=np.float64).reshape(-1, 4)
+        pairs = match_detections(states_to_boxes(self.states), self.class_ids, boxes,
+                                 detections.class_ids, self.iou_threshold)
+        matched_tracks = np.array([i for i, _ in pairs], dtype=np.int64)
+        matched_boxes = np.array([j for _, j in pairs], dtype=np.int64)
+
+        if len(pairs):
+            z = boxes_to_measurements(boxes[matched_boxes])
+            x = self.states[matched_tracks]
+            P = self.covariances[matched_tracks]
+            S = P[:, :4, :4] + _R
+            K = P[:, :, :4] @ np.linalg.inv(S)
+            x = x + (K @ (z - x[:, :4])[..., None])[..., 0]
+            P = P - K @ P[:, :4, :]
+            self.states[matched_tracks] = x
+            self.covariances[matched_tracks] = P
+            self.scores[matched_tracks] = detections.scores[matched_boxes]
+
+        self.misses += 1
+        self.misses[matched_tracks] = 0
+        self.hits[matched_tracks] += 1
+
+        new = np.setdiff1d(np.arange(len(boxes)), matched_boxes)
+        if len(new):
+            states = np.zeros((len(new), 7))
+            states[:, :4] = boxes_to_measurements(boxes[new])
+            self.states = np.vstack([self.states, states])
+            self.covariances = np.concatenate([self.covariances,
+                                               np.repeat(_P0[None], len(new), axis=0)])
+            self.track_ids = np.concatenate([self.track_ids,
+                                             np.arange(self.next_id, self.next_id + len(new))])
+            self.next_id += len(new)
+            self.class_ids = np.concatenate([self.class_ids, detections.class_ids[new]])
+            self.scores = np.concatenate([self.scores, detections.scores[new]])
+            self.hits = np.concatenate([self.hits, np.ones(len(new), dtype=np.int64)])
+            self.misses = np.concatenate([self.misses, np.zeros(len(new), dtype=np.int64)])
+
+        keep = self.misses <= self.max_age
+        if not keep.all():
+            for name in ('states', 'covariances', 'track_ids', 'class_ids', 'scores',
+                         'hits', 'misses'):
+                setattr(self, name, getattr(self, name)[keep])
+
+    def current(self, image_size=None):
+        """Tracks matched at the last update, with their current predicted boxes"""
+        visible = (self.misses == 0) & (self.hits >= self.min_hits)
+        boxes = states_to_boxes(self.states[visible])
+        if image_size is not None:
+            height, width = image_size
+            boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width - 1)
+            boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height - 1)
+        return TrackedDetections(np.round(boxes).astype(np.int32), self.scores[visible],
+                                 self.class_ids[visible], self.class_names,
+                                 self.track_ids[visible])
+
+
+class FrameChangeDetector:
+    """Cheap scene-change score: mean absolute difference of small grayscale thumbnails
+
+    Args:
+        thumbnail_size (tuple): (width, height) frames are shrunk to
+    """
+
+    def __init__(self, thumbnail_size=(64, 36)):
+        self.thumbnail_size = thumbnail_size
+        self.reference = None
+
+    def thumbnail(self, frame):
+        import cv2
+        small = cv2.resize(frame, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def score(self, frame):
+        """Change since the reference frame, from 0 (identical) to 1"""
+        if self.reference is None:
+            return 1.0
+        return float(np.abs(self.thumbnail(frame) - self.reference).mean() / 255)
+
+    def set_reference(self, frame):
+        self.reference = self.thumbnail(frame)
+
+
+class TrackingDetector:
+    """Runs the SSD on keyframes only and tracks objects in between
+
+    A frame is a keyframe every keyframe_interval frames, or earlier when
+    its frame-difference score against the last keyframe exceeds
+    change_threshold. Other frames return the Kalman-predicted track boxes.
+
+    Args:
+        detector (StreamlitSSDDetector): detector with a loaded model
+        keyframe_interval (int): run the model at least every k frames
+        change_threshold (float): frame-difference score that forces a keyframe
+        tracker_options (dict): keyword arguments for SortTracker
+    """
+
+    def __init__(self, detector, keyframe_interval=5, change_threshold=0.08,
+                 tracker_options=None):
+        self.detector = detector
+        self.keyframe_interval = keyframe_interval
+        self.change_threshold = change_threshold
+        self.tracker = SortTracker(detector.class_names, **(tracker_options or {}))
+        self.change = FrameChangeDetector()
+        self.reset()
+
+    def reset(self):
+        self.tracker.reset()
+        self.change.reference = None
+        self.frames = 0
+        self.keyframes = 0
+        self.change_keyframes = 0
+        self._since_keyframe = 0
+
+    def process(self, frame, channel_order='bgr'):
+        """Tracked detections for the next video frame
+
+        Returns:
+            TrackedDetections: boxes with stable track ids
+        """
+        self.frames += 1
+        self.tracker.predict()
+
+        due = self.keyframes == 0 or self._since_keyframe + 1 >= self.keyframe_interval
+        changed = not due and self.change.score(frame) > self.change_threshold
+        if due or changed:
+            self.tracker.update(self.detector.detect(frame, channel_order))
+            self.change.set_reference(frame)
+            self.keyframes += 1
+            self.change_keyframes += int(changed)
+            self._since_keyframe = 0
+        else:
+            self._since_keyframe += 1
+        return self.tracker.current(frame.shape[:2])
+
+    def stats(self):
+        """Frames seen, keyframes run and the effective inference rate"""
+        return {
+            'frames': self.frames,
+            'keyframes': self.keyframes,
+            'change_keyframes': self.change_keyframes,
+            'inference_rate': self.keyframes / self.frames if self.frames else 0.0,
+            'active_tracks': len(self.tracker),
+        }
+
+    def run(self, source, sink, max_frames=None):
+        """Process a video file path, camera index or cv2.VideoCapture sequentially
+
+        Returns:
+            dict: FPS plus the stats() counters
+        """
+        import cv2
+        capture = source if isinstance(source, cv2.VideoCapture) else cv2.VideoCapture(source)
+        if not capture.isOpened():
+            raise IOError(f"Cannot open video source {source!r}")
+
+        self.reset()
+        start = time.perf_counter()
+        try:
+            while max_frames is None or self.frames < max_frames:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                index = self.frames
+                detections = self.process(frame)
+                if sink.needs_frames:
+                    frame = self.detector.draw_detections(frame, detections, inplace=True)
+                sink.write(index, frame, detections)
+        finally:
+            elapsed = time.perf_counter() - start
+            capture.release()
+            sink.close()
+
+        stats = self.stats()
+        stats['elapsed_seconds'] = elapsed
+        stats['fps'] = self.frames / elapsed if elapsed > 0 else 0.0
+        return stats
+
+
+def evaluate_tracking(detector, frames, keyframe_interval=5, change_threshold=0.08,
+                      iou_threshold=0.5, tracker_options=None):
+    """Compare tracking mode against running the detector on every frame
+
+    Per-frame detections are the reference; tracked boxes are matched to
+    them per class at iou_threshold.
+
+    Returns:
+        dict: time per frame for both modes, the effective inference rate and
+            the tracked output's precision, recall and mean IoU against the reference
+    """
+    start = time.perf_counter()
+    reference = [detector.detect(frame) for frame in frames]
+    full_seconds = time.perf_counter() - start
+
+    tracking = TrackingDetector(detector, keyframe_interval, change_threshold, tracker_options)
+    start = time.perf_counter()
+    tracked = [tracking.process(frame) for frame in frames]
+    tracked_seconds = time.perf_counter() - start
+
+    matched = reference_total = tracked_total = 0
+    ious = []
+    for expected, result in zip(reference, tracked):
+        pairs = match_detections(expected.boxes, expected.class_ids, result.boxes,
+                                 result.class_ids, iou_threshold)
+        matched += len(pairs)
+        reference_total += len(expected)
+        tracked_total += len(result)
+        if pairs:
+            overlap = iou_matrix(expected.boxes, result.boxes)
+            ious.extend(overlap[i, j] for i, j in pairs)
+
+    report = tracking.stats()
+    report.update({
+        'full_ms_per_frame': full_seconds / len(frames) * 1000,
+        'tracked_ms_per_frame': tracked_seconds / len(frames) * 1000,
+        'speedup': full_seconds / tracked_seconds if tracked_seconds > 0 else 0.0,
+        'precision': matched / tracked_total if tracked_total else 1.0,
+        'recall': matched / reference_total if reference_total else 1.0,
+        'mean_iou': float(np.mean(ious)) if ious else 0.0,
+    })
+    return report
+
+
+def main():
+    import cv2
+    from streamlit_detector import StreamlitSSDDetector
+
+    parser = argparse.ArgumentParser(description="Measure tracking mode against per-frame detection")
+    parser.add_argument('source', help="Video file path")
+    parser.add_argument('--keyframe-interval', type=int, nargs='+', default=[2, 5, 10])
+    parser.add_argument('--change-threshold', type=float, default=0.08)
+    parser.add_argument('--max-frames', type=int, default=300)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--backend', default=None)
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    detector = StreamlitSSDDetector(confidence_threshold=args.threshold, backend=args.backend)
+    if not detector.load_model():
+        print("❌ Cannot evaluate tracking without a loaded model")
+        raise SystemExit(1)
+
+    capture = cv2.VideoCapture(args.source)
+    frames = []
+    while len(frames) < args.max_frames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(frame)
+    capture.release()
+    if not frames:
+        print(f"❌ No frames read from {args.source}")
+        raise SystemExit(1)
+
+    print(f"📊 {len(frames)} frames, change threshold {args.change_threshold}")
+    print(f"{'every k':>8} {'infer %':>8} {'ms/frame':>9} {'speedup':>8} "
+          f"{'precision':>10} {'recall':>7} {'mean IoU':>9}")
+    reports = []
+    for interval in args.keyframe_interval:
+        report = evaluate_tracking(detector, frames, interval, args.change_threshold)
+        report['keyframe_interval'] = interval
+        reports.append(report)
+        print(f"{interval:8d} {report['inference_rate']:8.1%} {report['tracked_ms_per_frame']:9.2f} "
+              f"{report['speedup']:7.2f}x {report['precision']:10.3f} {report['recall']:7.3f} "
+              f"{report['mean_iou']:9.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# quantize_model.py - Post-training quantization of the SSD model with a speed/accuracy report
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from box_utils import match_detections
+from model_store import DEFAULT_MODEL_URL, ModelStore
+from streamlit_detector import StreamlitSSDDetector, preprocess_into
+
+VARIANTS = ('dynamic', 'float16', 'int8')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_images(folder, limit=None):
+    """Read the images in a folder, sorted by name so runs are repeatable"""
+    images = []
+    if folder and os.path.isdir(folder):
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                image = cv2.imread(os.path.join(folder, name))
+                if image is not None:
+                    images.append(image)
+            if limit and len(images) >= limit:
+                break
+    return images
+
+
+def representative_dataset(images, input_size=(300, 300)):
+    """Calibration generator for full-integer quantization"""
+    def generator():
+        width, height = input_size
+        for image in images:
+            model_input = np.empty((1, height, width, 3), dtype=np.uint8)
+            preprocess_into(image, model_input[0])
+            yield [model_input]
+
+    return generator
+
+
+def convert(saved_model_dir, variant, output_path, calibration_images=None, input_size=(300, 300)):
+    """Convert the SavedModel into a post-training-quantized TFLite file
+
+    Args:
+        saved_model_dir (str): local SavedModel directory (see model_store.py)
+        variant (str): 'dynamic', 'float16' or 'int8'
+        output_path (str): .tflite file to write
+        calibration_images (list): BGR images used to calibrate 'int8'
+    """
+    import tensorflow as tf
+
+    model = tf.saved_model.load(saved_model_dir)
+    width, height = input_size
+
+    # Pin the input shape; the TF Hub signature leaves height and width open
+    @tf.function(input_signature=[tf.TensorSpec([1, height, width, 3], tf.uint8)])
+    def serve(images):
+        outputs = model(images)
+        return {key: outputs[key] for key in ('detection_boxes', 'detection_classes',
+                                              'detection_scores')}
+
+    converter = tf.lite.TFLiteConverter.from_concrete_functions(
+        [serve.get_concrete_function()], model)
+    # The SSD post-processing (NMS) ops have no TFLite builtin equivalent, so the
+    # export keeps them as Flex ops; TFLiteBackend loads those through tf.lite
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS,
+                                           tf.lite.OpsSet.SELECT_TF_OPS]
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if variant == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == 'int8':
+        if not calibration_images:
+            raise ValueError("int8 quantization needs calibration images")
+        converter.representative_dataset = representative_dataset(calibration_images, input_size)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+                                               tf.lite.OpsSet.SELECT_TF_OPS]
+        converter.inference_input_type = tf.uint8
+    elif variant != 'dynamic':
+        raise ValueError(f"Unknown variant {variant!r}, choose from {VARIANTS}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+    print(f"✅ Wrote {variant} model to {output_path}")
+    return output_path
+
+
+def _path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(path) for name in files)
+
+
+def _measure_variant(backend, backend_options, images, threshold, results):
+    """Child-process body: load one variant, time it and record peak RSS"""
+    detector = StreamlitSSDDetector(confidence_threshold=threshold, backend=backend,
+                                    backend_options=backend_options)
+    if not detector.load_model():
+        results.put({'error': 'model failed to load'})
+        return
+
+    latencies = []
+    detections = []
+    for image in images:
+        start = time.perf_counter()
+        result = detector.detect(image)
+        latencies.append(time.perf_counter() - start)
+        detections.append((result.boxes, result.class_ids))
+
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024
+    latencies_ms = np.asarray(latencies) * 1000
+    results.put({
+        'mean_latency_ms': float(latencies_ms.mean()),
+        'p50_latency_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_latency_ms': float(np.percentile(latencies_ms, 95)),
+        'peak_rss_mb': peak_rss / (1024 * 1024),
+        'detections': detections,
+    })
+
+
+def measure_variant(backend, backend_options, images, threshold=0.5, timeout=600.0):
+    """Measure a model variant in a fresh process so peak RSS is its own
+
+    A process that crashes (e.g. a native abort in the interpreter) or gives
+    no result within timeout seconds is reported as {'error': ...}.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_measure_variant,
+                              args=(backend, backend_options, images, threshold, results))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = results.get(timeout=0.5)
+        except queue.Empty:
+            if not process.is_alive():
+                # The result may have been flushed just before the process exited
+                try:
+                    result = results.get(timeout=0.5)
+                except queue.Empty:
+                    result = {'error': f"measurement process exited with code {process.exitcode}"}
+            elif time.monotonic() > deadline:
+                process.terminate()
+                result = {'error': f"no result after {timeout:.0f} s"}
+    process.join()
+    return result
+
+
+def detection_agreement(reference, candidate, iou_threshold=0.5):
+    """F1-style overlap between two lists of per-image (boxes, class_ids)"""
+    matched = total = 0
+    for (boxes_a, classes_a), (boxes_b, classes_b) in zip(reference, candidate):
+        matched += len(match_detections(boxes_a, classes_a, boxes_b, classes_b, iou_threshold))
+        total += len(boxes_a) + len(boxes_b)
+    return 2 * matched / total if total else 1.0
+
+
+def build_report(variant_paths, reference_path, images, threshold=0.5, timeout=600.0):
+    """Latency, size, peak RSS and agreement with the float model per variant"""
+    print("🔄 Measuring float reference model...")
+    reference = measure_variant('tfhub', {'model_url': reference_path}, images, threshold,
+                                timeout)
+    if 'error' in reference:
+        raise RuntimeError(f"Reference model: {reference['error']}")
+
+    report = {'float32': dict(reference, model_size_mb=_path_size(reference_path) / 1e6,
+                              agreement=1.0)}
+    for variant, path in variant_paths.items():
+        print(f"🔄 Measuring {variant} model...")
+        result = measure_variant('tflite', {'model_path': path}, images, threshold, timeout)
+        if 'error' in result:
+            report[variant] = result
+            continue
+        result['model_size_mb'] = _path_size(path) / 1e6
+        result['agreement'] = detection_agreement(reference['detections'], result['detections'])
+        report[variant] = result
+
+    for result in report.values():
+        result.pop('detections', None)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the SSD model and compare variants")
+    parser.add_argument('--model-url', default=DEFAULT_MODEL_URL)
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument('--calibration', default='sample_images',
+                        help="Folder of calibration images for int8")
+    parser.add_argument('--calibration-limit', type=int, default=200)
+    parser.add_argument('--images', default='sample_images',
+                        help="Fixed image set for the report")
+    parser.add_argument('--output-dir', default='quantized_models')
+    parser.add_argument('--report', default=None, help="Write the report as JSON")
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=600.0,
+                        help="Seconds to wait for each variant's measurement")
+    args = parser.parse_args()
+
+    saved_model_dir = ModelStore().fetch(args.model_url)
+    calibration = load_images(args.calibration, args.calibration_limit)
+    images = load_images(args.images)
+    if not images:
+        print(f"❌ No images found in {args.images}")
+        raise SystemExit(1)
+
+    variant_paths = {}
+    for variant in args.variants:
+        path = os.path.join(args.output_dir, f"ssd_mobilenet_v2_{variant}.tflite")
+        try:
+            variant_paths[variant] = convert(saved_model_dir, variant, path, calibration)
+        except Exception as e:
+            print(f"❌ {variant} conversion failed: {e}")
+
+    report = build_report(variant_paths, saved_model_dir, images, args.threshold, args.timeout)
+
+    print(f"\n📊 {len(images)} images, threshold {args.threshold}")
+    print(f"{'variant':<9} {'size MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>8} {'agree':>6}")
+    for variant, result in report.items():
+        if 'error' in result:
+            print(f"{variant:<9} {result['error']}")
+            continue
+        print(f"{variant:<9} {result['model_size_mb']:8.1f} {result['p50_latency_ms']:8.1f} "
+              f"{result['p95_latency_ms']:8.1f} {result['peak_rss_mb']:8.0f} "
+              f"{result['agreement']:6.3f}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# result_cache.py - Content-addressed cache of raw detector outputs
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class DetectionCache:
+    """LRU cache of raw, unthresholded SSD outputs keyed by image content
+
+    Entries are keyed by a hash of the encoded image bytes and the model id,
+    and hold the outputs of StreamlitSSDDetector.run_raw. Changing the
+    confidence threshold only re-filters the cached scores, so the model is
+    run once per distinct image.
+
+    Args:
+        max_entries (int): maximum number of cached images
+        max_bytes (int): maximum total size of the cached arrays
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_bytes, model_id):
+        """Content hash of the encoded image for a given model"""
+        digest = hashlib.sha256(model_id.encode('utf-8'))
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _entry_size(raw):
+        return sum(value.nbytes for value in raw.values() if hasattr(value, 'nbytes'))
+
+    def get(self, key, confidence_threshold=None):
+        """Return cached raw outputs for key, or None
+
+        Cascade outputs escalated for a stricter threshold than
+        confidence_threshold (their 'min_threshold') count as a miss.
+        """
+        with self._lock:
+            raw = self._entries.get(key)
+            stale = (raw is not None and confidence_threshold is not None
+                     and raw.get('min_threshold') is not None
+                     and confidence_threshold < raw['min_threshold'])
+            if raw is None or stale:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return raw
+
+    def put(self, key, raw):
+        """Store raw outputs, evicting least recently used entries"""
+        size = self._entry_size(raw)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entry_size(self._entries.pop(key))
+            self._entries[key] = raw
+            self.current_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self.current_bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= self._entry_size(evicted)
+
+    def detect(self, detector, image_bytes, load_image, confidence_threshold=None,
+               channel_order='bgr'):
+        """Detections for an encoded image, running the model only on a miss
+
+        Args:
+            detector (StreamlitSSDDetector): detector with a loaded model
+            image_bytes (bytes): encoded image used as the cache key
+            load_image (callable): returns the image (array, PIL image or encoded
+                bytes); only called on a miss
+            confidence_threshold (float): defaults to detector.confidence_threshold
+            channel_order (str): channel order of the array load_image returns
+
+        Returns:
+            tuple: (Detections, cache_hit)
+        """
+        if confidence_threshold is None:
+            confidence_threshold = detector.confidence_threshold
+        key = self.make_key(image_bytes, detector.model_id)
+        raw = self.get(key, confidence_threshold)
+        hit = raw is not None
+        if not hit:
+            raw = detector.run_raw(load_image(), channel_order, confidence_threshold)
+            self.put(key, raw)
+        detections = detector.decode_raw(raw, confidence_threshold)
+        if not hit:
+            # Images and class counts follow model runs, not re-decodes of cached outputs
+            detector.metrics.record_detections(detections)
+        return detections, hit
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,124 @@
+# startup_benchmark.py - Import time and memory cost of starting the detector
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter; prints one JSON line per startup stage
+_STAGES_SCRIPT = r'''
+import json, resource, sys, time
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def emit(stage, seconds):
+    print(json.dumps({'stage': stage, 'seconds': seconds,
+                      'peak_rss_mb': peak_rss_mb(),
+                      'heavy_modules': sorted(m for m in ('tensorflow', 'tensorflow_hub', 'cv2', 'PIL')
+                                              if m in sys.modules)}), flush=True)
+
+def report(stage, start):
+    emit(stage, time.perf_counter() - start)
+
+# Wall clock from the parent launching this process to its first line of code
+emit('interpreter', time.time() - LAUNCHED)
+
+start = time.perf_counter()
+from streamlit_detector import StreamlitSSDDetector
+report('import', start)
+
+start = time.perf_counter()
+detector = StreamlitSSDDetector(warmup=WARMUP)
+report('construct', start)
+
+if LOAD_MODEL:
+    start = time.perf_counter()
+    ok = detector.load_model()
+    report('load_model' if ok else 'load_model_failed', start)
+'''
+
+
+def measure_import_time(module='streamlit_detector', top=10):
+    """Run `python -X importtime -c "import module"` and parse the report
+
+    Returns:
+        dict: total cumulative import time and the slowest top-level imports
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=HERE, capture_output=True, text=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Each nesting level adds two spaces after the single separator space
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append({'module': name.strip(), 'self_ms': int(self_us) / 1000,
+                        'cumulative_ms': int(cumulative_us) / 1000, 'depth': depth})
+
+    # Children are listed before their parent, back to the previous top-level import
+    total = None
+    children = []
+    for index, entry in enumerate(entries):
+        if entry['module'] == module and entry['depth'] == 0:
+            total = entry['cumulative_ms']
+            for child in reversed(entries[:index]):
+                if child['depth'] == 0:
+                    break
+                if child['depth'] == 1:
+                    children.append(child)
+            break
+    children.sort(key=lambda e: e['cumulative_ms'], reverse=True)
+    return {'module': module, 'total_ms': total, 'slowest': children[:top]}
+
+
+def measure_stages(load_model=True, warmup=True):
+    """Wall time and peak RSS for interpreter startup, import, construction and
+    load_model in a fresh process"""
+    script = (_STAGES_SCRIPT.replace('LOAD_MODEL', repr(load_model))
+              .replace('WARMUP', repr(warmup)))
+    # perf_counter is per process, so interpreter startup is timed on the wall clock
+    script = script.replace('LAUNCHED', repr(time.time()))
+    result = subprocess.run([sys.executable, '-c', script], cwd=HERE,
+                            capture_output=True, text=True)
+    stages = []
+    for line in result.stdout.splitlines():
+        if line.startswith('{'):
+            stages.append(json.loads(line))
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure detector startup cost")
+    parser.add_argument('--skip-model', action='store_true', help="Do not call load_model()")
+    parser.add_argument('--no-warmup', action='store_true')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    imports = measure_import_time(top=args.top)
+    stages = measure_stages(load_model=not args.skip_model, warmup=not args.no_warmup)
+
+    print(f"📦 import streamlit_detector: {imports['total_ms']:.1f} ms")
+    for entry in imports['slowest']:
+        print(f"   {entry['module']:<30} {entry['cumulative_ms']:8.1f} ms")
+
+    print("\n⏱️ Startup stages (fresh process)")
+    for stage in stages:
+        heavy = ', '.join(stage['heavy_modules']) or '-'
+        print(f"   {stage['stage']:<18} {stage['seconds'] * 1000:9.1f} ms   "
+              f"peak RSS {stage['peak_rss_mb']:7.1f} MB   loaded: {heavy}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'imports': imports, 'stages': stages}, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,146 +1,622 @@
-
+# streamlit_detector.py - SSD MobileNet detector, columnar Detections and box drawing
 import os
+import threading
 import numpy as np
-import cv2
-import tensorflow as tf
-import tensorflow_hub as hub
-from PIL import Image
 import time
 
+from box_utils import non_max_suppression
+from coco_labels import COCO_CLASS_NAMES, COCO_LABELS
+from detector_backends import InferenceBackend, create_backend
+from detector_metrics import DetectorMetrics
+from image_ingest import ingest_into
+from model_cascade import ModelCascade
+from model_store import DEFAULT_MODEL_URL
+
+
+class Detections:
+    """Columnar detection results for a single image
+    
+    Attributes:
+        boxes (np.ndarray): (N, 4) int32 pixel boxes as [x1, y1, x2, y2]
+        scores (np.ndarray): (N,) float32 confidences
+        class_ids (np.ndarray): (N,) int32 COCO category ids (1-90, with gaps)
+        class_names (list): names indexed by class_id, e.g. COCO_LABELS
+    """
+    
+    def __init__(self, boxes, scores, class_ids, class_names):
+        self.boxes = boxes
+        self.scores = scores
+        self.class_ids = class_ids
+        self.class_names = class_names
+    
+    @classmethod
+    def empty(cls, class_names):
+        """Detections with no boxes"""
+        return cls(np.zeros((0, 4), dtype=np.int32), np.zeros(0, dtype=np.float32),
+                   np.zeros(0, dtype=np.int32), class_names)
+    
+    def __len__(self):
+        return len(self.scores)
+    
+    def to_dicts(self):
+        """Convert to the list-of-dicts format used by app.py"""
+        names = self.class_names
+        return [
+            {'class_name': names[class_id], 'confidence': score, 'bbox': bbox}
+            for class_id, score, bbox in zip(self.class_ids.tolist(),
+                                             self.scores.tolist(),
+                                             self.boxes.tolist())
+        ]
+    
+    def filter(self, min_score):
+        """Keep only detections scoring above min_score"""
+        keep = self.scores > min_score
+        return Detections(self.boxes[keep], self.scores[keep], self.class_ids[keep],
+                          self.class_names)
+    
+    def to_columns(self):
+        """Convert to JSON-serializable columns"""
+        return {
+            'boxes': self.boxes.tolist(),
+            'scores': self.scores.tolist(),
+            'class_ids': self.class_ids.tolist(),
+        }
+
+
+def decode_detections(boxes, classes, scores, sizes, class_names, confidence_threshold):
+    """Decode raw SSD outputs for a batch of images with vectorized NumPy
+    
+    Args:
+        boxes (np.ndarray): (N, K, 4) normalized [y1, x1, y2, x2] boxes
+        classes (np.ndarray): (N, K) COCO category ids
+        scores (np.ndarray): (N, K) confidences
+        sizes: N original (height, width) pairs used to scale the boxes
+        class_names (list): names indexed by class id; ids outside it or
+            named None are dropped
+        confidence_threshold (float): minimum score to keep a detection
+        
+    Returns:
+        list: one Detections object per image
+    """
+    classes = np.asarray(classes).astype(np.int32)
+    scores = np.asarray(scores, dtype=np.float32)
+    boxes = np.asarray(boxes)
+    
+    sizes = np.asarray(sizes, dtype=np.float64).reshape(-1, 2)
+    heights = sizes[:, 0, None]
+    widths = sizes[:, 1, None]
+    
+    known = np.array([name is not None for name in class_names])
+    in_range = (classes >= 0) & (classes < len(class_names))
+    keep = ((scores > confidence_threshold) & in_range
+            & known[np.where(in_range, classes, 0)])
+    
+    # Convert normalized coordinates to clipped pixel coordinates
+    pixel_boxes = np.stack([
+        np.clip(boxes[..., 1] * widths, 0, widths - 1),
+        np.clip(boxes[..., 0] * heights, 0, heights - 1),
+        np.clip(boxes[..., 3] * widths, 0, widths - 1),
+        np.clip(boxes[..., 2] * heights, 0, heights - 1),
+    ], axis=-1).astype(np.int32)
+    
+    return [Detections(pixel_boxes[i, keep[i]], scores[i, keep[i]],
+                       classes[i, keep[i]], class_names)
+            for i in range(len(sizes))]
+
+
+def preprocess_into(image, out, channel_order='bgr'):
+    """Resize an image into a preallocated (H, W, 3) uint8 RGB model-input slot
+    
+    NumPy arrays are in channel_order ('bgr' as OpenCV loads them, or 'rgb');
+    PIL images are always RGB; encoded bytes are decoded at reduced scale
+    (see image_ingest). Returns the (height, width) of the original image.
+    """
+    return ingest_into(image, out, channel_order)
+
+
+def tile_grid(height, width, tile_size=512, overlap=0.2):
+    """Overlapping square tile windows covering an image
+    
+    Tiles step by tile_size * (1 - overlap) and the last row and column are
+    shifted back to end flush with the image edge. Images no larger than a
+    tile get a single window.
+    
+    Returns:
+        np.ndarray: (N, 4) int32 windows as [x1, y1, x2, y2]
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+    
+    return np.array([[x, y, min(x + tile_size, width), min(y + tile_size, height)]
+                     for y in starts(height) for x in starts(width)], dtype=np.int32)
+
+
+class DetectionRenderer:
+    """Draws detection boxes and labels with a fixed per-class palette
+    
+    Colors are generated once per class and label text sizes are cached, so
+    drawing a frame only costs the OpenCV draw calls themselves.
+    """
+    
+    font_scale = 0.5
+    thickness = 2
+    max_cached_labels = 8192
+    
+    def __init__(self, class_names):
+        self.class_ids = {name: i for i, name in enumerate(class_names) if name is not None}
+        self.class_names = class_names
+        palette = np.random.RandomState(42).randint(0, 255, (len(class_names), 3))
+        self.palette = {
+            'bgr': [tuple(map(int, color)) for color in palette],
+            'rgb': [tuple(map(int, color[::-1])) for color in palette],
+        }
+        self._label_sizes = {}
+    
+    def label_size(self, label):
+        """Cached cv2.getTextSize for a label"""
+        size = self._label_sizes.get(label)
+        if size is None:
+            import cv2
+            if len(self._label_sizes) >= self.max_cached_labels:
+                self._label_sizes.clear()
+            size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX,
+                                   self.font_scale, self.thickness)[0]
+            self._label_sizes[label] = size
+        return size
+    
+    def draw(self, image, detections, inplace=False, channel_order='bgr'):
+        """Draw detections (Detections or list of dicts) onto image"""
+        import cv2
+        
+        result_image = image if inplace else image.copy()
+        palette = self.palette[channel_order]
+        
+        if isinstance(detections, Detections):
+            rows = ((class_id, self.class_names[class_id], confidence, bbox)
+                    for class_id, confidence, bbox in zip(detections.class_ids.tolist(),
+                                                          detections.scores.tolist(),
+                                                          detections.boxes.tolist()))
+        else:
+            rows = ((self.class_ids.get(d['class_name'], 0), d['class_name'],
+                     d['confidence'], d['bbox']) for d in detections)
+        
+        for class_id, class_name, confidence, bbox in rows:
+            color = palette[class_id % len(palette)]
+            
+            # Draw bounding box
+            cv2.rectangle(result_image, (bbox[0], bbox[1]), (bbox[2], bbox[3]), color, 2)
+            
+            # Draw label background
+            label = f"{class_name}: {confidence:.2f}"
+            label_width, label_height = self.label_size(label)
+            cv2.rectangle(result_image,
+                          (bbox[0], bbox[1] - label_height - 10),
+                          (bbox[0] + label_width, bbox[1]),
+                          color, -1)
+            
+            # Draw label text
+            cv2.putText(result_image, label, (bbox[0], bbox[1] - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, (255, 255, 255),
+                        self.thickness)
+        
+        return result_image
+
+
 class StreamlitSSDDetector:
-    """Simplified SSD detector for Streamlit UI"""
+    """Simplified SSD detector for Streamlit UI
     
-    def __init__(self, confidence_threshold=0.5):
+    Args:
+        confidence_threshold (float): minimum score to keep a detection
+        nms_threshold (float): IoU above which detect_tiled merges duplicates
+        model_url (str): TF Hub model for the default 'tfhub' backend
+        model_store (ModelStore): local store the 'tfhub' backend loads from
+        warmup (bool): run a dummy inference at the end of load_model
+        backend: backend name ('tfhub', 'tflite', 'onnx', 'opencv') or an
+            InferenceBackend instance, defaults to $SSD_BACKEND or 'tfhub'
+        backend_options (dict): keyword arguments for the named backend
+    
+    Cascade mode (see enable_cascade) runs a cheaper stage-one model first
+    and only sends uncertain or crowded images through this backend.
+    """
+    
+    def __init__(self, confidence_threshold=0.5, model_url=DEFAULT_MODEL_URL,
+                 model_store=None, warmup=True, backend=None, backend_options=None,
+                 nms_threshold=0.5):
         self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+        self.input_size = (300, 300)
+        self.warmup = warmup
+        if isinstance(backend, InferenceBackend):
+            self.backend = backend
+        else:
+            options = dict(backend_options or {})
+            if (backend or os.environ.get('SSD_BACKEND', 'tfhub')) == 'tfhub':
+                options.setdefault('model_url', model_url)
+                options.setdefault('model_store', model_store)
+            self.backend = create_backend(backend, **options)
         self.model = None
         self.model_loaded = False
+        self.load_stats = {}
         self.load_classes()
+        self.renderer = DetectionRenderer(self.class_names)
+        self.metrics = DetectorMetrics(self.class_names)
+        self.cascade = None
+        # Per-thread model input reused by run_raw
+        self._local = threading.local()
         print("🔄 Detector initialized. Call load_model() to load the AI model.")
         
     def load_model(self):
-        """Load pre-trained model"""
+        """Load pre-trained model through the configured backend"""
         try:
-            print("🔄 Loading SSD MobileNet model from TensorFlow Hub...")
-            model_url = "https://tfhub.dev/tensorflow/ssd_mobilenet_v2/2"
-            self.model = hub.load(model_url)
+            print(f"🔄 Loading SSD MobileNet model ({self.backend.name} backend)...")
+            start = time.perf_counter()
+            self.backend.load()
+            self.model = self.backend
+            self.load_stats = {'load_seconds': time.perf_counter() - start,
+                               'warmup_seconds': None}
             self.model_loaded = True
-            print("✅ Model loaded successfully")
+            print(f"✅ Model loaded in {self.load_stats['load_seconds']:.2f}s from {self.model_id}")
+            
+            if self.warmup:
+                self.warmup_model()
             return True
         except Exception as e:
             print(f"❌ Model loading failed: {e}")
+            self.metrics.record_error('load_model')
             self.model_loaded = False
             return False
     
+    def warmup_model(self):
+        """Run one dummy inference so tracing is not paid by the first real image"""
+        width, height = self.input_size
+        start = time.perf_counter()
+        # Straight to the backend so the one-off tracing cost stays out of the metrics
+        self.backend(np.zeros((1, height, width, 3), dtype=np.uint8))
+        self.load_stats['warmup_seconds'] = time.perf_counter() - start
+        print(f"🔥 Warm-up inference took {self.load_stats['warmup_seconds']:.2f}s")
+    
     def load_classes(self):
-        """Load COCO class names"""
-        self.class_names = [
-            'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus',
-            'train', 'truck', 'boat', 'traffic light', 'fire hydrant',
-            'stop sign', 'parking meter', 'bench', 'bird', 'cat', 'dog',
-            'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe',
-            'backpack', 'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee',
-            'skis', 'snowboard', 'sports ball', 'kite', 'baseball bat',
-            'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
-            'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl',
-            'banana', 'apple', 'sandwich', 'orange', 'broccoli', 'carrot',
-            'hot dog', 'pizza', 'donut', 'cake', 'chair', 'couch',
-            'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop',
-            'mouse', 'remote', 'keyboard', 'cell phone', 'microwave',
-            'oven', 'toaster', 'sink', 'refrigerator', 'book', 'clock',
-            'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush'
-        ]
-        print(f"📚 Loaded {len(self.class_names)} object classes")
+        """Load COCO class names, indexed by the category ids the model emits"""
+        self.class_names = list(COCO_LABELS)
+        print(f"📚 Loaded {len(COCO_CLASS_NAMES)} object classes")
     
-    def detect_objects(self, image):
+    def detect_objects(self, image, channel_order='bgr'):
         """Detect objects in image"""
         if not self.model_loaded:
             print("⚠️ Model not loaded. Call load_model() first.")
             return []
+        
+        return self.detect(image, channel_order).to_dicts()
+    
+    def detect(self, image, channel_order='bgr', confidence_threshold=None):
+        """Detect objects in image and return columnar Detections
+        
+        Args:
+            confidence_threshold (float): defaults to self.confidence_threshold
+        """
+        if not self.model_loaded:
+            print("⚠️ Model not loaded. Call load_model() first.")
+            return Detections.empty(self.class_names)
+        
+        with self.metrics.call('detect'):
+            try:
+                raw = self.run_raw(image, channel_order, confidence_threshold)
+                detections = self.decode_raw(raw, confidence_threshold)
+                self.metrics.record_detections(detections)
+                return detections
+            except Exception as e:
+                print(f"❌ Detection error: {e}")
+                self.metrics.record_error('detect')
+                return Detections.empty(self.class_names)
+    
+    def detect_tiled(self, image, tile_size=512, overlap=0.2, include_full_frame=True,
+                     channel_order='bgr', confidence_threshold=None, nms_threshold=None):
+        """Detect small objects in a large image by running overlapping tiles
+        
+        Every tile (plus, optionally, the whole downscaled frame for objects
+        larger than a tile) goes through the model as one batch. Boxes are
+        mapped back to image coordinates and duplicates from overlapping
+        tiles are merged with class-aware NMS.
+        
+        Args:
+            image: image in the same formats as detect_objects
+            tile_size (int): tile edge in original-image pixels
+            overlap (float): fraction of a tile shared with its neighbour
+            include_full_frame (bool): also run the full image once
+            channel_order (str): 'bgr' or 'rgb' for NumPy input
+            confidence_threshold (float): defaults to self.confidence_threshold
+            nms_threshold (float): defaults to self.nms_threshold
             
-        try:
-            # Preprocess image
-            if isinstance(image, np.ndarray):
-                if len(image.shape) == 3 and image.shape[2] == 3:
-                    # Convert BGR to RGB if needed
-                    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                else:
-                    image_rgb = image
-            else:
-                image_rgb = np.array(image)
+        Returns:
+            Detections: merged detections in full-image pixel coordinates
+        """
+        if not self.model_loaded:
+            print("⚠️ Model not loaded. Call load_model() first.")
+            return Detections.empty(self.class_names)
+        
+        if nms_threshold is None:
+            nms_threshold = self.nms_threshold
+        
+        if confidence_threshold is None:
+            confidence_threshold = self.confidence_threshold
+        
+        with self.metrics.call('detect_tiled'):
+            try:
+                if not isinstance(image, np.ndarray):
+                    image = np.array(image)
+                    channel_order = 'rgb'
+                height, width = image.shape[:2]
+                windows = tile_grid(height, width, tile_size, overlap)
+                if len(windows) == 1:
+                    # The image fits in one tile: run it once as the full frame
+                    windows = windows[:0]
+                    include_full_frame = True
+                
+                input_width, input_height = self.input_size
+                num_inputs = len(windows) + int(include_full_frame)
+                batch = np.empty((num_inputs, input_height, input_width, 3), dtype=np.uint8)
+                sizes = [self.preprocess_into(image[y1:y2, x1:x2], batch[i], channel_order)
+                         for i, (x1, y1, x2, y2) in enumerate(windows.tolist())]
+                offsets = windows[:, :2]
+                if include_full_frame:
+                    sizes.append(self.preprocess_into(image, batch[-1], channel_order))
+                    offsets = np.vstack([offsets, [[0, 0]]])
+                
+                outputs = self._run_model(batch, confidence_threshold)
+                start = time.perf_counter()
+                results = decode_detections(outputs['detection_boxes'], outputs['detection_classes'],
+                                            outputs['detection_scores'], sizes, self.class_names,
+                                            confidence_threshold)
+                boxes = np.concatenate([detections.boxes + np.tile(offset, 2)
+                                        for detections, offset in zip(results, offsets)])
+                scores = np.concatenate([detections.scores for detections in results])
+                class_ids = np.concatenate([detections.class_ids for detections in results])
                 
-            # Resize to model input size
-            image_resized = cv2.resize(image_rgb, (300, 300))
-            input_tensor = tf.convert_to_tensor(np.expand_dims(image_resized, axis=0), dtype=tf.uint8)
+                keep = non_max_suppression(boxes, scores, class_ids, nms_threshold)
+                merged = Detections(boxes[keep].astype(np.int32), scores[keep], class_ids[keep],
+                                    self.class_names)
+                self.metrics.record('postprocess', time.perf_counter() - start)
+                self.metrics.record_detections(merged)
+                return merged
+            except Exception as e:
+                print(f"❌ Tiled detection error: {e}")
+                self.metrics.record_error('detect_tiled')
+                return Detections.empty(self.class_names)
+    
+    def enable_cascade(self, backend, backend_options=None, input_size=None,
+                       uncertain_band=(0.25, 0.6), max_detections=10, audit_every=0):
+        """Run a cheap stage-one model first and escalate only uncertain images
+        
+        Every model call (detect, batches, tiles, the result cache) goes
+        through the cascade. An image is escalated to this detector's own
+        backend when a stage-one score falls in uncertain_band or more than
+        max_detections stage-one scores reach its upper edge. The band must
+        bracket confidence_threshold, otherwise stage-one scores on the wrong
+        side of the threshold would be accepted without the full model.
+        Calls with a lower per-call threshold also escalate stage-one scores
+        between that threshold and the band.
+        
+        Args:
+            backend: stage-one backend name (e.g. 'tflite' with a quantized
+                model) or an InferenceBackend instance
+            backend_options (dict): keyword arguments for a named backend
+            input_size (tuple): stage-one input (width, height) for models
+                exported at a lower resolution
+            uncertain_band (tuple): [low, high) stage-one scores that escalate
+            max_detections (int): confident detections before escalating
+            audit_every (int): also run every Nth accepted image in full to
+                measure agreement (cascade.stats), 0 to disable
             
-            # Run detection
-            detections = self.model(input_tensor)
+        Returns:
+            bool: True if the stage-one model loaded
+        """
+        low, high = uncertain_band
+        if not low <= self.confidence_threshold < high:
+            print(f"❌ Cascade band [{low}, {high}) must contain the confidence threshold "
+                  f"{self.confidence_threshold}")
+            self.metrics.record_error('enable_cascade')
+            return False
+        try:
+            cascade = ModelCascade(backend, backend_options, input_size, uncertain_band,
+                                   max_detections, audit_every)
+            cascade.load()
+            width, height = cascade.input_size or self.input_size
+            cascade.backend(np.zeros((1, height, width, 3), dtype=np.uint8))
+        except Exception as e:
+            print(f"❌ Cascade stage-one model failed to load: {e}")
+            self.metrics.record_error('enable_cascade')
+            return False
+        self.cascade = cascade
+        print(f"✅ Cascade enabled: {cascade.backend.name} first, escalating scores in "
+              f"[{uncertain_band[0]}, {uncertain_band[1]})")
+        return True
+    
+    def disable_cascade(self):
+        """Send every image through the full model again"""
+        self.cascade = None
+    
+    @property
+    def model_id(self):
+        """Identifies the model whose outputs a result came from"""
+        if self.cascade is not None:
+            return f"{self.backend.model_id}+cascade:{self.cascade.model_id}"
+        return self.backend.model_id
+    
+    @property
+    def supports_batching(self):
+        """Whether the backend runs a whole batch in one model call"""
+        return self.backend.supports_batching
+    
+    def run_raw(self, image, channel_order='bgr', confidence_threshold=None):
+        """Run the model on one image and keep its unthresholded outputs
+        
+        In cascade mode the outputs are only complete at or above the
+        threshold they were escalated for, recorded as 'min_threshold'.
+        
+        Args:
+            confidence_threshold (float): lowest threshold the outputs will be
+                decoded at; defaults to self.confidence_threshold
             
-            # Process results
+        Returns:
+            dict: the OUTPUT_KEYS arrays (batch of one) plus the original
+                'size' and 'min_threshold' (None when any threshold is fine)
+        """
+        with self.metrics.call('run_raw'):
+            batch = getattr(self._local, 'input', None)
+            if batch is None:
+                width, height = self.input_size
+                batch = self._local.input = np.empty((1, height, width, 3), dtype=np.uint8)
+            size = self.preprocess_into(image, batch[0], channel_order)
+            if confidence_threshold is None:
+                confidence_threshold = self.confidence_threshold
+            raw = self._run_model(batch, confidence_threshold)
+            raw['size'] = size
+            raw['min_threshold'] = confidence_threshold if self.cascade is not None else None
+            return raw
+    
+    def decode_raw(self, raw, confidence_threshold=None):
+        """Threshold and scale outputs from run_raw into Detections
+        
+        Cached outputs are decoded again at every threshold, so this does not
+        count images; callers record detections once per model run.
+        """
+        return self._decode_batch(raw, [raw['size']], confidence_threshold)[0]
+    
+    def detect_batch(self, images, batch_size=8, columnar=False):
+        """Detect objects in many images, running the model once per batch
+        
+        Args:
+            images: list or iterator of images (same formats as detect_objects)
+            batch_size (int): number of images pushed through the model per call
+            columnar (bool): return Detections objects instead of dict lists
+            
+        Returns:
+            list: one result per input image, in input order; images that
+                cannot be preprocessed get an empty result
+        """
+        if not self.model_loaded:
+            print("⚠️ Model not loaded. Call load_model() first.")
+            return []
+        
+        with self.metrics.call('detect_batch'):
+            width, height = self.input_size
+            batch = np.empty((batch_size, height, width, 3), dtype=np.uint8)
+            sizes = []
+            positions = []
             results = []
-            boxes = detections['detection_boxes'][0].numpy()
-            classes = detections['detection_classes'][0].numpy().astype(int)
-            scores = detections['detection_scores'][0].numpy()
             
-            height, width = image_rgb.shape[:2]
+            def run_pending():
+                for position, detections in zip(positions, self.infer_batch(batch[:len(sizes)],
+                                                                            sizes)):
+                    results[position] = detections
+                sizes.clear()
+                positions.clear()
             
-            for i in range(len(scores)):
-                if scores[i] > self.confidence_threshold:
-                    class_id = classes[i]
-                    if 1 <= class_id <= len(self.class_names):
-                        class_name = self.class_names[class_id - 1]
-                        
-                        # Convert normalized coordinates to pixel coordinates
-                        y1, x1, y2, x2 = boxes[i]
-                        x1 = int(max(0, min(x1 * width, width-1)))
-                        y1 = int(max(0, min(y1 * height, height-1)))
-                        x2 = int(max(0, min(x2 * width, width-1)))
-                        y2 = int(max(0, min(y2 * height, height-1)))
-                        
-                        results.append({
-                            'class_name': class_name,
-                            'confidence': float(scores[i]),
-                            'bbox': [x1, y1, x2, y2]
-                        })
+            for image in images:
+                # An unreadable image gets an empty result instead of failing the batch
+                results.append(Detections.empty(self.class_names))
+                try:
+                    sizes.append(self.preprocess_into(image, batch[len(sizes)]))
+                except Exception as e:
+                    print(f"❌ Could not preprocess image {len(results) - 1}: {e}")
+                    self.metrics.record_error('detect_batch')
+                    continue
+                positions.append(len(results) - 1)
+                if len(sizes) == batch_size:
+                    run_pending()
             
+            if sizes:
+                run_pending()
+        
+        if columnar:
             return results
-            
-        except Exception as e:
-            print(f"❌ Detection error: {e}")
-            return []
+        return [detections.to_dicts() for detections in results]
     
-    def draw_detections(self, image, detections):
-        """Draw bounding boxes on image"""
-        result_image = image.copy()
+    def preprocess_into(self, image, out, channel_order='bgr'):
+        """Resize an image into a preallocated RGB model-input slot
         
-        # Generate colors for classes
-        np.random.seed(42)
-        colors = {}
+        Returns the (height, width) of the original image.
+        """
+        start = time.perf_counter()
+        size = preprocess_into(image, out, channel_order)
+        self.metrics.record('preprocess', time.perf_counter() - start)
+        return size
+    
+    def infer_batch(self, batch, sizes, confidence_threshold=None, raise_errors=False):
+        """Run the model on a preprocessed batch and decode its outputs
         
-        for detection in detections:
-            bbox = detection['bbox']
-            class_name = detection['class_name']
-            confidence = detection['confidence']
+        Args:
+            batch (np.ndarray): (N, H, W, 3) uint8 RGB model inputs
+            sizes: N original (height, width) pairs used to scale the boxes
+            confidence_threshold (float): defaults to self.confidence_threshold
+            raise_errors (bool): re-raise model errors instead of returning
+                empty results, for callers that report failures per request
             
-            # Get or generate color for this class
-            if class_name not in colors:
-                colors[class_name] = tuple(map(int, np.random.randint(0, 255, 3)))
-            color = colors[class_name]
-            
-            # Draw bounding box
-            cv2.rectangle(result_image, (bbox[0], bbox[1]), (bbox[2], bbox[3]), color, 2)
-            
-            # Draw label background
-            label = f"{class_name}: {confidence:.2f}"
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-            cv2.rectangle(result_image, 
-                         (bbox[0], bbox[1] - label_size[1] - 10),
-                         (bbox[0] + label_size[0], bbox[1]), 
-                         color, -1)
-            
-            # Draw label text
-            cv2.putText(result_image, label, (bbox[0], bbox[1] - 5),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+        Returns:
+            list: one Detections object per image
+        """
+        if confidence_threshold is None:
+            confidence_threshold = self.confidence_threshold
+        with self.metrics.call('infer_batch'):
+            try:
+                outputs = self._run_model(batch, confidence_threshold)
+                results = self._decode_batch(outputs, sizes, confidence_threshold)
+            except Exception as e:
+                print(f"❌ Batch detection error: {e}")
+                self.metrics.record_error('infer_batch')
+                if raise_errors:
+                    raise
+                return [Detections.empty(self.class_names) for _ in sizes]
+            for detections in results:
+                self.metrics.record_detections(detections)
+            return results
+    
+    def _run_model(self, batch, confidence_threshold=None):
+        """Run the model on a (N, H, W, 3) uint8 batch and return NumPy outputs
+        
+        confidence_threshold is the lowest threshold the outputs will be
+        decoded at, which decides what the cascade escalates.
+        """
+        if confidence_threshold is None:
+            confidence_threshold = self.confidence_threshold
+        start = time.perf_counter()
+        cascade = self.cascade
+        if cascade is not None:
+            outputs = cascade.run(self.backend, batch, confidence_threshold)
+        else:
+            outputs = self.backend(batch)
+        self.metrics.record('inference', time.perf_counter() - start)
+        return outputs
+    
+    def _decode_batch(self, outputs, sizes, confidence_threshold=None):
+        """Turn raw SSD outputs for a batch into per-image Detections"""
+        if confidence_threshold is None:
+            confidence_threshold = self.confidence_threshold
+        start = time.perf_counter()
+        results = decode_detections(outputs['detection_boxes'], outputs['detection_classes'],
+                                    outputs['detection_scores'], sizes, self.class_names,
+                                    confidence_threshold)
+        self.metrics.record('postprocess', time.perf_counter() - start)
+        return results
+    
+    def draw_detections(self, image, detections, inplace=False, channel_order='bgr'):
+        """Draw bounding boxes on image
         
+        Args:
+            image (np.ndarray): image to annotate
+            detections: Detections or the list of dicts from detect_objects
+            inplace (bool): draw on image itself instead of a copy
+            channel_order (str): 'bgr' or 'rgb', so RGB frames need no conversion
+        """
+        start = time.perf_counter()
+        result_image = self.renderer.draw(image, detections, inplace, channel_order)
+        self.metrics.record('draw', time.perf_counter() - start)
         return result_image
 
 # Test function for verification
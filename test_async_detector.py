@@ -0,0 +1,88 @@
+# test_async_detector.py - asyncio detection with shared batches, timeouts and cancellation
+import asyncio
+
+import numpy as np
+import pytest
+
+from async_detector import AsyncSSDDetector
+from detector_backends import StubBackend
+
+
+def image(seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+
+
+def test_concurrent_awaiters_share_a_batch(make_detector):
+    stub = make_detector(num_detections=3)
+
+    async def main():
+        async with AsyncSSDDetector(stub, max_batch_size=8, max_wait_ms=50) as detector:
+            results = await asyncio.gather(*(detector.detect(image(i)) for i in range(8)))
+            return results, detector.batches
+
+    results, batches = asyncio.run(main())
+    assert [len(detections) for detections in results] == [3] * 8
+    assert batches == 1
+
+
+def test_timeout_and_cancellation_skip_the_model(make_detector):
+    stub = make_detector(num_detections=3, latency_ms=200)
+
+    async def main():
+        async with AsyncSSDDetector(stub, max_batch_size=1, max_wait_ms=0) as detector:
+            # Occupies the only executor slot for 200 ms
+            first = asyncio.ensure_future(detector.detect(image()))
+            await asyncio.sleep(0.01)
+            with pytest.raises(asyncio.TimeoutError):
+                await detector.detect(image(), timeout=0.05)
+            queued = asyncio.ensure_future(detector.detect(image()))
+            await asyncio.sleep(0.01)
+            queued.cancel()
+            await first
+            await asyncio.sleep(0.05)
+            return detector.images, detector.cancelled
+
+    images, cancelled = asyncio.run(main())
+    assert images == 1
+    assert cancelled == 2
+
+
+def test_stream_preserves_order_and_threshold(make_detector):
+    sizes = [(120, 160 + 20 * i) for i in range(20)]
+
+    async def frames():
+        for height, width in sizes:
+            yield np.zeros((height, width, 3), dtype=np.uint8)
+
+    stub = make_detector(num_detections=3)
+
+    async def main():
+        async with AsyncSSDDetector(stub, max_batch_size=4) as detector:
+            results = [detections async for detections in detector.stream(frames())]
+            strict = [detections async for detections in detector.stream(frames(), 0.95)]
+            return results, strict
+
+    results, strict = asyncio.run(main())
+    reference = make_detector(num_detections=3)
+    for (height, width), detections in zip(sizes, results):
+        expected = reference.detect(np.zeros((height, width, 3), dtype=np.uint8))
+        np.testing.assert_array_equal(detections.boxes, expected.boxes)
+    assert all(len(detections) == 0 for detections in strict)
+
+
+class FailingBackend(StubBackend):
+    def predict(self, batch):
+        raise RuntimeError("model exploded")
+
+
+def test_model_and_preprocess_errors_reach_each_awaiter(make_detector):
+    async def main():
+        detector = make_detector(FailingBackend())
+        async with AsyncSSDDetector(detector, max_batch_size=4, max_wait_ms=50) as detector:
+            inputs = [image(0), np.zeros((0, 0, 3), dtype=np.uint8), image(1)]
+            return await asyncio.gather(*(detector.detect(i) for i in inputs),
+                                        return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [str(result) for result in results[::2]] == ["model exploded"] * 2
+    assert isinstance(results[1], Exception) and str(results[1]) != "model exploded"
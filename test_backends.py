@@ -0,0 +1,102 @@
+# test_backends.py - Backend selection and cross-backend parity
+#
+# Parity tests need the converted models; point these variables at them:
+#   SSD_TFLITE_MODEL, SSD_ONNX_MODEL, SSD_OPENCV_MODEL + SSD_OPENCV_CONFIG
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from detector_backends import (BACKENDS, OpenCVDNNBackend, TFHubBackend, TFLiteBackend,
+                               compare_backends, create_backend)
+from streamlit_detector import StreamlitSSDDetector
+
+SAMPLE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_images")
+
+
+def parity_images():
+    images = []
+    if os.path.isdir(SAMPLE_FOLDER):
+        for name in sorted(os.listdir(SAMPLE_FOLDER)):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                images.append(cv2.imread(os.path.join(SAMPLE_FOLDER, name)))
+    if not images:
+        pytest.skip("No images in sample_images/ to compare backends on")
+    return images
+
+
+def backend_under_test(name):
+    """Build a candidate backend from environment variables, or skip"""
+    if name == 'tflite':
+        path = os.environ.get('SSD_TFLITE_MODEL')
+        return TFLiteBackend(path) if path else None
+    if name == 'onnx':
+        path = os.environ.get('SSD_ONNX_MODEL')
+        return create_backend('onnx', model_path=path) if path else None
+    if name == 'opencv':
+        path = os.environ.get('SSD_OPENCV_MODEL')
+        config = os.environ.get('SSD_OPENCV_CONFIG')
+        return OpenCVDNNBackend(path, config) if path and config else None
+    return None
+
+
+def test_create_backend_by_name():
+    backend = create_backend('tflite', model_path='model.tflite', num_threads=2)
+    assert isinstance(backend, TFLiteBackend)
+    assert backend.num_threads == 2
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        create_backend('caffe')
+
+
+def test_backend_selected_from_environment(monkeypatch):
+    monkeypatch.setenv('SSD_BACKEND', 'opencv')
+    detector = StreamlitSSDDetector(backend_options={'model_path': 'graph.pb',
+                                                     'config_path': 'graph.pbtxt'})
+    assert isinstance(detector.backend, OpenCVDNNBackend)
+
+
+def test_default_backend_is_tfhub(monkeypatch):
+    monkeypatch.delenv('SSD_BACKEND', raising=False)
+    detector = StreamlitSSDDetector()
+    assert isinstance(detector.backend, TFHubBackend)
+
+
+def test_opencv_backend_output_layout():
+    backend = OpenCVDNNBackend('graph.pb', 'graph.pbtxt', max_detections=5)
+
+    class FakeNet:
+        def setInput(self, blob):
+            self.batch = blob.shape[0]
+
+        def forward(self):
+            return np.array([[[[1, 3, 0.6, 0.1, 0.2, 0.3, 0.4],
+                               [0, 1, 0.9, 0.5, 0.5, 0.9, 0.8]]]], dtype=np.float32)
+
+    backend.net = FakeNet()
+    outputs = backend(np.zeros((2, 300, 300, 3), dtype=np.uint8))
+
+    assert outputs['detection_boxes'].shape == (2, 5, 4)
+    np.testing.assert_allclose(outputs['detection_boxes'][0, 0], [0.5, 0.5, 0.8, 0.9])
+    np.testing.assert_allclose(outputs['detection_boxes'][1, 0], [0.2, 0.1, 0.4, 0.3])
+    assert outputs['detection_classes'][1, 0] == 3
+    assert outputs['detection_scores'][0, 1] == 0
+
+
+@pytest.mark.parametrize('name', sorted(set(BACKENDS) - {'tfhub', 'stub'}))
+def test_backend_parity_with_tfhub(name):
+    candidate_backend = backend_under_test(name)
+    if candidate_backend is None:
+        pytest.skip(f"No {name} model configured")
+    images = parity_images()
+
+    reference = StreamlitSSDDetector(backend='tfhub', warmup=False)
+    candidate = StreamlitSSDDetector(backend=candidate_backend, warmup=False)
+    if not (reference.load_model() and candidate.load_model()):
+        pytest.skip(f"Could not load tfhub and {name} backends")
+
+    report = compare_backends(reference, candidate, images, atol=0.02)
+    assert report['agree'], report
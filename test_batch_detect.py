@@ -0,0 +1,83 @@
+# test_batch_detect.py - Resumable folder detection and COCO results output
+import json
+
+import cv2
+import numpy as np
+
+from batch_detect import (Checkpoint, CocoResultsWriter, JsonLinesWriter, iter_image_paths,
+                          run_batch)
+
+
+def make_images(folder, count):
+    folder.mkdir()
+    for i in range(count):
+        cv2.imwrite(str(folder / f'{i:012d}.jpg'), np.full((120, 160, 3), i * 20, dtype=np.uint8))
+    return str(folder)
+
+
+def run(detector, folder, writer, checkpoint_path):
+    checkpoint = Checkpoint(checkpoint_path)
+    try:
+        return run_batch(detector, iter_image_paths([folder]), writer, checkpoint,
+                         batch_size=2, workers=2)
+    finally:
+        writer.close()
+        checkpoint.close()
+
+
+def test_resume_skips_processed_files(tmp_path, make_detector):
+    folder = make_images(tmp_path / 'images', 5)
+    paths = list(iter_image_paths([folder]))
+    output, checkpoint_path = str(tmp_path / 'out.jsonl'), str(tmp_path / 'out.jsonl.done')
+    detector = make_detector(num_detections=3)
+
+    # An earlier run finished the first two files before it was interrupted
+    with open(checkpoint_path, 'w') as f:
+        f.writelines(f"{path}\n" for path in paths[:2])
+
+    # ... and was killed half-way through writing the third file's record
+    with open(output, 'w') as f:
+        f.write('{"image": "' + paths[2])
+    with open(checkpoint_path, 'a') as f:
+        f.write(paths[2][:5])
+
+    resumed = run(detector, folder, JsonLinesWriter(output), checkpoint_path)
+    assert (resumed['processed'], resumed['skipped']) == (3, 2)
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    assert [record['image'] for record in records] == paths[2:]
+    assert all(len(record['detections']) == 3 for record in records)
+
+    again = run(detector, folder, JsonLinesWriter(output), checkpoint_path)
+    assert (again['processed'], again['skipped']) == (0, 5)
+
+
+def test_coco_results_are_a_valid_json_array(tmp_path, make_detector):
+    folder = make_images(tmp_path / 'images', 3)
+    (tmp_path / 'images' / 'broken.jpg').write_bytes(b'not an image')
+    output = str(tmp_path / 'results.json')
+    detector = make_detector(num_detections=3)
+
+    stats = run(detector, folder, CocoResultsWriter(output), output + '.done')
+    assert (stats['processed'], stats['failed']) == (3, 1)
+    with open(output) as f:
+        results = json.load(f)
+
+    assert len(results) == 9
+    assert {result['image_id'] for result in results} == {0, 1, 2}
+    expected = detector.detect(np.zeros((120, 160, 3), dtype=np.uint8))
+    first = [result for result in results if result['image_id'] == 0]
+    assert [result['category_id'] for result in first] == expected.class_ids.tolist()
+    x1, y1, x2, y2 = expected.boxes[0].tolist()
+    assert first[0]['bbox'] == [x1, y1, x2 - x1, y2 - y1]
+    assert all(set(result) == {'image_id', 'category_id', 'bbox', 'score'} for result in results)
+
+    # Nothing new to do: finalizing again still yields the same complete array
+    run(detector, folder, CocoResultsWriter(output), output + '.done')
+    with open(output) as f:
+        assert json.load(f) == results
+
+    empty = CocoResultsWriter(str(tmp_path / 'empty.json'))
+    empty.close()
+    with open(tmp_path / 'empty.json') as f:
+        assert json.load(f) == []
@@ -0,0 +1,102 @@
+# test_cascade.py - Stage-one model with escalation of uncertain images
+import numpy as np
+import pytest
+
+from detector_backends import InferenceBackend
+from model_cascade import escalation_mask, evaluate_cascade
+from result_cache import DetectionCache
+
+
+class BrightnessBackend(InferenceBackend):
+    """One centred 'person' per image, scored by mean brightness / 255"""
+
+    name = 'brightness'
+    supports_batching = True
+    model_id = 'brightness'
+
+    def load(self):
+        pass
+
+    def predict(self, batch):
+        count = len(batch)
+        scores = batch.reshape(count, -1).mean(axis=1) / 255
+        return {'detection_boxes': np.tile([[[0.25, 0.25, 0.75, 0.75]]], (count, 1, 1)),
+                'detection_classes': np.ones((count, 1), dtype=np.float32),
+                'detection_scores': scores[:, None].astype(np.float32)}
+
+
+@pytest.fixture
+def cascade_detector(make_detector):
+    detector = make_detector(num_detections=3)
+    assert detector.enable_cascade(BrightnessBackend(), uncertain_band=(0.25, 0.6))
+    return detector
+
+
+def test_escalation_mask():
+    scores = np.array([[0.05, 0.01], [0.4, 0.05], [0.9, 0.05], [0.9, 0.9]])
+    assert escalation_mask(scores, (0.25, 0.6), max_detections=1).tolist() == \
+        [False, True, False, True]
+    # A threshold below the band escalates the scores it would keep
+    assert escalation_mask(scores, (0.25, 0.6), max_detections=1,
+                           confidence_threshold=0.005).tolist() == [True, True, True, True]
+
+
+def test_only_uncertain_images_reach_the_full_model(cascade_detector):
+    detector = cascade_detector
+    plain_id = detector.backend.model_id
+    assert detector.model_id != plain_id
+
+    # Empty (accepted), uncertain (escalated) and confident (accepted) frames
+    images = [np.full((120, 160, 3), value, dtype=np.uint8) for value in (10, 100, 240)]
+    results = detector.detect_batch(images, columnar=True)
+    assert [len(r) for r in results] == [0, 3, 1]
+    assert results[2].class_ids.tolist() == [1]
+
+    stats = detector.cascade.stats.snapshot()
+    assert stats['images'] == 3 and stats['escalated'] == 1
+    assert abs(stats['escalation_rate'] - 1 / 3) < 1e-9
+
+    detector.disable_cascade()
+    assert detector.model_id == plain_id
+    assert len(detector.detect(images[0])) == 3
+
+
+def test_per_call_threshold_below_the_band_escalates(cascade_detector):
+    detector = cascade_detector
+    low, _ = detector.cascade.uncertain_band
+    # Stage one scores this frame 0.2: below the band, above the call's threshold
+    image = np.full((120, 160, 3), 51, dtype=np.uint8)
+    assert len(detector.detect(image)) == 0
+    assert detector.cascade.stats.escalated == 0
+
+    assert len(detector.detect(image, confidence_threshold=low - 0.1)) == 3
+    assert len(detector.detect_tiled(image, confidence_threshold=low - 0.1)) == 3
+    assert detector.cascade.stats.escalated == 2
+
+    # Outputs cached at the default threshold are re-run for a looser one
+    cache = DetectionCache()
+    assert len(cache.detect(detector, b'frame', lambda: image)[0]) == 0
+    detections, hit = cache.detect(detector, b'frame', lambda: image, low - 0.1)
+    assert not hit and len(detections) == 3
+    assert cache.detect(detector, b'frame', lambda: image, 0.5)[1]
+
+
+def test_audit_and_offline_agreement(cascade_detector):
+    detector = cascade_detector
+    detector.cascade.audit_every = 1
+    images = [np.full((120, 160, 3), value, dtype=np.uint8) for value in (10, 240)]
+    detector.detect_batch(images, columnar=True)
+    stats = detector.cascade.stats.snapshot()
+    # Stage one finds 0 + 1 boxes where the full model finds 3 + 3
+    assert stats['audited'] == 2 and stats['agreement'] < 0.5
+
+    report = evaluate_cascade(detector, images)
+    assert report['images'] == 2 and report['escalation_rate'] == 0.0
+    assert report['agreement'] < 0.5
+
+
+def test_band_must_bracket_the_threshold(make_detector):
+    detector = make_detector(num_detections=3, confidence_threshold=0.7)
+    assert not detector.enable_cascade(BrightnessBackend(), uncertain_band=(0.25, 0.6))
+    assert detector.cascade is None
+    assert detector.enable_cascade(BrightnessBackend(), uncertain_band=(0.5, 0.8))
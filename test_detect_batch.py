@@ -0,0 +1,14 @@
+# test_detect_batch.py - Batched detection keeps going past unreadable images
+import numpy as np
+
+
+def test_bad_image_in_the_middle_of_a_batch(make_detector):
+    detector = make_detector(num_detections=3)
+    good = np.zeros((120, 160, 3), dtype=np.uint8)
+    images = [good, good, np.zeros((0, 0, 3), dtype=np.uint8), None, good, good, good]
+
+    results = detector.detect_batch(images, batch_size=3, columnar=True)
+    assert [len(detections) for detections in results] == [3, 3, 0, 0, 3, 3, 3]
+    np.testing.assert_array_equal(results[4].boxes, detector.detect(good).boxes)
+    assert detector.metrics.snapshot()['errors'] == {'detect_batch': 2}
+    assert detector.detect_batch([None], columnar=False) == [[]]
@@ -0,0 +1,177 @@
+# test_detection_eval.py - Vectorized COCO evaluation against a direct port of pycocotools
+import json
+
+import numpy as np
+import pytest
+
+from detection_eval import (AREA_RANGES, COCO_CATEGORY_NAMES, IOU_THRESHOLDS, RECALL_THRESHOLDS,
+                            DetectionEvaluator, GroundTruth, load_results)
+
+
+def reference_ap(gt, dets, categories, max_det=100):
+    """Per-detection loops of pycocotools' evaluateImg/accumulate for area 'all'"""
+    precisions = []
+    for category in categories:
+        scores, matched, ignored, npig = [], [], [], 0
+        for image_id, image_gt in gt.items():
+            rows = image_gt['class_ids'] == category
+            g_boxes, g_crowd = image_gt['boxes'][rows], image_gt['ignore'][rows]
+            g_order = np.argsort(g_crowd, kind='mergesort')
+            g_boxes, g_crowd = g_boxes[g_order], g_crowd[g_order]
+            boxes, det_scores, class_ids = dets.get(image_id, (np.zeros((0, 4)), [], []))
+            d_rows = np.asarray(class_ids) == category
+            d_boxes = boxes[d_rows]
+            d_scores = np.asarray(det_scores)[d_rows]
+            d_order = np.argsort(-d_scores, kind='mergesort')[:max_det]
+            d_boxes, d_scores = d_boxes[d_order], d_scores[d_order]
+            npig += int((~g_crowd).sum())
+            dtm = np.zeros((len(IOU_THRESHOLDS), len(d_boxes)))
+            dtig = np.zeros((len(IOU_THRESHOLDS), len(d_boxes)))
+            gtm = np.zeros((len(IOU_THRESHOLDS), len(g_boxes)))
+            for t, threshold in enumerate(IOU_THRESHOLDS):
+                for d, box in enumerate(d_boxes):
+                    best, m = min(threshold, 1 - 1e-10), -1
+                    for g, g_box in enumerate(g_boxes):
+                        if gtm[t, g] and not g_crowd[g]:
+                            continue
+                        if m > -1 and not g_crowd[m] and g_crowd[g]:
+                            break
+                        iw = min(box[2], g_box[2]) - max(box[0], g_box[0])
+                        ih = min(box[3], g_box[3]) - max(box[1], g_box[1])
+                        inter = max(iw, 0) * max(ih, 0)
+                        d_area = (box[2] - box[0]) * (box[3] - box[1])
+                        g_area = (g_box[2] - g_box[0]) * (g_box[3] - g_box[1])
+                        iou = inter / (d_area if g_crowd[g] else d_area + g_area - inter)
+                        if iou < best:
+                            continue
+                        best, m = iou, g
+                    if m > -1:
+                        dtig[t, d] = g_crowd[m]
+                        dtm[t, d] = 1
+                        gtm[t, m] = 1
+            scores.extend(d_scores)
+            matched.append(dtm)
+            ignored.append(dtig)
+        if npig == 0:
+            continue
+        order = np.argsort(-np.array(scores), kind='mergesort')
+        dtm = np.concatenate(matched, axis=1)[:, order]
+        dtig = np.concatenate(ignored, axis=1)[:, order]
+        tps = np.cumsum(np.logical_and(dtm, ~dtig.astype(bool)), axis=1).astype(float)
+        fps = np.cumsum(np.logical_and(~dtm.astype(bool), ~dtig.astype(bool)), axis=1).astype(float)
+        for tp, fp in zip(tps, fps):
+            rc = tp / npig
+            pr = list(tp / (fp + tp + np.spacing(1)))
+            for i in range(len(pr) - 1, 0, -1):
+                if pr[i] > pr[i - 1]:
+                    pr[i - 1] = pr[i]
+            q = np.zeros(len(RECALL_THRESHOLDS))
+            for ri, pi in enumerate(np.searchsorted(rc, RECALL_THRESHOLDS, side='left')):
+                if pi < len(pr):
+                    q[ri] = pr[pi]
+            precisions.append(q)
+    return float(np.mean(precisions))
+
+
+def random_dataset(num_images=30, seed=0):
+    rng = np.random.default_rng(seed)
+    gt, dets = {}, {}
+    for image_id in range(num_images):
+        count = rng.integers(0, 8)
+        corners = rng.uniform(0, 400, (count, 2))
+        sizes = rng.uniform(10, 200, (count, 2))
+        boxes = np.hstack([corners, corners + sizes])
+        class_ids = rng.integers(1, 4, count)
+        crowd = rng.random(count) < 0.1
+        gt[image_id] = {'boxes': boxes, 'class_ids': class_ids,
+                        'areas': np.prod(sizes, axis=1), 'ignore': crowd}
+        # Jittered copies of the ground truth plus random false positives
+        jitter = boxes + rng.normal(0, 8, boxes.shape)
+        jitter = np.hstack([np.minimum(jitter[:, :2], jitter[:, 2:]),
+                            np.maximum(jitter[:, :2], jitter[:, 2:])])
+        extra = rng.integers(0, 5)
+        extra_corners = rng.uniform(0, 400, (extra, 2))
+        false_boxes = np.hstack([extra_corners, extra_corners + rng.uniform(10, 150, (extra, 2))])
+        det_boxes = np.vstack([jitter, false_boxes])
+        det_classes = np.concatenate([np.where(rng.random(count) < 0.9, class_ids, 1),
+                                      rng.integers(1, 4, extra)])
+        dets[image_id] = (det_boxes, rng.random(len(det_boxes)), det_classes)
+    return gt, dets
+
+
+def test_matches_pycocotools_reference():
+    gt, dets = random_dataset()
+    evaluator = DetectionEvaluator(GroundTruth(gt))
+    for image_id, (boxes, scores, class_ids) in dets.items():
+        evaluator.add(image_id, boxes=boxes, scores=scores, class_ids=class_ids)
+
+    stats = evaluator.summarize()
+    assert abs(stats['AP'] - reference_ap(gt, dets, [1, 2, 3])) < 1e-9
+    assert 0 < stats['AP75'] < stats['AP50'] <= 1
+
+
+def test_incremental_and_parallel_give_the_same_result():
+    gt, dets = random_dataset(seed=1)
+    evaluator = DetectionEvaluator(GroundTruth(gt))
+    for image_id in list(dets)[:10]:
+        boxes, scores, class_ids = dets[image_id]
+        evaluator.add(image_id, boxes=boxes, scores=scores, class_ids=class_ids)
+    partial = evaluator.summarize()
+    assert partial['images'] == 10
+
+    for image_id in list(dets)[10:]:
+        boxes, scores, class_ids = dets[image_id]
+        evaluator.add(image_id, boxes=boxes, scores=scores, class_ids=class_ids)
+    serial = evaluator.summarize()
+    parallel = evaluator.summarize(workers=3)
+    assert serial == parallel
+    assert serial['images'] == len(dets)
+
+
+def test_perfect_detections_score_one():
+    gt = {0: {'boxes': np.array([[0, 0, 50, 50], [100, 100, 300, 300.]]),
+              'class_ids': np.array([1, 2]), 'areas': np.array([2500, 40000.]),
+              'ignore': np.array([False, False])}}
+    evaluator = DetectionEvaluator(GroundTruth(gt))
+    evaluator.add(0, boxes=gt[0]['boxes'], scores=[0.9, 0.8], class_ids=[1, 2])
+    stats = evaluator.summarize()
+    assert abs(stats['AP'] - 1) < 1e-9 and stats['AR100'] == 1.0
+    assert stats['APs'] == -1.0 and len(AREA_RANGES) == 4
+
+
+VOC_OBJECT = """<object><name>{name}</name><difficult>0</difficult><bndbox>
+<xmin>{box[0]}</xmin><ymin>{box[1]}</ymin><xmax>{box[2]}</xmax><ymax>{box[3]}</ymax>
+</bndbox></object>"""
+
+
+def test_voc_classes_use_detector_category_ids(tmp_path):
+    # VOC names map onto COCO category ids with gaps: bird 16, dog 18, tv 72
+    objects = {'bird': [10, 10, 110, 90], 'dog': [150, 40, 300, 200],
+               'tvmonitor': [320, 20, 460, 140], 'person': [20, 150, 90, 300]}
+    (tmp_path / '000001.xml').write_text(
+        "<annotation><filename>000001.jpg</filename>"
+        + "".join(VOC_OBJECT.format(name=name, box=box) for name, box in objects.items())
+        + "</annotation>")
+    ground_truth = GroundTruth.from_voc(str(tmp_path))
+    assert ground_truth.category_ids == [1, 16, 18, 72]
+
+    evaluator = DetectionEvaluator(ground_truth)
+    evaluator.add('000001.jpg', boxes=list(objects.values()), scores=[0.9, 0.8, 0.7, 0.6],
+                  class_ids=[16, 18, 72, 1])
+    assert abs(evaluator.summarize()['AP'] - 1) < 1e-9
+
+    # batch_detect.py JSONL records carry the detector's class_id next to its name
+    detections = [{'class_name': COCO_CATEGORY_NAMES[class_id], 'class_id': class_id,
+                   'confidence': 0.9, 'bbox': box}
+                  for box, class_id in zip(objects.values(), [16, 18, 72, 1])]
+    results = tmp_path / 'detections.jsonl'
+    results.write_text(json.dumps({'image': '/data/000001.jpg', 'detections': detections}) + '\n')
+    evaluator = DetectionEvaluator(ground_truth)
+    load_results(str(results), ground_truth, evaluator)
+    assert abs(evaluator.summarize()['AP'] - 1) < 1e-9
+
+    # Without class_id the category is never guessed from the name
+    del detections[1]['class_id']
+    results.write_text(json.dumps({'image': '/data/000001.jpg', 'detections': detections}) + '\n')
+    with pytest.raises(ValueError, match="class_id"):
+        load_results(str(results), ground_truth, DetectionEvaluator(ground_truth))
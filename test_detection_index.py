@@ -0,0 +1,127 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from detection_index import DetectionIndex, import_jsonl, synthetic_detections
+
+
+def brute_force_images(records, class_id, min_count, min_score):
+    found = {}
+    for key, detections in records:
+        count = int(((detections.class_ids == class_id) & (detections.scores >= min_score)).sum())
+        if count >= min_count:
+            found[key] = count
+    return found
+
+
+def test_queries_match_brute_force_across_segments(tmp_path):
+    records = list(synthetic_detections(300, per_image=6, seed=1))
+    index = DetectionIndex(str(tmp_path), segment_rows=200, max_segments=3)
+    for key, detections in records:
+        assert index.add(key, detections)
+    # Unflushed rows are visible to queries too
+    assert len(index.segments) > 1 and index._buffer_rows > 0
+
+    expected = brute_force_images(records, 1, 2, 0.6)
+    assert dict(index.images_with('person', min_count=2, min_score=0.6)) == expected
+
+    region = (100, 100, 200, 200)
+    found = index.find_boxes('car', region, min_score=0.5)
+    expected_boxes = sorted(
+        (key, tuple(box)) for key, detections in records
+        for box, score, class_id in zip(detections.boxes.tolist(), detections.scores,
+                                        detections.class_ids)
+        if class_id == 3 and score >= 0.5 and box[0] < 200 and box[2] > 100
+        and box[1] < 200 and box[3] > 100)
+    assert sorted(zip(found['image_keys'], map(tuple, found['boxes'].tolist()))) == expected_boxes
+    assert np.all(np.diff(found['scores']) <= 0)
+
+
+def test_index_persists_and_skips_known_images(tmp_path):
+    records = list(synthetic_detections(50, seed=2))
+    with DetectionIndex(str(tmp_path)) as index:
+        for key, detections in records:
+            index.add(key, detections)
+    before = index.class_counts(0.5)
+
+    reopened = DetectionIndex(str(tmp_path))
+    assert reopened.num_images == 50 and len(reopened) == len(index)
+    assert reopened.class_counts(0.5) == before
+    assert not reopened.add(records[0][0], records[0][1])
+
+    key, detections = records[7]
+    stored = reopened.image_detections(key)
+    order = np.argsort(-detections.scores, kind='stable')
+    assert np.array_equal(stored.boxes, detections.boxes[order])
+    assert np.array_equal(stored.class_ids, detections.class_ids[order])
+
+    reopened.compact()
+    assert len(reopened.segments) == 1
+    assert DetectionIndex(str(tmp_path)).class_counts(0.5) == before
+
+
+def test_unlisted_keys_and_segments_are_dropped_on_open(tmp_path):
+    records = list(synthetic_detections(20, seed=3))
+    # A crash before the first manifest leaves keys nobody can query
+    (tmp_path / 'images.jsonl').write_text('"lost.jpg"\n')
+    (tmp_path / 'segment-000000').mkdir()
+    index = DetectionIndex(str(tmp_path))
+    assert index.num_images == 0 and not (tmp_path / 'segment-000000').exists()
+    assert (tmp_path / 'images.jsonl').read_text() == ''
+
+    for key, detections in records[:10]:
+        index.add(key, detections)
+    index.flush()
+    # Simulate a flush that wrote keys and a segment but died before the manifest
+    with open(tmp_path / 'images.jsonl', 'a') as f:
+        f.write('"ghost.jpg"\n')
+    (tmp_path / 'segment-000099').mkdir()
+
+    reopened = DetectionIndex(str(tmp_path))
+    assert reopened.num_images == 10 and 'ghost.jpg' not in reopened
+    assert not (tmp_path / 'segment-000099').exists()
+    for key, detections in records[10:]:
+        assert reopened.add(key, detections)
+    reopened.flush()
+    assert DetectionIndex(str(tmp_path)).image_keys == [key for key, _ in records]
+
+
+def test_image_detections_across_segments(tmp_path):
+    records = list(synthetic_detections(120, per_image=5, seed=4))
+    index = DetectionIndex(str(tmp_path), segment_rows=150)
+    for key, detections in records:
+        index.add(key, detections)
+    assert len(index.segments) > 1 and index._buffer_rows > 0
+
+    def check(index):
+        for key, detections in records[::7]:
+            stored = index.image_detections(key, min_score=0.5)
+            keep = detections.scores >= 0.5
+            assert sorted(stored.scores.tolist()) == sorted(detections.scores[keep].tolist())
+
+    check(index)
+    index.flush()
+    check(DetectionIndex(str(tmp_path)))
+
+
+def test_flush_interval(tmp_path):
+    records = list(synthetic_detections(3, seed=5))
+    index = DetectionIndex(str(tmp_path), flush_interval=3600)
+    index.add(*records[0])
+    assert not os.path.exists(tmp_path / 'manifest.json')
+    index.flush_interval = 0
+    index.add(*records[1])
+    assert DetectionIndex(str(tmp_path)).num_images == 2
+
+
+def test_import_jsonl_requires_class_ids(tmp_path):
+    results = tmp_path / 'results.jsonl'
+    detection = {'class_name': 'dog', 'confidence': 0.9, 'bbox': [0, 0, 10, 10]}
+    results.write_text(json.dumps({'image': 'a.jpg', 'detections': [dict(detection, class_id=18)]})
+                       + '\n' + json.dumps({'image': 'b.jpg', 'detections': [detection]}) + '\n')
+    index = DetectionIndex(str(tmp_path / 'index'))
+    with pytest.raises(ValueError, match="results.jsonl:2"):
+        import_jsonl(index, str(results))
+    assert index.image_detections('a.jpg').class_ids.tolist() == [18]
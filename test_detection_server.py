@@ -0,0 +1,89 @@
+import http.client
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from detection_server import DetectionServer, MicroBatcher
+from detector_backends import StubBackend
+
+
+class FlakyBackend(StubBackend):
+    """StubBackend that raises while failing is set"""
+
+    failing = False
+
+    def predict(self, batch):
+        if self.failing:
+            raise RuntimeError("model exploded")
+        return super().predict(batch)
+
+
+def test_concurrent_requests_share_a_batch(make_detector):
+    batcher = MicroBatcher(make_detector(FlakyBackend(num_detections=3, latency_ms=20)), max_batch_size=4, max_wait_ms=50)
+    image = np.zeros((120, 160, 3), dtype=np.uint8)
+    futures = [batcher.submit(image, threshold) for threshold in (0.5, 0.5, 0.95, 0.5)]
+    results = [future.result(timeout=10) for future in futures]
+    assert [len(r) for r in results] == [3, 3, 0, 3]
+    assert batcher.batches == 1 and batcher.images == 4
+
+
+def test_lone_request_flushes_after_max_wait(make_detector):
+    batcher = MicroBatcher(make_detector(FlakyBackend(num_detections=3)), max_batch_size=8, max_wait_ms=20)
+    start = time.perf_counter()
+    result = batcher.submit(np.zeros((120, 160, 3), dtype=np.uint8)).result(timeout=10)
+    assert len(result) == 3 and time.perf_counter() - start < 5
+    assert batcher.batches == 1 and batcher.images == 1
+
+
+def test_model_error_fails_the_whole_batch(make_detector):
+    detector = make_detector(FlakyBackend(num_detections=3))
+    detector.backend.failing = True
+    batcher = MicroBatcher(detector, max_batch_size=4, max_wait_ms=50)
+    image = np.zeros((120, 160, 3), dtype=np.uint8)
+    futures = [batcher.submit(image) for _ in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model exploded"):
+            future.result(timeout=10)
+
+
+@pytest.fixture
+def server(make_detector):
+    server = DetectionServer(('127.0.0.1', 0), make_detector(FlakyBackend(num_detections=3)),
+                             max_body_bytes=100_000,
+                             max_wait_ms=1)
+    server.load_model()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, body, headers):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    connection.putrequest('POST', '/detect')
+    for name, value in headers.items():
+        connection.putheader(name, value)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    payload = json.loads(response.read())
+    connection.close()
+    return response.status, payload
+
+
+def test_http_status_codes(server):
+    body = cv2.imencode('.png', np.zeros((120, 160, 3), dtype=np.uint8))[1].tobytes()
+    status, payload = post(server, body, {'Content-Length': str(len(body))})
+    assert status == 200 and len(payload['detections']) == 3
+
+    assert post(server, body, {})[0] == 400
+    assert post(server, body, {'Content-Length': 'lots'})[0] == 400
+    assert post(server, b'', {'Content-Length': '10000000'})[0] == 413
+
+    server.detector.backend.failing = True
+    status, payload = post(server, body, {'Content-Length': str(len(body))})
+    assert status == 500 and payload['error'] == "model exploded"
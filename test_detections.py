@@ -0,0 +1,81 @@
+# test_detections.py - Tests for the vectorized SSD output decoding
+import numpy as np
+
+from coco_labels import COCO_CLASS_NAMES, COCO_LABELS
+from detector_backends import StubBackend
+from streamlit_detector import Detections, decode_detections
+
+
+def reference_decode(boxes, classes, scores, height, width, threshold):
+    """The original per-detection loop from detect_objects"""
+    results = []
+    for i in range(len(scores)):
+        if scores[i] > threshold:
+            class_id = int(classes[i])
+            if 0 <= class_id < len(COCO_LABELS) and COCO_LABELS[class_id]:
+                y1, x1, y2, x2 = boxes[i]
+                x1 = int(max(0, min(x1 * width, width - 1)))
+                y1 = int(max(0, min(y1 * height, height - 1)))
+                x2 = int(max(0, min(x2 * width, width - 1)))
+                y2 = int(max(0, min(y2 * height, height - 1)))
+                results.append({
+                    'class_name': COCO_LABELS[class_id],
+                    'confidence': float(scores[i]),
+                    'bbox': [x1, y1, x2, y2]
+                })
+    return results
+
+
+def random_outputs(num_images, num_boxes=100, seed=0):
+    rng = np.random.default_rng(seed)
+    boxes = np.sort(rng.uniform(-0.1, 1.1, (num_images, num_boxes, 4)), axis=-1).astype(np.float32)
+    classes = rng.integers(0, 92, (num_images, num_boxes)).astype(np.float32)
+    scores = rng.random((num_images, num_boxes)).astype(np.float32)
+    return boxes, classes, scores
+
+
+def test_decode_matches_reference_loop():
+    boxes, classes, scores = random_outputs(3)
+    sizes = [(480, 640), (1080, 1920), (300, 300)]
+
+    decoded = decode_detections(boxes, classes, scores, sizes, COCO_LABELS, 0.5)
+
+    assert len(decoded) == 3
+    for i, (height, width) in enumerate(sizes):
+        expected = reference_decode(boxes[i], classes[i], scores[i], height, width, 0.5)
+        assert decoded[i].to_dicts() == expected
+
+
+def test_detections_columns():
+    boxes, classes, scores = random_outputs(1, seed=1)
+    detections = decode_detections(boxes, classes, scores, [(100, 200)], COCO_LABELS, 0.3)[0]
+
+    columns = detections.to_columns()
+    assert len(columns['boxes']) == len(detections) == len(columns['scores'])
+    assert detections.boxes.dtype == np.int32
+    assert np.all(detections.scores > 0.3)
+    assert all(COCO_LABELS[class_id] for class_id in detections.class_ids)
+
+
+def test_names_follow_coco_category_ids():
+    outputs = StubBackend(num_detections=80, max_detections=80).predict(
+        np.zeros((1, 100, 100, 3), dtype=np.uint8))
+    detections = decode_detections(outputs['detection_boxes'], outputs['detection_classes'],
+                                   outputs['detection_scores'], [(100, 100)], COCO_LABELS, 0.5)[0]
+    names = [d['class_name'] for d in detections.to_dicts()]
+    assert names == COCO_CLASS_NAMES
+    assert (names[11], names[79]) == ('stop sign', 'toothbrush')
+    assert detections.class_ids[79] == 90
+
+    # Background, unused ids and ids past the table are dropped
+    classes = np.array([[0, 12, 83, 91, 13]], dtype=np.float32)
+    decoded = decode_detections(np.full((1, 5, 4), 0.5, dtype=np.float32), classes,
+                                np.full((1, 5), 0.9, dtype=np.float32), [(100, 100)],
+                                COCO_LABELS, 0.5)[0]
+    assert decoded.class_ids.tolist() == [13]
+
+
+def test_empty_detections():
+    detections = Detections.empty(COCO_LABELS)
+    assert len(detections) == 0
+    assert detections.to_dicts() == []
@@ -0,0 +1,55 @@
+# test_image_ingest.py - Reduced-scale decoding into the model input
+import cv2
+import numpy as np
+
+from image_ingest import ImageIngestor, reduction_factor
+from streamlit_detector import preprocess_into
+
+
+def encoded_test_image(height=1200, width=1600):
+    yy, xx = np.mgrid[:height, :width]
+    image = np.stack([xx % 256, yy % 256, (xx + yy) % 256], axis=-1).astype(np.uint8)
+    image = cv2.GaussianBlur(image, (0, 0), 8)
+    return image, cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+
+
+def test_reduction_factor_keeps_target_covered():
+    assert reduction_factor(3000, 4000, (300, 300)) == 8
+    assert reduction_factor(1200, 1600, (300, 300)) == 4
+    assert reduction_factor(500, 800, (300, 300)) == 1
+
+
+def test_encoded_bytes_match_decoded_array_path():
+    image, data = encoded_test_image()
+    expected = np.empty((300, 300, 3), dtype=np.uint8)
+    preprocess_into(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), expected)
+
+    ingestor = ImageIngestor((300, 300))
+    tensor, size = ingestor.ingest(memoryview(data))
+
+    assert size == (1200, 1600)
+    assert np.abs(tensor[0].astype(int) - expected).mean() < 4
+    # Only the quarter-scale decode is allocated, never the full frame
+    assert [step for step, _ in ingestor.last_copies] == ['decode']
+    assert ingestor.last_copies[0][1] == 300 * 400 * 3
+
+
+def test_pil_jpeg_is_not_modified(tmp_path):
+    from PIL import Image
+
+    from detector_backends import StubBackend
+    from streamlit_detector import StreamlitSSDDetector
+
+    path = str(tmp_path / 'large.jpg')
+    cv2.imwrite(path, encoded_test_image(2400, 3200)[0])
+    image = Image.open(path)
+
+    detector = StreamlitSSDDetector(backend=StubBackend(), warmup=False)
+    assert detector.load_model()
+    detections = detector.detect(image)
+
+    assert image.size == (3200, 2400) and image.mode == 'RGB'
+    assert len(detections) and detections.boxes[:, [0, 2]].max() < 3200
+    assert detections.boxes[:, [1, 3]].max() < 2400
+    # The caller's image still decodes at full resolution
+    assert np.asarray(image).shape == (2400, 3200, 3)
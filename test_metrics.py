@@ -0,0 +1,62 @@
+# test_metrics.py - Detector stage timings, counters and exports
+import numpy as np
+
+from coco_labels import COCO_LABELS
+from detector_metrics import DetectorMetrics
+from result_cache import DetectionCache
+
+
+def test_detect_records_every_stage(make_detector):
+    detector = make_detector(num_detections=3)
+    image = np.zeros((120, 160, 3), dtype=np.uint8)
+    detections = detector.detect(image)
+    detector.draw_detections(image, detections)
+
+    snapshot = detector.metrics.snapshot()
+    for stage in ('preprocess', 'inference', 'postprocess', 'draw'):
+        assert snapshot['stages'][stage]['count'] == 1
+    # run_raw is nested inside detect and must not be counted as its own call
+    assert set(snapshot['calls']) == {'detect'}
+    assert snapshot['images'] == 1
+    assert snapshot['detections'] == {'person': 1, 'bicycle': 1, 'car': 1}
+
+
+def test_images_are_counted_once_per_model_run(make_detector):
+    detector = make_detector(num_detections=3)
+    cache = DetectionCache()
+    image = np.zeros((120, 160, 3), dtype=np.uint8)
+    for threshold in (0.5, 0.3, 0.5):
+        detections, _ = cache.detect(detector, b'same image', lambda: image, threshold)
+        assert len(detections) == 3
+    detector.detect_tiled(image)
+
+    snapshot = detector.metrics.snapshot()
+    assert snapshot['images'] == 2
+    assert snapshot['detections'] == {'person': 2, 'bicycle': 2, 'car': 2}
+
+
+def test_prometheus_histogram_is_cumulative():
+    metrics = DetectorMetrics(COCO_LABELS)
+    for seconds in (0.0002, 0.003, 0.003, 20.0):
+        metrics.record('inference', seconds)
+    metrics.record_error('detect')
+
+    lines = metrics.to_prometheus().splitlines()
+    assert 'ssd_stage_latency_seconds_bucket{stage="inference",le="0.0005"} 1' in lines
+    assert 'ssd_stage_latency_seconds_bucket{stage="inference",le="0.005"} 3' in lines
+    assert 'ssd_stage_latency_seconds_bucket{stage="inference",le="10"} 3' in lines
+    assert 'ssd_stage_latency_seconds_bucket{stage="inference",le="+Inf"} 4' in lines
+    assert 'ssd_stage_latency_seconds_count{stage="inference"} 4' in lines
+    assert 'ssd_errors_total{stage="detect"} 1' in lines
+
+
+def test_profile_capture_stops_after_n_calls(make_detector):
+    detector = make_detector(num_detections=3)
+    capture = detector.metrics.profile_next(2)
+    image = np.zeros((120, 160, 3), dtype=np.uint8)
+    for _ in range(3):
+        detector.detect(image)
+
+    assert capture.done and capture.calls == 2
+    assert 'run_raw' in capture.report
+    assert detector.metrics.capture is None
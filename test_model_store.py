@@ -0,0 +1,95 @@
+# test_model_store.py - Model store downloads, checksum verification and digest pinning
+import os
+import sys
+import types
+
+import pytest
+
+from model_store import ModelStore, model_sha256, _directory_checksums
+
+
+class RecordingStore(ModelStore):
+    """ModelStore whose 'download' is a local SavedModel directory"""
+
+    def __init__(self, source_dir, **kwargs):
+        super().__init__(**kwargs)
+        self.source_dir = source_dir
+        self.downloads = 0
+
+    def _download(self, model_url):
+        self.downloads += 1
+        return self.source_dir
+
+
+def make_saved_model(path):
+    (path / 'variables').mkdir(parents=True)
+    (path / 'saved_model.pb').write_bytes(b'graph')
+    (path / 'variables' / 'variables.index').write_bytes(b'weights')
+    return str(path)
+
+
+URL = 'https://tfhub.dev/example/model/1'
+
+
+def test_download_is_stored_and_reused(tmp_path):
+    source = make_saved_model(tmp_path / 'download')
+    store = RecordingStore(source, store_dir=str(tmp_path / 'store'), offline=False)
+    target = store.fetch(URL)
+    assert store.fetch(URL) == target and store.downloads == 1
+    assert open(os.path.join(target, 'saved_model.pb'), 'rb').read() == b'graph'
+    manifest = store.read_manifest(URL)
+    assert manifest['sha256'] == model_sha256(_directory_checksums(source))
+
+
+def test_corrupt_copy_is_refetched_or_refused_offline(tmp_path):
+    source = make_saved_model(tmp_path / 'download')
+    store = RecordingStore(source, store_dir=str(tmp_path / 'store'), offline=False)
+    target = store.fetch(URL)
+    with open(os.path.join(target, 'saved_model.pb'), 'wb') as f:
+        f.write(b'tampered')
+    assert not store.verify(URL)
+
+    offline = RecordingStore(source, store_dir=str(tmp_path / 'store'), offline=True)
+    with pytest.raises(IOError):
+        offline.fetch(URL)
+    assert store.fetch(URL) == target and store.downloads == 2 and store.verify(URL)
+
+
+def test_expected_digest(tmp_path, monkeypatch):
+    source = make_saved_model(tmp_path / 'download')
+    digest = model_sha256(_directory_checksums(source))
+
+    wrong = RecordingStore(source, store_dir=str(tmp_path / 'store'), offline=False,
+                           expected_sha256='0' * 64)
+    with pytest.raises(IOError, match=digest):
+        wrong.fetch(URL)
+    assert wrong.read_manifest(URL) is None and os.listdir(tmp_path / 'store') == []
+
+    monkeypatch.setenv('SSD_MODEL_SHA256', digest.upper())
+    pinned = RecordingStore(source, store_dir=str(tmp_path / 'store'), offline=False)
+    assert pinned.verify(URL) is False
+    pinned.fetch(URL)
+    assert pinned.verify(URL) and pinned.downloads == 1
+
+    # A stored copy of a different model is not trusted, even with file checks off
+    other = RecordingStore(source, store_dir=str(tmp_path / 'store'), offline=True, verify=False,
+                           expected_sha256='f' * 64)
+    with pytest.raises(IOError):
+        other.fetch(URL)
+
+
+def test_tfhub_cache_dir_is_restored_after_download(tmp_path, monkeypatch):
+    seen = []
+    hub = types.ModuleType('tensorflow_hub')
+    hub.resolve = lambda url: seen.append(os.environ.get('TFHUB_CACHE_DIR')) or str(tmp_path)
+    monkeypatch.setitem(sys.modules, 'tensorflow_hub', hub)
+    store = ModelStore(store_dir=str(tmp_path / 'store'), tfhub_cache_dir='hub-cache')
+
+    monkeypatch.delenv('TFHUB_CACHE_DIR', raising=False)
+    store._download(URL)
+    assert 'TFHUB_CACHE_DIR' not in os.environ
+
+    monkeypatch.setenv('TFHUB_CACHE_DIR', 'user-cache')
+    store._download(URL)
+    assert os.environ['TFHUB_CACHE_DIR'] == 'user-cache'
+    assert seen == ['hub-cache', 'hub-cache']
@@ -0,0 +1,37 @@
+import os
+import time
+
+import numpy as np
+
+from detector_backends import StubBackend
+from quantize_model import measure_variant
+
+
+class CrashingBackend(StubBackend):
+    """Dies like a native abort in the interpreter"""
+
+    def load(self):
+        os._exit(3)
+
+
+class HangingBackend(StubBackend):
+    def load(self):
+        time.sleep(60)
+
+
+def test_measure_variant_reports_results():
+    images = [np.zeros((120, 160, 3), dtype=np.uint8)] * 3
+    result = measure_variant(StubBackend(num_detections=2), None, images)
+    assert 'error' not in result and len(result['detections']) == 3
+    assert result['p95_latency_ms'] >= result['p50_latency_ms'] >= 0
+
+
+def test_crashed_or_hung_variant_is_reported_as_failed():
+    images = [np.zeros((120, 160, 3), dtype=np.uint8)]
+    result = measure_variant(CrashingBackend(), None, images)
+    assert result == {'error': 'measurement process exited with code 3'}
+
+    start = time.monotonic()
+    result = measure_variant(HangingBackend(), None, images, timeout=1.0)
+    assert result == {'error': 'no result after 1 s'}
+    assert time.monotonic() - start < 30
@@ -0,0 +1,69 @@
+# test_renderer.py - Box/label drawing and the renderer's palette and label caches
+import cv2
+import numpy as np
+
+from coco_labels import COCO_LABELS
+from streamlit_detector import DetectionRenderer, Detections
+
+
+def sample_detections():
+    return Detections(np.array([[10, 40, 90, 110], [60, 30, 150, 100]], dtype=np.int32),
+                      np.array([0.91, 0.55], dtype=np.float32),
+                      np.array([1, 3], dtype=np.int32), COCO_LABELS)
+
+
+def reference_draw(image, detections, palette):
+    """The per-detection drawing calls, one cv2.getTextSize per label"""
+    image = image.copy()
+    for d in detections.to_dicts():
+        x1, y1, x2, y2 = d['bbox']
+        color = palette[COCO_LABELS.index(d['class_name'])]
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
+        label = f"{d['class_name']}: {d['confidence']:.2f}"
+        (width, height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+        cv2.rectangle(image, (x1, y1 - height - 10), (x1 + width, y1), color, -1)
+        cv2.putText(image, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                    (255, 255, 255), 2)
+    return image
+
+
+def test_drawing_matches_reference_for_both_input_forms():
+    renderer = DetectionRenderer(COCO_LABELS)
+    image = np.full((120, 160, 3), 30, dtype=np.uint8)
+    detections = sample_detections()
+    expected = reference_draw(image, detections, renderer.palette['bgr'])
+
+    drawn = renderer.draw(image, detections)
+    np.testing.assert_array_equal(drawn, expected)
+    assert drawn is not image and (image == 30).all()
+    np.testing.assert_array_equal(renderer.draw(image, detections.to_dicts()), expected)
+
+    # RGB frames get the same colours with the channels swapped
+    rgb = renderer.draw(image, detections, channel_order='rgb')
+    np.testing.assert_array_equal(rgb[..., ::-1], expected)
+
+    assert renderer.draw(image, detections, inplace=True) is image
+    np.testing.assert_array_equal(image, expected)
+
+
+def test_palette_is_fixed_and_label_sizes_are_cached(monkeypatch):
+    renderer = DetectionRenderer(COCO_LABELS)
+    assert renderer.palette == DetectionRenderer(COCO_LABELS).palette
+    assert len(renderer.palette['bgr']) == len(COCO_LABELS)
+
+    calls = []
+    get_text_size = cv2.getTextSize
+
+    def counting_text_size(label, *args):
+        calls.append(label)
+        return get_text_size(label, *args)
+
+    monkeypatch.setattr(cv2, 'getTextSize', counting_text_size)
+    image = np.zeros((120, 160, 3), dtype=np.uint8)
+    for _ in range(3):
+        renderer.draw(image, sample_detections())
+    assert sorted(calls) == ['car: 0.55', 'person: 0.91']
+
+    renderer.max_cached_labels = 2
+    renderer.label_size('dog: 0.50')
+    assert list(renderer._label_sizes) == ['dog: 0.50']
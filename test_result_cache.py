@@ -0,0 +1,59 @@
+# test_result_cache.py - LRU eviction, key hashing and hit/miss accounting
+import numpy as np
+
+from result_cache import DetectionCache
+
+
+def raw(nbytes=400):
+    return {'detection_scores': np.zeros(nbytes // 4, dtype=np.float32), 'size': (120, 160)}
+
+
+def test_keys_depend_on_content_and_model():
+    key = DetectionCache.make_key(b'image', 'model-a')
+    assert key == DetectionCache.make_key(b'image', 'model-a') and len(key) == 64
+    assert key != DetectionCache.make_key(b'image', 'model-b')
+    assert key != DetectionCache.make_key(b'other', 'model-a')
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = DetectionCache(max_entries=2)
+    cache.put('a', raw())
+    cache.put('b', raw())
+    assert cache.get('a') is not None
+    cache.put('c', raw())
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+    # Replacing an entry does not count its bytes twice
+    cache.put('c', raw())
+    assert cache.current_bytes == 800
+
+    by_size = DetectionCache(max_entries=10, max_bytes=1000)
+    for key in 'abc':
+        by_size.put(key, raw())
+    assert by_size.stats()['entries'] == 2 and by_size.current_bytes == 800
+    assert by_size.get('a') is None
+
+    cache.clear()
+    assert cache.stats()['entries'] == 0 and cache.current_bytes == 0
+
+
+def test_detect_counts_hits_and_misses(make_detector):
+    detector = make_detector(num_detections=3)
+    cache = DetectionCache()
+    loads = []
+
+    def load_image():
+        loads.append(1)
+        return np.zeros((120, 160, 3), dtype=np.uint8)
+
+    first, hit = cache.detect(detector, b'image', load_image, 0.5)
+    assert not hit and len(first) == 3
+    strict, hit = cache.detect(detector, b'image', load_image, 0.95)
+    assert hit and len(strict) == 0
+    assert cache.detect(detector, b'other', load_image)[1] is False
+    assert len(loads) == 2
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+    assert abs(stats['hit_rate'] - 1 / 3) < 1e-9
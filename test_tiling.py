@@ -0,0 +1,56 @@
+# test_tiling.py - Tiled inference and class-aware NMS
+import numpy as np
+
+from box_utils import non_max_suppression
+from detector_backends import StubBackend
+from streamlit_detector import tile_grid
+
+
+def test_tile_grid_covers_image():
+    windows = tile_grid(1000, 1500, tile_size=400, overlap=0.25)
+    covered = np.zeros((1000, 1500), dtype=bool)
+    for x1, y1, x2, y2 in windows.tolist():
+        assert x2 - x1 == 400 and y2 - y1 == 400
+        covered[y1:y2, x1:x2] = True
+    assert covered.all()
+    assert tile_grid(200, 300, tile_size=512).tolist() == [[0, 0, 300, 200]]
+
+
+def test_nms_is_class_aware():
+    boxes = [[0, 0, 10, 10], [1, 1, 10, 10], [0, 0, 10, 10], [50, 50, 60, 60]]
+    scores = [0.8, 0.9, 0.7, 0.6]
+    keep = non_max_suppression(boxes, scores, [1, 1, 2, 1], iou_threshold=0.5)
+    assert keep.tolist() == [1, 2, 3]
+    assert non_max_suppression(boxes, scores, iou_threshold=0.5).tolist() == [1, 3]
+
+
+def test_detect_tiled_maps_boxes_to_image_coordinates(make_detector):
+    # One confident box per input in the middle of each tile
+    backend = StubBackend(num_detections=1, max_detections=4)
+    backend._boxes[0] = [0.4, 0.4, 0.6, 0.6]
+    detector = make_detector(backend)
+
+    image = np.zeros((800, 1200, 3), dtype=np.uint8)
+    detections = detector.detect_tiled(image, tile_size=400, overlap=0.0,
+                                       include_full_frame=False)
+
+    windows = tile_grid(800, 1200, tile_size=400, overlap=0.0)
+    assert len(detections) == len(windows) == 6
+    centers = (detections.boxes[:, :2] + detections.boxes[:, 2:]) // 2
+    expected = (windows[:, :2] + windows[:, 2:]) // 2
+    assert sorted(map(tuple, centers.tolist())) == sorted(map(tuple, expected.tolist()))
+
+
+def test_detect_tiled_small_image_honours_thresholds(make_detector):
+    backend = StubBackend(num_detections=10, max_detections=20)
+    # A duplicate of the first box with the same class and a lower score
+    backend._boxes[10] = backend._boxes[0]
+    backend._classes[10] = backend._classes[0]
+    backend._scores[10] = 0.8
+    detector = make_detector(backend)
+
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+    assert len(detector.detect_tiled(image, confidence_threshold=0.99)) == 0
+    assert len(detector.detect_tiled(image, confidence_threshold=0.5)) == 10
+    assert len(detector.detect_tiled(image, confidence_threshold=0.5, nms_threshold=1.0)) == 11
+    assert len(detector.detect_tiled(image, confidence_threshold=0.01, nms_threshold=1.0)) == 20
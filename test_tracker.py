@@ -0,0 +1,72 @@
+# test_tracker.py - Keyframe detection with SORT-style tracking in between
+import numpy as np
+import pytest
+
+from detector_backends import InferenceBackend
+from object_tracker import TrackingDetector, evaluate_tracking
+
+
+class BrightSquareBackend(InferenceBackend):
+    """Detects the single bright square in each input as a 'person'"""
+
+    name = 'square'
+    supports_batching = True
+    model_id = 'square'
+
+    def load(self):
+        pass
+
+    def predict(self, batch):
+        count = len(batch)
+        boxes = np.zeros((count, 1, 4), dtype=np.float32)
+        for i, image in enumerate(batch):
+            ys, xs = np.nonzero(image[..., 0] > 128)
+            height, width = image.shape[:2]
+            boxes[i, 0] = [ys.min() / height, xs.min() / width,
+                           (ys.max() + 1) / height, (xs.max() + 1) / width]
+        return {'detection_boxes': boxes,
+                'detection_classes': np.ones((count, 1), dtype=np.float32),
+                'detection_scores': np.full((count, 1), 0.9, dtype=np.float32)}
+
+
+def moving_square_frames(num_frames=40, step=6):
+    frames = []
+    for t in range(num_frames):
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+        x = 40 + t * step
+        frame[150:230, x:x + 80] = 255
+        frames.append(frame)
+    return frames
+
+
+@pytest.fixture
+def square_detector(make_detector):
+    return make_detector(BrightSquareBackend())
+
+
+def test_track_id_is_stable_between_keyframes(square_detector):
+    tracking = TrackingDetector(square_detector, keyframe_interval=4, change_threshold=1.0)
+    track_ids = {int(tracking.process(frame).track_ids[0]) for frame in moving_square_frames()}
+
+    assert track_ids == {1}
+    assert tracking.stats()['inference_rate'] == 10 / 40
+
+
+def test_tracking_follows_constant_motion(square_detector):
+    report = evaluate_tracking(square_detector, moving_square_frames(), keyframe_interval=4,
+                               change_threshold=1.0)
+
+    assert report['keyframes'] == 10
+    assert report['recall'] > 0.9
+    assert report['mean_iou'] > 0.7
+
+
+def test_scene_change_forces_a_keyframe(square_detector):
+    tracking = TrackingDetector(square_detector, keyframe_interval=100, change_threshold=0.05)
+    frames = moving_square_frames(10, step=0)
+    frames[5] = np.full_like(frames[5], 200)
+    frames[5][150:230, 40:120] = 255
+    for frame in frames:
+        tracking.process(frame)
+
+    assert tracking.stats()['change_keyframes'] >= 1
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+import pytest
+
+from video_detector import VideoDetector
+
+
+class ListSink:
+    """Collects frames in memory, optionally failing on one frame index"""
+
+    needs_frames = True
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.frames = []
+        self.closed = False
+
+    def write(self, index, frame, detections):
+        if index == self.fail_at:
+            raise RuntimeError("draw failed")
+        self.frames.append((index, frame, detections))
+
+    def close(self):
+        self.closed = True
+
+
+def make_video(path, count=12):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 10, (160, 120))
+    for i in range(count):
+        writer.write(np.full((120, 160, 3), 40 + i * 5, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+@pytest.fixture
+def pipeline(make_detector):
+    return VideoDetector(make_detector(num_detections=2), batch_size=3, queue_size=2)
+
+
+def test_frames_are_drawn_in_place(tmp_path, pipeline):
+    source = make_video(tmp_path / 'clip.avi')
+    sink = ListSink()
+    stats = pipeline.run(source, sink)
+    assert stats['frames_processed'] == 12 and sink.closed
+    assert [index for index, _, _ in sink.frames] == list(range(12))
+    # Boxes are drawn onto the decoded frame, so it is no longer a flat colour
+    index, frame, detections = sink.frames[0]
+    assert len(detections) == 2 and frame.std() > 0
+
+
+@pytest.mark.parametrize('stage', ['draw', 'resize'])
+def test_stage_error_is_raised_from_run(tmp_path, pipeline, stage):
+    source = make_video(tmp_path / 'clip.avi', count=30)
+    sink = ListSink(fail_at=4 if stage == 'draw' else None)
+    if stage == 'resize':
+        def broken(image, out):
+            raise RuntimeError("resize failed")
+        pipeline.detector.preprocess_into = broken
+
+    with pytest.raises(RuntimeError, match=f"{stage} failed"):
+        pipeline.run(source, sink)
+    assert sink.closed and pipeline.frames_done < 30
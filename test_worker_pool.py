@@ -0,0 +1,59 @@
+# test_worker_pool.py - Multi-process detection through shared memory
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+
+from streamlit_detector import StreamlitSSDDetector
+from worker_pool import DetectorWorkerPool, plan_core_sets
+
+
+def test_core_sets_are_disjoint_until_cores_run_out():
+    assert plan_core_sets(2, 2, cores=[0, 1, 2, 3]) == [[0, 1], [2, 3]]
+    assert plan_core_sets(3, cores=[0, 1, 2, 3, 4, 5]) == [[0, 1], [2, 3], [4, 5]]
+    assert plan_core_sets(3, 1, cores=[0, 1]) == [[0], [1], [0]]
+
+
+def test_pool_matches_single_process_detector():
+    options = {'num_detections': 5}
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (240, 320, 3), dtype=np.uint8) for _ in range(6)]
+
+    detector = StreamlitSSDDetector(backend='stub', backend_options=options, warmup=False)
+    detector.load_model()
+    expected = [detector.detect(image) for image in images]
+
+    with DetectorWorkerPool(2, 1, backend='stub', backend_options=options) as pool:
+        results = pool.map(images)
+
+    for result, reference in zip(results, expected):
+        np.testing.assert_array_equal(result.boxes, reference.boxes)
+        np.testing.assert_array_equal(result.class_ids, reference.class_ids)
+
+
+def test_killed_worker_fails_its_request_and_frees_the_slot():
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+    with DetectorWorkerPool(1, 1, backend='stub', backend_options={'latency_ms': 2000},
+                            slots_per_worker=2) as pool:
+        future = pool.submit(image)
+        deadline = time.monotonic() + 10
+        while pool._in_progress[0] == -1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        os.kill(pool._processes[0].pid, signal.SIGKILL)
+
+        with pytest.raises(RuntimeError, match="exited"):
+            future.result(timeout=10)
+        assert pool._free_slots.qsize() == pool.num_slots
+        with pytest.raises(RuntimeError, match="No worker"):
+            pool.detect(image)
+
+
+def test_result_timeout():
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+    with DetectorWorkerPool(1, 1, backend='stub', backend_options={'latency_ms': 1500},
+                            result_timeout=0.3) as pool:
+        with pytest.raises(TimeoutError):
+            pool.detect(image)
+        assert pool._free_slots.qsize() == pool.num_slots
@@ -0,0 +1,351 @@
+# video_detector.py - Concurrent video / stream detection pipeline
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from streamlit_detector import StreamlitSSDDetector
+
+# Marks the end of the stream as it travels through the stage queues
+_END = object()
+
+DROP_POLICIES = ('block', 'drop_newest', 'latest')
+
+
+class StageStats:
+    """Rolling per-item latency of one pipeline stage"""
+
+    def __init__(self, window=1000):
+        self.latencies = deque(maxlen=window)
+        self.items = 0
+
+    def record(self, seconds, items=1):
+        self.latencies.append(seconds / items)
+        self.items += items
+
+    def summary(self):
+        if not self.latencies:
+            return {'items': self.items, 'mean_ms': 0.0, 'p95_ms': 0.0}
+        values = np.asarray(self.latencies) * 1000
+        return {
+            'items': self.items,
+            'mean_ms': float(values.mean()),
+            'p95_ms': float(np.percentile(values, 95)),
+        }
+
+
+class VideoWriterSink:
+    """Writes annotated frames to a video file"""
+
+    needs_frames = True
+
+    def __init__(self, path, fps=30.0, fourcc='mp4v'):
+        self.path = path
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.writer = None
+
+    def write(self, index, frame, detections):
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.path, self.fourcc, self.fps, (width, height))
+        self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+
+class JsonLinesSink:
+    """Writes one JSON object of detections per frame"""
+
+    needs_frames = False
+
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def write(self, index, frame, detections):
+        record = {'frame': index, 'detections': detections.to_dicts()}
+        self.file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class VideoDetector:
+    """Runs StreamlitSSDDetector over a video with overlapping pipeline stages
+
+    Decode, resize, batched inference and draw/encode each run on their own
+    thread, joined by bounded queues. When the source produces frames faster
+    than inference can keep up, the decode stage applies the drop policy:
+
+    - 'block': wait for space (no frames lost, latency grows)
+    - 'drop_newest': discard the frame that does not fit
+    - 'latest': discard the oldest queued frame so the pipeline stays current
+
+    If any stage raises, the other stages stop waiting on their queues and
+    run() re-raises the first error once every thread has exited.
+
+    Args:
+        detector (StreamlitSSDDetector): detector with a loaded model
+        batch_size (int): maximum frames per model call
+        queue_size (int): capacity of each stage queue
+        drop_policy (str): one of DROP_POLICIES
+    """
+
+    def __init__(self, detector, batch_size=4, queue_size=8, drop_policy='block'):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {DROP_POLICIES}")
+        self.detector = detector
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self._stop = threading.Event()
+        self._abort = threading.Event()
+        self._error = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.stage_stats = {name: StageStats() for name in ('decode', 'resize', 'inference', 'draw')}
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.frames_done = 0
+
+    def stop(self):
+        """Ask a running pipeline to finish after the frames already queued"""
+        self._stop.set()
+
+    def run(self, source, sink, max_frames=None):
+        """Process a video file path, camera index or cv2.VideoCapture
+
+        Returns:
+            dict: sustained FPS, frame counters and per-stage latency
+        """
+        capture = source if isinstance(source, cv2.VideoCapture) else cv2.VideoCapture(source)
+        if not capture.isOpened():
+            raise IOError(f"Cannot open video source {source!r}")
+
+        self._stop.clear()
+        self._abort.clear()
+        self._error = None
+        self._reset_stats()
+        decoded = queue.Queue(self.queue_size)
+        resized = queue.Queue(self.queue_size)
+        inferred = queue.Queue(self.queue_size)
+
+        threads = [
+            threading.Thread(target=self._run_stage,
+                             args=(self._decode_stage, decoded, capture, decoded, max_frames)),
+            threading.Thread(target=self._run_stage,
+                             args=(self._resize_stage, resized, decoded, resized)),
+            threading.Thread(target=self._run_stage,
+                             args=(self._inference_stage, inferred, resized, inferred)),
+            threading.Thread(target=self._run_stage, args=(self._draw_stage, None, inferred, sink)),
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.1)
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+        finally:
+            elapsed = time.perf_counter() - start
+            capture.release()
+            sink.close()
+        if self._error is not None:
+            raise self._error
+
+        return {
+            'frames_read': self.frames_read,
+            'frames_dropped': self.frames_dropped,
+            'frames_processed': self.frames_done,
+            'elapsed_seconds': elapsed,
+            'fps': self.frames_done / elapsed if elapsed > 0 else 0.0,
+            'stages': {name: stats.summary() for name, stats in self.stage_stats.items()},
+        }
+
+    def _run_stage(self, stage, out, *args):
+        """Run one stage; always pass _END on, and on an error abort the others"""
+        try:
+            stage(*args)
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._abort.set()
+        finally:
+            if out is not None:
+                self._put(out, _END)
+
+    def _put(self, out, item):
+        """Blocking put that gives up once another stage has failed"""
+        while not self._abort.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _get(self, inp):
+        """Blocking get that returns _END once another stage has failed and inp is empty"""
+        while True:
+            try:
+                return inp.get(timeout=0.1)
+            except queue.Empty:
+                if self._abort.is_set():
+                    return _END
+
+    def _put_frame(self, frames, item):
+        """Queue a decoded frame according to the drop policy"""
+        if self.drop_policy == 'block':
+            self._put(frames, item)
+            return
+        while True:
+            try:
+                frames.put_nowait(item)
+                return
+            except queue.Full:
+                if self.drop_policy == 'drop_newest':
+                    self.frames_dropped += 1
+                    return
+            try:
+                frames.get_nowait()
+                self.frames_dropped += 1
+            except queue.Empty:
+                pass
+
+    def _decode_stage(self, capture, out, max_frames):
+        index = 0
+        while (not self._stop.is_set() and not self._abort.is_set()
+               and (max_frames is None or index < max_frames)):
+            start = time.perf_counter()
+            ok, frame = capture.read()
+            if not ok:
+                break
+            self.stage_stats['decode'].record(time.perf_counter() - start)
+            self._put_frame(out, (index, frame))
+            index += 1
+            self.frames_read = index
+
+    def _resize_stage(self, inp, out):
+        width, height = self.detector.input_size
+        while True:
+            item = self._get(inp)
+            if item is _END:
+                return
+            index, frame = item
+            start = time.perf_counter()
+            model_input = np.empty((height, width, 3), dtype=np.uint8)
+            size = self.detector.preprocess_into(frame, model_input)
+            self.stage_stats['resize'].record(time.perf_counter() - start)
+            self._put(out, (index, frame, model_input, size))
+
+    def _inference_stage(self, inp, out):
+        width, height = self.detector.input_size
+        batch = np.empty((self.batch_size, height, width, 3), dtype=np.uint8)
+        finished = False
+        while not finished:
+            # Block for the first frame, then take whatever else is already waiting
+            items = []
+            item = self._get(inp)
+            while item is not _END:
+                items.append(item)
+                if len(items) == self.batch_size:
+                    break
+                try:
+                    item = inp.get_nowait()
+                except queue.Empty:
+                    break
+            finished = item is _END
+
+            if items:
+                for i, (_, _, model_input, _) in enumerate(items):
+                    batch[i] = model_input
+                start = time.perf_counter()
+                results = self.detector.infer_batch(batch[:len(items)], [it[3] for it in items])
+                self.stage_stats['inference'].record(time.perf_counter() - start, len(items))
+                for (index, frame, _, _), detections in zip(items, results):
+                    self._put(out, (index, frame, detections))
+
+    def _draw_stage(self, inp, sink):
+        while True:
+            item = self._get(inp)
+            if item is _END:
+                return
+            index, frame, detections = item
+            start = time.perf_counter()
+            if sink.needs_frames:
+                # Each decoded frame is owned by the pipeline, so draw on it directly
+                frame = self.detector.draw_detections(frame, detections, inplace=True)
+            sink.write(index, frame, detections)
+            self.stage_stats['draw'].record(time.perf_counter() - start)
+            self.frames_done += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SSD detection over a video or camera stream")
+    parser.add_argument('source', help="Video file path or camera index (e.g. 0)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('--output', help="Annotated video output path")
+    output.add_argument('--jsonl', help="JSON-lines detections output path")
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--queue-size', type=int, default=8)
+    parser.add_argument('--drop-policy', choices=DROP_POLICIES, default=None,
+                        help="Default: 'block' for files, 'latest' for cameras")
+    parser.add_argument('--max-frames', type=int, default=None)
+    parser.add_argument('--keyframe-interval', type=int, default=None,
+                        help="Track objects and run the model only every k frames")
+    parser.add_argument('--change-threshold', type=float, default=0.08,
+                        help="Frame-difference score that forces an early keyframe")
+    args = parser.parse_args()
+
+    is_camera = args.source.isdigit()
+    source = int(args.source) if is_camera else args.source
+    drop_policy = args.drop_policy or ('latest' if is_camera else 'block')
+
+    detector = StreamlitSSDDetector(confidence_threshold=args.threshold)
+    if not detector.load_model():
+        print("❌ Cannot process video without a loaded model")
+        raise SystemExit(1)
+
+    capture = cv2.VideoCapture(source)
+    if args.output:
+        sink = VideoWriterSink(args.output, fps=capture.get(cv2.CAP_PROP_FPS) or 30.0)
+    else:
+        sink = JsonLinesSink(args.jsonl)
+
+    if args.keyframe_interval:
+        from object_tracker import TrackingDetector
+        tracking = TrackingDetector(detector, args.keyframe_interval, args.change_threshold)
+        print(f"🎬 Tracking {args.source} (model every {args.keyframe_interval} frames)...")
+        stats = tracking.run(capture, sink, max_frames=args.max_frames)
+        print(f"✅ {stats['frames']} frames in {stats['elapsed_seconds']:.1f}s "
+              f"({stats['fps']:.1f} FPS), model ran on {stats['inference_rate']:.0%} of frames "
+              f"({stats['change_keyframes']} forced by scene changes)")
+        return
+
+    pipeline = VideoDetector(detector, batch_size=args.batch_size,
+                             queue_size=args.queue_size, drop_policy=drop_policy)
+    print(f"🎬 Processing {args.source} (drop policy: {drop_policy})...")
+    stats = pipeline.run(capture, sink, max_frames=args.max_frames)
+
+    print(f"✅ {stats['frames_processed']} frames in {stats['elapsed_seconds']:.1f}s "
+          f"({stats['fps']:.1f} FPS, {stats['frames_dropped']} dropped)")
+    for name, stage in stats['stages'].items():
+        print(f"   {name:<10} mean {stage['mean_ms']:7.2f} ms   p95 {stage['p95_ms']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
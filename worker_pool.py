@@ -0,0 +1,408 @@
+# worker_pool.py - Multi-process CPU inference with pinned cores and shared-memory dispatch
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from coco_labels import COCO_LABELS
+from streamlit_detector import Detections
+
+# Environment variables the math libraries read when they start up
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+def available_cores():
+    """CPU ids this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_core_sets(num_workers, cores_per_worker=None, cores=None):
+    """Split the available cores into one disjoint set per worker
+
+    Workers beyond the core count wrap around and share cores.
+    """
+    cores = cores or available_cores()
+    if cores_per_worker is None:
+        cores_per_worker = max(1, len(cores) // num_workers)
+    return [[cores[(i * cores_per_worker + j) % len(cores)] for j in range(cores_per_worker)]
+            for i in range(num_workers)]
+
+
+def threading_options(backend, intra_op_threads, inter_op_threads):
+    """Backend constructor options that set its thread pools"""
+    if backend == 'tfhub':
+        return {'intra_op_threads': intra_op_threads, 'inter_op_threads': inter_op_threads}
+    if backend == 'tflite':
+        return {'num_threads': intra_op_threads}
+    if backend == 'onnx':
+        return {'intra_op_threads': intra_op_threads}
+    return {}
+
+
+def _worker_main(worker_id, cores, backend, backend_options, intra_op_threads, shm_name,
+                 slot_shape, num_slots, tasks, results, in_progress):
+    """Worker process: pin to cores, load one model, serve tasks until None arrives
+
+    in_progress[worker_id] holds the task being run (-1 when idle), so the
+    parent can fail exactly that task if this process dies.
+    """
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(intra_op_threads)
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(intra_op_threads)
+
+    import cv2
+    cv2.setNumThreads(1)
+    from streamlit_detector import StreamlitSSDDetector, decode_detections
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = np.ndarray((num_slots,) + slot_shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        start = time.perf_counter()
+        detector = StreamlitSSDDetector(backend=backend, backend_options=backend_options)
+        if not detector.load_model():
+            results.put(('failed', worker_id, "model failed to load"))
+            return
+        results.put(('ready', worker_id, time.perf_counter() - start))
+
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            task_id, slot, size, threshold = task
+            in_progress[worker_id] = task_id
+            try:
+                outputs = detector._run_model(slots[slot:slot + 1], threshold)
+                detections = decode_detections(outputs['detection_boxes'],
+                                               outputs['detection_classes'],
+                                               outputs['detection_scores'], [size],
+                                               detector.class_names, threshold)[0]
+                results.put(('done', task_id, (detections.boxes, detections.scores,
+                                               detections.class_ids)))
+            except Exception as e:
+                results.put(('error', task_id, str(e)))
+            in_progress[worker_id] = -1
+    finally:
+        del slots
+        shm.close()
+
+
+class DetectorWorkerPool:
+    """N detector processes, each pinned to its own cores and holding one model
+
+    Callers preprocess images straight into a shared-memory slot of model
+    inputs; only the slot index and the small decoded result arrays cross
+    the process boundary, never the images themselves. Workers pull tasks
+    from one queue, so a slow worker never holds up the others.
+
+    Args:
+        num_workers (int): worker processes, defaults to one per core set
+        cores_per_worker (int): cores each worker is pinned to
+        intra_op_threads (int): threads per op in each worker, defaults to cores_per_worker
+        inter_op_threads (int): concurrent ops in each worker
+        backend (str): backend name for the workers' detectors
+        backend_options (dict): keyword arguments for the backend
+        confidence_threshold (float): default score threshold
+        slots_per_worker (int): in-flight images per worker before submit() blocks
+        result_timeout (float): seconds before an unanswered request fails with
+            TimeoutError, None to wait as long as its worker is alive
+
+    A worker that dies fails the request it was running; once every worker
+    is gone, all outstanding and new requests fail instead of blocking.
+    """
+
+    def __init__(self, num_workers=None, cores_per_worker=None, intra_op_threads=None,
+                 inter_op_threads=1, backend=None, backend_options=None,
+                 confidence_threshold=0.5, slots_per_worker=2, input_size=(300, 300),
+                 result_timeout=60.0):
+        cores = available_cores()
+        if num_workers is None:
+            num_workers = max(1, len(cores) // (cores_per_worker or 1))
+        self.num_workers = num_workers
+        self.core_sets = plan_core_sets(num_workers, cores_per_worker, cores)
+        self.intra_op_threads = intra_op_threads or len(self.core_sets[0])
+        self.inter_op_threads = inter_op_threads
+        self.backend = backend or os.environ.get('SSD_BACKEND', 'tfhub')
+        self.backend_options = dict(backend_options or {})
+        for key, value in threading_options(self.backend, self.intra_op_threads,
+                                            inter_op_threads).items():
+            self.backend_options.setdefault(key, value)
+        self.confidence_threshold = confidence_threshold
+        self.result_timeout = result_timeout
+        self.input_size = input_size
+        self.class_names = list(COCO_LABELS)
+
+        width, height = input_size
+        self.slot_shape = (height, width, 3)
+        self.num_slots = num_workers * slots_per_worker
+        self.images = 0
+        self.load_seconds = []
+        self._processes = []
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._task_ids = iter(range(1 << 62))
+        self._shm = None
+        self._collector = None
+        self._closing = False
+        self._dead_workers = set()
+
+    def start(self, timeout=300):
+        """Start the workers and wait until every model is loaded"""
+        from streamlit_detector import preprocess_into
+        self._preprocess_into = preprocess_into
+
+        slot_bytes = int(np.prod(self.slot_shape))
+        self._shm = shared_memory.SharedMemory(create=True, size=slot_bytes * self.num_slots)
+        self.slots = np.ndarray((self.num_slots,) + self.slot_shape, dtype=np.uint8,
+                                buffer=self._shm.buf)
+        self._free_slots = queue.Queue()
+        for slot in range(self.num_slots):
+            self._free_slots.put(slot)
+
+        # spawn, not fork: TensorFlow's thread pools do not survive a fork
+        context = mp.get_context('spawn')
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._in_progress = context.RawArray('q', [-1] * self.num_workers)
+        for worker_id, cores in enumerate(self.core_sets):
+            process = context.Process(
+                target=_worker_main, daemon=True,
+                args=(worker_id, cores, self.backend, self.backend_options,
+                      self.intra_op_threads, self._shm.name, self.slot_shape, self.num_slots,
+                      self._tasks, self._results, self._in_progress))
+            process.start()
+            self._processes.append(process)
+
+        deadline = time.monotonic() + timeout
+        while len(self.load_seconds) < self.num_workers:
+            try:
+                status, worker_id, value = self._results.get(timeout=0.5)
+            except queue.Empty:
+                dead = [process.exitcode for process in self._processes if not process.is_alive()]
+                if dead or time.monotonic() > deadline:
+                    self.close()
+                    if dead:
+                        raise RuntimeError(f"Worker exited while loading (exit code {dead[0]})")
+                    raise TimeoutError(f"Workers not ready after {timeout}s")
+                continue
+            if status != 'ready':
+                self.close()
+                raise RuntimeError(f"Worker {worker_id}: {value}")
+            self.load_seconds.append(value)
+
+        self._collector = threading.Thread(target=self._collect_results, daemon=True)
+        self._collector.start()
+        print(f"✅ {self.num_workers} workers ready ({len(self.core_sets[0])} cores, "
+              f"{self.intra_op_threads} intra-op threads each)")
+        return self
+
+    def submit(self, image, confidence_threshold=None, channel_order='bgr'):
+        """Queue one image; blocks while every shared-memory slot is in use
+
+        Returns:
+            Future: resolves to the image's Detections
+        """
+        if confidence_threshold is None:
+            confidence_threshold = self.confidence_threshold
+        if len(self._dead_workers) == len(self._processes):
+            raise RuntimeError("No worker processes are running")
+        slot = self._free_slots.get()
+        try:
+            size = self._preprocess_into(image, self.slots[slot], channel_order)
+        except Exception:
+            self._free_slots.put(slot)
+            raise
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._pending_lock:
+            self._pending[task_id] = (future, slot, time.monotonic())
+        self._tasks.put((task_id, slot, tuple(size), confidence_threshold))
+        return future
+
+    def detect(self, image, confidence_threshold=None, channel_order='bgr'):
+        """Detect objects in one image on whichever worker is free"""
+        return self.submit(image, confidence_threshold, channel_order).result()
+
+    def map(self, images, confidence_threshold=None):
+        """Detections for every image, in input order, using all workers"""
+        futures = [self.submit(image, confidence_threshold) for image in images]
+        return [future.result() for future in futures]
+
+    def _fail(self, task_ids, error):
+        """Fail pending tasks and return their slots
+
+        A late result for a failed task is ignored by the collector, so a
+        slot is never returned twice.
+        """
+        for task_id in task_ids:
+            with self._pending_lock:
+                entry = self._pending.pop(task_id, None)
+            if entry is None:
+                continue
+            future, slot, _ = entry
+            self._free_slots.put(slot)
+            future.set_exception(error)
+
+    def _check_workers(self):
+        """Fail the requests of dead workers and of requests past result_timeout"""
+        for worker_id, process in enumerate(self._processes):
+            if worker_id in self._dead_workers or process.is_alive() or self._closing:
+                continue
+            self._dead_workers.add(worker_id)
+            print(f"❌ Worker {worker_id} exited with code {process.exitcode}")
+            self._fail([self._in_progress[worker_id]],
+                       RuntimeError(f"Worker {worker_id} exited with code {process.exitcode}"))
+        with self._pending_lock:
+            pending = list(self._pending.items())
+        if len(self._dead_workers) == len(self._processes):
+            self._fail([task_id for task_id, _ in pending],
+                       RuntimeError("No worker processes are running"))
+        elif self.result_timeout is not None:
+            now = time.monotonic()
+            self._fail([task_id for task_id, (_, _, submitted) in pending
+                        if now - submitted > self.result_timeout],
+                       TimeoutError(f"No result after {self.result_timeout}s"))
+
+    def _collect_results(self):
+        last_check = time.monotonic()
+        while True:
+            try:
+                message = self._results.get(timeout=0.5)
+            except queue.Empty:
+                message = ()
+            # Check liveness even while other workers keep results flowing
+            if time.monotonic() - last_check >= 0.5:
+                self._check_workers()
+                last_check = time.monotonic()
+            if message == ():
+                continue
+            if message is None:
+                break
+            status, task_id, value = message
+            with self._pending_lock:
+                entry = self._pending.pop(task_id, None)
+            if entry is None:
+                # Already failed after a timeout or a worker exit
+                continue
+            future, slot, _ = entry
+            self._free_slots.put(slot)
+            self.images += 1
+            if status == 'done':
+                boxes, scores, class_ids = value
+                future.set_result(Detections(boxes, scores, class_ids, self.class_names))
+            else:
+                future.set_exception(RuntimeError(value))
+
+    def close(self):
+        """Stop the workers and release the shared memory"""
+        self._closing = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        if self._collector is not None:
+            self._results.put(None)
+            self._collector.join()
+            self._collector = None
+        self._fail(list(self._pending), RuntimeError("Worker pool closed"))
+        if self._shm is not None:
+            del self.slots
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def measure_scaling(images, worker_counts, cores_per_worker=1, backend=None,
+                    backend_options=None, inter_op_threads=1, repeats=2):
+    """Throughput of the pool at each worker count, relative to one worker
+
+    Each run starts a fresh pool, warms every worker up, then times
+    map() over the images (best of repeats).
+
+    Returns:
+        list: dicts with workers, cores, images_per_sec, speedup and efficiency
+    """
+    rows = []
+    for num_workers in worker_counts:
+        with DetectorWorkerPool(num_workers, cores_per_worker, backend=backend,
+                                backend_options=backend_options,
+                                inter_op_threads=inter_op_threads) as pool:
+            pool.map(images[:num_workers * 2])
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                pool.map(images)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+        rows.append({'workers': num_workers, 'cores': num_workers * cores_per_worker,
+                     'images_per_sec': len(images) / best})
+
+    base = rows[0]['images_per_sec'] / rows[0]['workers']
+    for row in rows:
+        row['speedup'] = row['images_per_sec'] / rows[0]['images_per_sec']
+        row['efficiency'] = row['images_per_sec'] / (row['workers'] * base)
+    return rows
+
+
+def main():
+    from benchmark_detector import load_benchmark_images
+
+    parser = argparse.ArgumentParser(description="Measure worker-pool scaling across cores")
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help="Worker counts to measure (default: 1, 2, 4, ... up to all cores)")
+    parser.add_argument('--cores-per-worker', type=int, default=1)
+    parser.add_argument('--inter-op', type=int, default=1, help="Inter-op threads per worker")
+    parser.add_argument('--backend', default=None)
+    parser.add_argument('--images', default='sample_images',
+                        help="Folder of images (random frames are used if empty)")
+    parser.add_argument('--num-images', type=int, default=128)
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    max_workers = len(available_cores()) // args.cores_per_worker
+    worker_counts = args.workers
+    if worker_counts is None:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= max_workers:
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != max_workers:
+            worker_counts.append(max_workers)
+
+    images = load_benchmark_images(args.images, args.num_images)
+    rows = measure_scaling(images, worker_counts, args.cores_per_worker, args.backend,
+                           inter_op_threads=args.inter_op, repeats=args.repeats)
+
+    print(f"📊 Scaling over {len(images)} images, {args.cores_per_worker} core(s) per worker")
+    print(f"{'workers':>8} {'cores':>6} {'img/s':>10} {'speedup':>8} {'efficiency':>11}")
+    for row in rows:
+        print(f"{row['workers']:8d} {row['cores']:6d} {row['images_per_sec']:10.1f} "
+              f"{row['speedup']:7.2f}x {row['efficiency']:10.0%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()